@@ -4,6 +4,7 @@ from .coordination import *
 from .questionTypology import *
 from .politenessStrategies import *
 from .transformer import *
+from .pipeline import *
 from .parser import *
 from .hyperconvo import *
 from .toxicity import *
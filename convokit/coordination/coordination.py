@@ -283,16 +283,13 @@ class Coordination(Transformer):
         any_target = next(iter(group))
         fine_grained_targets = not isinstance(any_target, str)
 
-        utterances = []
-        for u in self.corpus.utterances.values():
-            speaker = u.user if fine_grained_speakers else u.user.name
-            if speaker in speakers:
-                if u.reply_to is not None:
-                    reply_to = self.corpus.utterances[u.reply_to]
-                    target = reply_to.user if fine_grained_targets else \
-                        reply_to.user.name
-                    if target in group:
-                        utterances.append(u)
+        # select the replies from speakers to the group over the corpus arrays, testing each user only once
+        arrays = self.corpus.get_arrays()
+        replies, parents = arrays.reply_indices()
+        speaker_mask = arrays.user_mask(speakers, names=not fine_grained_speakers)
+        target_mask = arrays.user_mask(group, names=not fine_grained_targets)
+        selected = replies[speaker_mask[arrays.user[replies]] & target_mask[arrays.user[parents]]]
+        utterances = [self.corpus.utterances[arrays.ids[i]] for i in selected]
         return self.scores_over_utterances(speakers, utterances,
             speaker_thresh, target_thresh, utterances_thresh,
             speaker_thresh_indiv, target_thresh_indiv,
@@ -327,12 +324,23 @@ class Coordination(Transformer):
 
         pairs = set(pairs)
         any_speaker = next(iter(pairs))[0]
-        if isinstance(any_speaker, str):
-            pairs_utts = self.corpus.pairwise_exchanges(lambda x, y:
-                (x.name, y.name) in pairs, user_names_only=True)
-        else:
-            pairs_utts = self.corpus.pairwise_exchanges(lambda x, y:
-                (x, y) in pairs, user_names_only=False)
+        names = isinstance(any_speaker, str)
+
+        # look up the replies of each pair in the corpus's interaction matrix, instead of testing every pair of
+        # users in the corpus
+        arrays = self.corpus.get_arrays()
+        interactions = self.corpus.interaction_matrix()
+        user_indices = defaultdict(list)
+        for i, user in enumerate(arrays.users):
+            user_indices[user.name if names else user].append(i)
+        pairs_utts = {}
+        for speaker, target in pairs:
+            replies = [interactions.get_replies(s, t) for s in user_indices.get(speaker, [])
+                       for t in user_indices.get(target, [])]
+            replies = sorted(i for group in replies for i in group.tolist())
+            if replies:
+                pairs_utts[speaker, target] = [self.corpus.utterances[arrays.ids[i]] for i in replies]
+
         all_scores = CoordinationScore()
         for (speaker, target), utterances in pairs_utts.items():
             scores = self.scores_over_utterances([speaker], utterances,
@@ -479,7 +487,13 @@ class Coordination(Transformer):
         if speaker_attribs is None: speaker_attribs = {}
         if target_attribs is None: target_attribs = {}
 
-        def annot_user(user: User, ut: Utterance):
+        # Users are tallied by their integer ids (see User), whose hashes are computed without calling into python
+        users_by_id = {}
+
+        def annot_user(user: Union[User, Hashable], ut: Utterance):
+            if isinstance(user, User):
+                users_by_id[user._uid] = user
+                user = user._uid
             return (user, tuple([ut.meta[attrib] if attrib in ut.meta else None 
                 for attrib in split_by_attribs]))
 
@@ -523,34 +537,41 @@ class Coordination(Transformer):
                                     cond_tally[speaker][cat][target] += 1
 
         out = CoordinationScore()
+        fine_grained = fine_grained_speakers
         if focus == "targets":
             speaker_thresh, target_thresh = target_thresh, speaker_thresh
             speaker_thresh_indiv, target_thresh_indiv = \
                 target_thresh_indiv, speaker_thresh_indiv
             real_speakers = targets.keys()
+            fine_grained = fine_grained_targets
         for speaker in real_speakers:
-            if speaker[0] not in speakers and not focus == "targets": continue
+            user = users_by_id[speaker[0]] if fine_grained else speaker[0]
+            if user not in speakers and not focus == "targets": continue
+            speaker_targets, speaker_n_utterances = targets[speaker], n_utterances[speaker]
             coord_w = {}  # coordination score wrt a category
             for cat in CoordinationWordCategories:
+                cat_tally = tally[speaker][cat]
+                cat_cond_tally = cond_tally[speaker][cat]
+                cat_cond_total = cond_total[speaker][cat]
                 threshed_cond_total = 0
                 threshed_cond_tally = 0
                 threshed_tally = 0
                 threshed_n_utterances = 0
-                for target in targets[speaker]:
-                    if tally[speaker][cat][target] >= speaker_thresh_indiv and \
-                        cond_total[speaker][cat][target] >= \
+                for target in speaker_targets:
+                    if cat_tally[target] >= speaker_thresh_indiv and \
+                        cat_cond_total[target] >= \
                         target_thresh_indiv and \
-                        n_utterances[speaker][target] >= \
+                        speaker_n_utterances[target] >= \
                         utterances_thresh_indiv:
-                        threshed_cond_total += cond_total[speaker][cat][target]
-                        threshed_cond_tally += cond_tally[speaker][cat][target]
-                        threshed_tally += tally[speaker][cat][target]
-                        threshed_n_utterances += n_utterances[speaker][target]
+                        threshed_cond_total += cat_cond_total[target]
+                        threshed_cond_tally += cat_cond_tally[target]
+                        threshed_tally += cat_tally[target]
+                        threshed_n_utterances += speaker_n_utterances[target]
                 if threshed_cond_total >= max(target_thresh, 1) and \
                     threshed_tally >= speaker_thresh and \
                     threshed_n_utterances >= max(utterances_thresh, 1):
                     coord_w[cat] = threshed_cond_tally / threshed_cond_total - \
                             threshed_tally / threshed_n_utterances
             if len(coord_w) > 0:
-                out[speaker if split_by_attribs else speaker[0]] = coord_w
+                out[(user, speaker[1]) if split_by_attribs else user] = coord_w
         return out
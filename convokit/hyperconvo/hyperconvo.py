@@ -62,10 +62,12 @@ class HyperConvo(Transformer):
 
         :return: corpus with conversations having a new meta field "hyperconvo" containing the stats generated by retrieve_feats(). Each conversation's metadata then contains the stats for the thread(s) it contains.
         """
+        threads = corpus.utterance_threads(prefix_len=self.prefix_len, include_root=self.include_root)
         feats = HyperConvo.retrieve_feats(corpus,
                                           prefix_len=self.prefix_len,
                                           min_thread_len=self.min_thread_len,
-                                          include_root=self.include_root)
+                                          include_root=self.include_root,
+                                          threads=threads)
         if self.include_root: # threads start at root (post)
             for root_id in feats.keys():
                 convo = corpus.get_conversation(root_id)
@@ -73,8 +75,6 @@ class HyperConvo(Transformer):
         else: # threads start at top-level-comment
             # Construct top-level-comment to root mapping
             tlc_to_root_mapping = dict() # tlc = top level comment
-            threads = corpus.utterance_threads(prefix_len=self.prefix_len, include_root=False)
-
             root_to_tlc = dict()
             for tlc_id, utts in threads.items():
                 thread_root = threads[tlc_id][tlc_id].root
@@ -124,7 +124,7 @@ class HyperConvo(Transformer):
                     reply_edges.append((ut.get("id"), ut.get("reply_to")))
                     speaker_to_reply_tos[ut.user].append(ut.get("reply_to"))
                     speaker_target_pairs.add((ut.user, uts[ut.get("reply_to")].user, ut.get("timestamp")))
-                G.add_node(ut.get("id"), info=ut.__dict__)
+                G.add_node(ut.get("id"), info=ut._attribs())
         # hypernodes
         for u, ids in username_to_utt_ids.items():
             G.add_hypernode(u, ids, info=u.meta)
@@ -248,22 +248,27 @@ class HyperConvo(Transformer):
     @staticmethod
     def retrieve_feats(corpus: Corpus, prefix_len: int=10,
                        min_thread_len: int=10,
-                       include_root: bool=True) -> Dict[Hashable, Dict]:
+                       include_root: bool=True,
+                       threads: Optional[Dict[Hashable, Dict[Hashable, Utterance]]]=None) -> Dict[Hashable, Dict]:
         """
         Retrieve all hypergraph features for a given corpus (viewed as a set
         of conversation threads).
 
         See init() for further documentation.
 
+        :param threads: the threads of the corpus, as returned by corpus.utterance_threads() with the same
+            prefix_len and include_root (computed if None)
+
         :return: A dictionary from a thread root id to its stats dictionary,
             which is a dictionary from feature names to feature values. For degree-related
             features specifically.
         """
 
         threads_stats = dict()
+        if threads is None:
+            threads = corpus.utterance_threads(prefix_len=prefix_len, include_root=include_root)
 
-        for i, (root, thread) in enumerate(
-                corpus.utterance_threads(prefix_len=prefix_len, include_root=include_root).items()):
+        for i, (root, thread) in enumerate(threads.items()):
             if len(thread) < min_thread_len: continue
             stats = {}
             G = HyperConvo._make_hypergraph(uts=thread)
@@ -1,6 +1,7 @@
 from typing import Dict, List, Collection, Hashable, Callable, Set, Generator, Tuple, Optional, ValuesView
 from .utterance import Utterance
 from .user import User
+from .convoKitMeta import replace_meta, get_meta
 
 class Conversation:
     """Represents a discrete subset of utterances in the dataset, connected by a
@@ -16,6 +17,7 @@ class Conversation:
         Utterance.meta. For user-level metadata, use User.meta. For corpus-level
         metadata, use Corpus.meta.
     """
+    __slots__ = ("_owner", "_id", "_utterance_ids", "_usernames", "_meta")
 
     def __init__(self, owner, id: Optional[str]=None,
                  utterances: Optional[List[str]]=None,
@@ -31,9 +33,9 @@ class Conversation:
         """Provides read-write access to conversation-level metadata. For
         utterance-level metadata, use Utterance.meta. For user-level metadata,
         use User.meta. For corpus-level metadata, use Corpus.meta."""
-        return self._meta
+        return get_meta(self)
     def _set_meta(self, new_meta):
-        self._meta = new_meta
+        self._meta = replace_meta(self._meta, new_meta)
 
     meta = property(_get_meta, _set_meta)
 
@@ -82,6 +84,25 @@ class Conversation:
         for ut_id in self._utterance_ids:
             yield self._owner.get_utterance(ut_id)
 
+    def get_chronological_utterance_ids(self) -> List[str]:
+        """Produces a list of the unique IDs of all utterances in the
+        Conversation, sorted by timestamp. The order is computed once and
+        cached by the owner Corpus.
+
+        :return: a list of IDs of Utterances in the Conversation, in timestamp
+            order
+        """
+        return self._owner.get_chronological_utterance_ids(self._id)
+
+    def get_reply_tree(self):
+        """Returns the index of the reply structure of the owner Corpus (see
+        Corpus.get_reply_tree()), which gives the replies to, depth, subtree
+        size and ancestors of each utterance in the Conversation by id.
+
+        :return: ReplyTree of the owner Corpus
+        """
+        return self._owner.get_reply_tree()
+
     def get_usernames(self) -> List[str]:
         """Produces a list of names of all users in the Conversation, which can
         be used in calls to get_user() to retrieve specific users. Provides no
@@ -124,8 +145,12 @@ class Conversation:
         for username in self._usernames:
             yield self._owner.get_user(username)
 
+    def _attribs(self) -> Dict:
+        # the attributes of the Conversation, as they would appear in its __dict__ if it had one
+        return {name: getattr(self, name) for name in Conversation.__slots__}
+
     def __eq__(self, other):
-        return self.__dict__ == other.__dict__
+        return self._attribs() == other._attribs()
 
     def __repr__(self):
-        return "Conversation(" + str(self.__dict__) + ")"
+        return "Conversation(" + str(self._attribs()) + ")"
@@ -0,0 +1,287 @@
+from itertools import chain
+from typing import Dict, Hashable, Iterator, Optional
+
+# the value reported to a MetaTracker for a key that is deleted
+MISSING = object()
+
+
+class LazyValue:
+    """A placeholder for a metadata value that has not been read from disk yet.
+
+    :param reader: object with a ``load(i)`` method that reads the value
+    :param idx: position of the value in the reader
+    """
+    __slots__ = ("reader", "idx")
+
+    def __init__(self, reader, idx: int):
+        self.reader = reader
+        self.idx = idx
+
+    def load(self):
+        return self.reader.load(self.idx)
+
+
+class MetaTracker:
+    """Records which metadata keys have been written to, across all the
+    ConvoKitMeta dictionaries of one kind of object (e.g. all utterances) in a
+    Corpus.
+
+    :ivar dirty: set of metadata keys modified since the tracker was last reset
+    :ivar empty: the EmptyMeta shared by all the objects tracked that have no metadata
+    :ivar indexes: the MetaIndexes built over these objects (see Corpus.create_index), and the hashes of metadata
+        fields cached by Corpus.fingerprint, as weak sets by metadata key, since a Corpus and its subset views share
+        their tracker but each have their own indexes. An index is updated or marked stale when its key is written
+        to (see mark).
+    """
+    __slots__ = ("dirty", "empty", "indexes")
+
+    def __init__(self):
+        self.dirty = set()
+        self.empty = EmptyMeta(tracker=self)
+        self.indexes = {}
+
+    def mark(self, key: Hashable, meta: Optional["ConvoKitMeta"] = None, owner_id: Optional[Hashable] = None,
+             value=MISSING) -> None:
+        """Records that key is written to. Called before the write, with the metadata written to, the id of the
+        utterance it belongs to and the value written (MISSING if the key is deleted), if they are known: the indexes
+        whose update() accepts the write are updated in place, and the others are marked stale.
+
+        :param key: the metadata key written to
+        :param meta: the metadata written to, or None if the write is not known
+        :param owner_id: the owner_id of the metadata
+        :param value: the value written, or MISSING
+        """
+        self.dirty.add(key)
+        if key in self.indexes:
+            for index in self.indexes[key]:
+                if meta is None or not index.update(meta, owner_id, value):
+                    index.stale = True
+
+    def reset(self) -> None:
+        self.dirty = set()
+
+
+class ConvoKitMeta(dict):
+    """A metadata dictionary that behaves exactly like a regular dict, but
+
+    - may hold values which are only read from disk when they are first
+      accessed (e.g. binary utterance metadata such as spaCy parses), and
+    - reports every key that is written to or deleted to its MetaTracker, if
+      it has one.
+
+    :param tracker: the MetaTracker to report modified keys to
+    :param owner_id: the id of the Utterance the metadata belongs to, which is reported to the tracker along with the
+        writes so that the hashes of Corpus.fingerprint are updated in place (None for other metadata)
+    """
+    __slots__ = ("tracker", "owner_id")
+
+    def __init__(self, *args, tracker: Optional[MetaTracker] = None, owner_id: Optional[Hashable] = None, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self.tracker = tracker
+        self.owner_id = owner_id
+
+    def _resolve(self, key: Hashable, value):
+        if isinstance(value, LazyValue):
+            value = value.load()
+            dict.__setitem__(self, key, value)
+        return value
+
+    def _resolve_all(self) -> None:
+        for key, value in dict.items(self):
+            if isinstance(value, LazyValue):
+                dict.__setitem__(self, key, value.load())
+
+    def _mark(self, key: Hashable, value=MISSING) -> None:
+        if self.tracker is not None:
+            self.tracker.mark(key, self, self.owner_id, value)
+
+    def __getitem__(self, key: Hashable):
+        return self._resolve(key, dict.__getitem__(self, key))
+
+    def get(self, key: Hashable, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def __setitem__(self, key: Hashable, value) -> None:
+        self._mark(key, value)
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key: Hashable) -> None:
+        self._mark(key)
+        dict.__delitem__(self, key)
+
+    def pop(self, key: Hashable, *default):
+        if key in self:
+            self._mark(key)
+            return self._resolve(key, dict.pop(self, key))
+        return dict.pop(self, key, *default)
+
+    def popitem(self):
+        key, value = dict.popitem(self)
+        dict.__setitem__(self, key, value) # put back, so that the tracker is told before the value is removed
+        return key, self.pop(key)
+
+    def setdefault(self, key: Hashable, default=None):
+        if key in self:
+            return self[key]
+        self[key] = default
+        return default
+
+    def update(self, *args, **kwargs) -> None:
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def clear(self) -> None:
+        for key in list(dict.keys(self)):
+            self._mark(key)
+        dict.clear(self)
+
+    def __iter__(self) -> Iterator:
+        # overriding __iter__ stops dict(meta) / {**meta} from copying unresolved values
+        # through CPython's internal fast path
+        return dict.__iter__(self)
+
+    def items(self):
+        self._resolve_all()
+        return dict.items(self)
+
+    def values(self):
+        self._resolve_all()
+        return dict.values(self)
+
+    def copy(self) -> Dict:
+        self._resolve_all()
+        return ConvoKitMeta(dict.items(self))
+
+    def __eq__(self, other):
+        self._resolve_all()
+        if isinstance(other, ConvoKitMeta):
+            other._resolve_all()
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __reduce__(self):
+        # the default reduction restores the items through __setitem__, before the tracker is set
+        self._resolve_all()
+        return type(self), (dict(dict.items(self)),), (None, {"tracker": self.tracker, "owner_id": self.owner_id})
+
+    def __repr__(self):
+        self._resolve_all()
+        return dict.__repr__(self)
+
+
+class EmptyMeta(ConvoKitMeta):
+    """An empty ConvoKitMeta that is shared by every object of a Corpus without metadata, instead of each of them
+    holding its own empty dict. It cannot be written to: the meta properties of Utterance, User and Conversation
+    hand out a PendingMeta in its place (see get_meta).
+    """
+    __slots__ = ()
+
+    def __setitem__(self, key: Hashable, value) -> None:
+        raise TypeError("EmptyMeta is shared and cannot be modified")
+
+
+class PendingMeta(ConvoKitMeta):
+    """The empty metadata handed out for an object that shares the EmptyMeta of its Corpus. It only becomes the
+    object's own metadata when it is first written to, so reading the metadata (e.g. ``utt.meta.get(key)``) leaves
+    the object sharing the EmptyMeta, and the PendingMeta is discarded once the caller is done with it.
+
+    :param owner: the Utterance, User or Conversation
+    :param owner_id: the id of the Utterance (see ConvoKitMeta)
+    """
+    __slots__ = ("owner",)
+
+    def __init__(self, owner, owner_id: Optional[Hashable] = None):
+        ConvoKitMeta.__init__(self, tracker=owner._meta.tracker, owner_id=owner_id)
+        self.owner = owner
+
+    def __setitem__(self, key: Hashable, value) -> None:
+        owner = self.owner
+        if owner is not None:
+            if type(owner._meta) is not EmptyMeta:
+                # another PendingMeta of the object (or new metadata set through the property) was written first
+                owner._meta[key] = value
+                return
+            owner._meta = self
+            self.owner = None # the object now holds this dict, which does not need to refer back to it
+        ConvoKitMeta.__setitem__(self, key, value)
+
+    def __reduce__(self):
+        return ConvoKitMeta, (dict(dict.items(self)),), (None, {"tracker": self.tracker, "owner_id": self.owner_id})
+
+
+def get_meta(obj, owner_id: Optional[Hashable] = None) -> Dict:
+    """Helper for the meta property getters of Utterance, User and Conversation: returns the metadata of the
+    object, or a PendingMeta if it shares the EmptyMeta of its Corpus.
+
+    :param obj: the Utterance, User or Conversation
+    :param owner_id: the id of the Utterance (see ConvoKitMeta)
+    """
+    meta = obj._meta
+    if type(meta) is EmptyMeta:
+        return PendingMeta(obj, owner_id)
+    return meta
+
+
+def own_meta(meta: Dict) -> Dict:
+    """Returns a new, writable ConvoKitMeta in place of a shared EmptyMeta, and any other metadata as is, for
+    objects whose metadata must be shared before it is written to (e.g. by a Corpus view).
+
+    :param meta: the metadata stored by the object
+    """
+    if type(meta) is EmptyMeta:
+        return ConvoKitMeta(tracker=meta.tracker)
+    return meta
+
+
+def bind_meta(meta: Optional[Dict], tracker: Optional[MetaTracker],
+              owner_id: Optional[Hashable] = None) -> ConvoKitMeta:
+    """Returns a ConvoKitMeta holding the contents of meta that reports writes
+    to tracker. A ConvoKitMeta is rebound in place; any other dict is copied
+    (without resolving lazily loaded values).
+
+    :param meta: metadata dictionary, or None for empty metadata
+    :param tracker: the MetaTracker of the owning Corpus
+    :param owner_id: the id of the Utterance (see ConvoKitMeta)
+    """
+    if type(meta) is PendingMeta and meta.owner is not None:
+        # the empty metadata handed out for another object, which must not become the metadata of both
+        meta = None
+    if isinstance(meta, ConvoKitMeta) and type(meta) is not EmptyMeta:
+        meta.tracker = tracker
+        meta.owner_id = owner_id
+        return meta
+    if not meta and tracker is not None:
+        return tracker.empty
+    return ConvoKitMeta(() if meta is None else meta, tracker=tracker, owner_id=owner_id)
+
+
+def replace_meta(old: Optional[Dict], new: Optional[Dict], owner_id: Optional[Hashable] = None) -> Dict:
+    """Helper for the meta property setters of Utterance, User and
+    Conversation: if the metadata being replaced belongs to a Corpus, the new
+    metadata is bound to the same tracker and every key of both the old and the
+    new metadata is reported as written to, as a write of its new value to the
+    old metadata.
+
+    :param old: the metadata being replaced
+    :param new: the replacement metadata
+    :param owner_id: the id of the Utterance (see ConvoKitMeta)
+    :return: the metadata to store
+    """
+    tracker = old.tracker if isinstance(old, ConvoKitMeta) else None
+    if tracker is None:
+        return {} if new is None else new
+    if new is not old:
+        new = ConvoKitMeta(() if new is None else dict.items(new), tracker=tracker, owner_id=owner_id)
+    for key in dict.fromkeys(chain(dict.keys(old), dict.keys(new))):
+        tracker.mark(key, old, owner_id, dict.get(new, key, MISSING))
+    return new
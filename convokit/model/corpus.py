@@ -1,12 +1,32 @@
 
 from typing import Dict, List, Collection, Hashable, Callable, Set, Generator, Tuple, Optional, ValuesView
-import pickle
 from collections import defaultdict
+import heapq
 import json
 import os
+import shutil
+import numpy as np
+from sys import intern
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice, groupby
+from array import array
+from weakref import WeakSet
+from multiprocessing import Pool
 from .user import User
 from .utterance import Utterance
 from .conversation import Conversation
+from .corpusArrays import CorpusArrays, timestamp_key
+from .replyTree import ReplyTree
+from .interactionMatrix import InteractionMatrix
+from .corpusFingerprint import CorpusFingerprint
+from .metaIndex import MetaIndex
+from .convoKitMeta import ConvoKitMeta, LazyValue, MetaTracker, bind_meta, own_meta
+from bisect import bisect_left
+from .corpusUtil import load_jsonl, offsets_path, dump_jsonl_offsets, load_columnar_utterances, dump_columnar_utterances, \
+    dump_bin_records, load_bin_field, BinRecordReader, BinRecordWriters, dump_meta_delta, load_meta_delta, remove_meta_delta, \
+    open_file, resolve_path, COMPRESSION_SUFFIXES, SHARDS_DIR, shard_of, shard_path, dump_shard_manifest, \
+    select_shards, iter_jsonl, iter_columnar_utterances, \
+    iter_json_array, json_dumps, encode_jsonl_chunk
 
 def warning(text: str):
     # Pre-pends a red-colored 'WARNING: ' to [text].
@@ -26,6 +46,144 @@ DefinedKeys = {KeyId, KeyUser, KeyConvoRoot, KeyReplyTo, KeyTimestamp, KeyText}
 KeyMeta = "meta"
 
 BIN_DELIM_L, BIN_DELIM_R = "<##bin{", "}&&@**>"
+# metadata values of these types are always json serializable, so dump() does not need to try encoding them
+JSON_SCALAR_TYPES = {str, int, float, bool, type(None)}
+
+def _intern(v):
+    # Interns string ids and usernames, so that e.g. the root id shared by the utterances of a conversation is
+    # stored once rather than once per utterance
+    return intern(v) if type(v) == str else v
+
+def _bin_marker_index(v) -> Optional[int]:
+    # Returns the position encoded in a binary metadata marker (see dump_helper_bin), or None if [v] is not a marker
+    if type(v) == str and v.startswith(BIN_DELIM_L) and v.endswith(BIN_DELIM_R):
+        return int(v[len(BIN_DELIM_L):-len(BIN_DELIM_R)])
+    return None
+
+def _id_sort_key(utt_id):
+    # The key utterances are sorted by in dump(sort_by_id=True) and merged by in merge_many(): ids read back from json
+    # as lists (e.g. tuple ids) are compared as the tuples they were saved from
+    return tuple(_id_sort_key(i) for i in utt_id) if isinstance(utt_id, list) else utt_id
+
+def _unorderable_ids_error(where: str) -> ValueError:
+    return ValueError("The utterance ids of {} cannot be ordered: utterances can only be sorted by id if their ids can "
+                      "be compared with each other (e.g. all strings, rather than a mix of strings and integers)"
+                      .format(where))
+
+def _unpack_utterance_bin(dir_name: str, utterances: List[Dict], fields: List[str]) -> None:
+    """
+    Replaces the binary metadata placeholders of the given utterance dicts with values that are read lazily from
+    the <field>-bin.p files in dir_name, on first access to utt.meta[field].
+    """
+    for field in fields:
+        markers = [(ut, _bin_marker_index(ut[KeyMeta].get(field))) for ut in utterances]
+        markers = [(ut, idx) for ut, idx in markers if idx is not None]
+        if not markers: continue # e.g. a shard in which no utterance has a binary value for this field
+        l_bin = load_bin_field(os.path.join(dir_name, field + "-bin.p"), lazy=True)
+        for ut, idx in markers:
+            if not isinstance(ut[KeyMeta], ConvoKitMeta):
+                ut[KeyMeta] = ConvoKitMeta(ut[KeyMeta])
+            ut[KeyMeta][field] = LazyValue(l_bin, idx) if isinstance(l_bin, BinRecordReader) else l_bin[idx]
+
+
+def _iter_utterance_dicts(filename: str, exclude_utterance_meta: Collection[str],
+                          with_meta: bool = True) -> Generator[Dict, None, None]:
+    """
+    Helper for Corpus.stream(). Iterates over the utterances saved in a corpus directory or utterances file as
+    dicts, in the same form as the lines of utterances.jsonl, reading them one at a time.
+    """
+    if not os.path.isdir(filename):
+        parts = os.path.basename(filename).split(".")
+        if "." + parts[-1] in COMPRESSION_SUFFIXES.values(): parts.pop()
+        if parts[-1] == "jsonl":
+            yield from iter_jsonl(filename)
+        else:
+            yield from iter_json_array(filename)
+        return
+
+    with open(os.path.join(filename, "index.json"), "r") as f:
+        meta_index = json.load(f)
+    utterances_format = meta_index.get("utterances-format", "jsonl")
+    delta_fields = [] if not with_meta else [field for field in meta_index.get("delta-fields", {}).get("utterances", [])
+                                             if field not in exclude_utterance_meta]
+    bin_fields = [] if not with_meta else [field for field, field_type in meta_index["utterances-index"].items()
+                                           if field_type == "bin" and field not in exclude_utterance_meta
+                                           and field not in delta_fields]
+    # metadata fields saved by incremental dumps are kept in memory, as they are not stored in utterance order
+    deltas = {field: {obj_id: (has_value, value) for obj_id, has_value, value
+                      in load_meta_delta(filename, "utterances", field)} for field in delta_fields}
+
+    if utterances_format == "columnar":
+        sources = [(filename, iter_columnar_utterances(filename, exclude_utterance_meta,
+                                                       with_meta=with_meta))]
+    elif utterances_format == "sharded":
+        sources = [(shard_path(filename, shard), iter_jsonl(os.path.join(shard_path(filename, shard),
+                                                                         "utterances.jsonl")))
+                   for shard in select_shards(filename)]
+    elif os.path.exists(resolve_path(os.path.join(filename, "utterances.jsonl"))):
+        sources = [(filename, iter_jsonl(os.path.join(filename, "utterances.jsonl")))]
+    else:
+        sources = [(filename, iter_json_array(os.path.join(filename, "utterances.json")))]
+
+    for dir_name, utterances in sources:
+        readers = {}
+        for ut in utterances:
+            if utterances_format != "columnar":
+                for field in exclude_utterance_meta:
+                    ut[KeyMeta].pop(field, None)
+                for field in bin_fields:
+                    idx = _bin_marker_index(ut[KeyMeta].get(field))
+                    if idx is None: continue
+                    if field not in readers:
+                        readers[field] = load_bin_field(os.path.join(dir_name, field + "-bin.p"), lazy=True)
+                    if not isinstance(ut[KeyMeta], ConvoKitMeta):
+                        ut[KeyMeta] = ConvoKitMeta(ut[KeyMeta])
+                    l_bin = readers[field]
+                    ut[KeyMeta][field] = LazyValue(l_bin, idx) if isinstance(l_bin, BinRecordReader) \
+                        else l_bin[idx]
+            for field, values in deltas.items():
+                has_value, value = values.get(ut[KeyId], (False, None))
+                if has_value:
+                    ut[KeyMeta][field] = value
+                else:
+                    ut[KeyMeta].pop(field, None)
+            yield ut
+
+
+# the file, binary metadata file suffix and meta index key of each kind of json metadata
+_JSON_META_FILES = {"users": ("users.json", "-user-bin.p", "users-index"),
+                    "conversations": ("conversations.json", "-convo-bin.p", "conversations-index"),
+                    "overall": ("corpus.json", "-overall-bin.p", "overall-index")}
+
+def _load_json_meta(dir_name: str, meta_index: Dict, kind: str) -> Dict:
+    """
+    Helper for Corpus.merge_many(). Reads the users.json, conversations.json or corpus.json file of a corpus directory,
+    with binary metadata and the metadata fields saved by incremental dumps filled in.
+
+    :param kind: "users", "conversations" or "overall"
+    :return: the contents of the file
+    """
+    filename, bin_suffix, index_key = _JSON_META_FILES[kind]
+    with open_file(resolve_path(os.path.join(dir_name, filename)), "r") as f:
+        data = json.load(f)
+    metas = {None: data} if kind == "overall" else data
+    delta_fields = meta_index.get("delta-fields", {}).get(kind, [])
+    for field, field_type in meta_index[index_key].items():
+        if field_type != "bin" or field in delta_fields: continue
+        l_bin = load_bin_field(os.path.join(dir_name, field + bin_suffix))
+        for metadata in metas.values():
+            idx = _bin_marker_index(metadata.get(field))
+            if idx is not None:
+                metadata[field] = l_bin[idx]
+    for field in delta_fields:
+        for obj_id, has_value, value in load_meta_delta(dir_name, kind, field):
+            if obj_id not in metas: continue
+            if has_value:
+                metas[obj_id][field] = value
+            else:
+                metas[obj_id].pop(field, None)
+    return data
+
 
 class Corpus:
     """Represents a dataset, which can be loaded from a folder or a
@@ -38,10 +196,12 @@ class Corpus:
                  exclude_conversation_meta: Optional[List[str]] = None,
                  exclude_user_meta: Optional[List[str]] = None,
                  exclude_overall_meta: Optional[List[str]] = None,
-                 version: Optional[int] = None):
+                 version: Optional[int] = None, n_workers: int = 1,
+                 conversation_ids: Optional[Collection[str]] = None, shards: Optional[Collection[int]] = None):
         """
 
-        :param filename: Path to a folder containing a Corpus or to an utterances.jsonl / utterances.json file to load
+        :param filename: Path to a folder containing a Corpus or to an utterances.jsonl / utterances.json file to load.
+            Compressed files (e.g. utterances.jsonl.gz) are decompressed transparently.
         :param utterances: List of utterances to initialize Corpus from
         :param utterance_start_index: For utterances.jsonl, specify the line number (zero-indexed) to begin parsing utterances from
         :param utterance_end_index: For utterances.jsonl, specify the line number (zero-indexed) of the last utterance to be parsed.
@@ -51,9 +211,15 @@ class Corpus:
         :param exclude_user_meta: user metadata to be ignored
         :param exclude_overall_meta: overall metadata to be ignored
         :param version: version no. of corpus
+        :param n_workers: number of processes used to decode utterances.jsonl (None to use all available cores)
+        :param conversation_ids: only load the utterances of these conversations. For a sharded corpus (see
+            dump(n_shards=...)), only the shards holding these conversations are read.
+        :param shards: for a sharded corpus, only load the utterances of these shards (hash buckets of
+            conversation ids, see convokit.model.corpusUtil.shard_of)
         """
 
         self.original_corpus_path = None if filename is None else os.path.dirname(filename)
+        self._loaded_dir = None # set if the corpus holds the full contents of a corpus directory
         self.meta = {}
         self.meta_index = {}
         convos_meta = defaultdict(dict)
@@ -66,32 +232,60 @@ class Corpus:
 
         if filename is not None:
             if os.path.isdir(filename):
-                if os.path.exists(os.path.join(filename, 'utterances.jsonl')):
-                    with open(os.path.join(filename, 'utterances.jsonl'), 'r') as f:
-                        utterances = []
-                        if utterance_start_index is None: utterance_start_index = 0
-                        if utterance_end_index is None: utterance_end_index = float('inf')
-                        idx = 0
-                        for line in f:
-                            if utterance_start_index <= idx <= utterance_end_index:
-                                utterances.append(json.loads(line))
-                            idx += 1
-
-                elif os.path.exists(os.path.join(filename, 'utterances.json')):
-                    with open(os.path.join(filename, "utterances.json"), "r") as f:
-                        utterances = json.load(f)
-
-                if exclude_utterance_meta:
+                with open(os.path.join(filename, "index.json"), "r") as f:
+                    self.meta_index = json.load(f)
+                columnar = self.meta_index.get("utterances-format") == "columnar"
+                sharded = self.meta_index.get("utterances-format") == "sharded"
+                if shards is not None and not sharded:
+                    raise ValueError("shards can only be given when loading a sharded corpus")
+                # binary utterance meta is read lazily, on first access to utt.meta[field]. Fields saved by
+                # incremental dumps are read from their sidecar files instead (see below), and columnar corpora
+                # store binary fields in their own columns.
+                delta_fields = self.meta_index.get("delta-fields", {})
+                utt_bin_fields = [field for field, field_type in self.meta_index["utterances-index"].items()
+                                  if field_type == "bin" and field not in exclude_utterance_meta
+                                  and field not in delta_fields.get("utterances", [])]
+
+                if columnar:
+                    utterances = load_columnar_utterances(filename, utterance_start_index, utterance_end_index,
+                                                          exclude_utterance_meta)
+
+                elif sharded:
+                    # only read the shards that can hold the requested conversations
+                    utterances = []
+                    for shard in select_shards(filename, conversation_ids, shards):
+                        shard_utts = load_jsonl(os.path.join(shard_path(filename, shard), 'utterances.jsonl'),
+                                                n_workers=n_workers)
+                        _unpack_utterance_bin(shard_path(filename, shard), shard_utts, utt_bin_fields)
+                        utterances.extend(shard_utts)
+                    if utterance_start_index is not None or utterance_end_index is not None:
+                        start = 0 if utterance_start_index is None else utterance_start_index
+                        end = len(utterances) if utterance_end_index is None else utterance_end_index + 1
+                        utterances = utterances[start:end]
+
+                elif os.path.exists(resolve_path(os.path.join(filename, 'utterances.jsonl'))):
+                    utterances = load_jsonl(os.path.join(filename, 'utterances.jsonl'),
+                                            utterance_start_index, utterance_end_index, n_workers)
+
+                elif os.path.exists(resolve_path(os.path.join(filename, 'utterances.json'))):
+                    # parsed one utterance at a time, so the raw json text is never held in memory in full
+                    utterances = list(iter_json_array(os.path.join(filename, "utterances.json")))
+
+                if conversation_ids is not None:
+                    conversation_ids = set(conversation_ids)
+                    utterances = [ut for ut in utterances if ut[KeyConvoRoot] in conversation_ids]
+
+                if exclude_utterance_meta and not columnar:
                     for utt in utterances:
                         for field in exclude_utterance_meta:
                             del utt["meta"][field]
 
-                with open(os.path.join(filename, "users.json"), "r") as f:
+                with open_file(resolve_path(os.path.join(filename, "users.json")), "r") as f:
                     users_meta = defaultdict(dict)
                     for k, v in json.load(f).items():
                         if k in exclude_user_meta: continue
                         users_meta[k] = v
-                with open(os.path.join(filename, "conversations.json"), "r") as f:
+                with open_file(resolve_path(os.path.join(filename, "conversations.json")), "r") as f:
                     for k, v in json.load(f).items():
                         if k in exclude_conversation_meta: continue
                         convos_meta[k] = v
@@ -99,8 +293,6 @@ class Corpus:
                     for k, v in json.load(f).items():
                         if k in exclude_overall_meta: continue
                         self.meta[k] = v
-                with open(os.path.join(filename, "index.json"), "r") as f:
-                    self.meta_index = json.load(f)
 
                 if version is not None:
                     if "version" in self.meta_index:
@@ -109,43 +301,32 @@ class Corpus:
                         self.version = self.meta_index["version"]
 
                 # unpack utterance meta
-                for field, field_type in self.meta_index["utterances-index"].items():
-                    if field_type == "bin" and field not in exclude_utterance_meta:
-                        with open(os.path.join(filename, field + "-bin.p"), "rb") as f:
-                            l_bin = pickle.load(f)
-                        for i, ut in enumerate(utterances):
-                            for k, v in ut[KeyMeta].items():
-                                if k == field and type(v) == str and v.startswith(BIN_DELIM_L) and \
-                                        v.endswith(BIN_DELIM_R):
-                                    idx = int(v[len(BIN_DELIM_L):-len(BIN_DELIM_R)])
-                                    utterances[i][KeyMeta][k] = l_bin[idx]
+                if not columnar and not sharded:
+                    _unpack_utterance_bin(filename, utterances, utt_bin_fields)
                 for field in exclude_utterance_meta:
                     del self.meta_index["utterances-index"][field]
 
                 # unpack user meta
                 for field, field_type in self.meta_index["users-index"].items():
+                    if field in delta_fields.get("users", []): continue
                     if field_type == "bin" and field not in exclude_utterance_meta:
-                        with open(os.path.join(filename, field + "-user-bin.p"), "rb") as f:
-                            l_bin = pickle.load(f)
+                        l_bin = load_bin_field(os.path.join(filename, field + "-user-bin.p"))
                         for user, metadata in users_meta.items():
-                            for k, v in metadata.items():
-                                if k == field and type(v) == str and str(v).startswith(BIN_DELIM_L) and \
-                                        str(v).endswith(BIN_DELIM_R):
-                                    idx = int(v[len(BIN_DELIM_L):-len(BIN_DELIM_R)])
-                                    metadata[k] = l_bin[idx]
+                            idx = _bin_marker_index(metadata.get(field))
+                            if idx is not None:
+                                metadata[field] = l_bin[idx]
                 for field in exclude_user_meta:
                     del self.meta_index["users-index"][field]
 
                 # unpack convo meta
                 for field, field_type in self.meta_index["conversations-index"].items():
+                    if field in delta_fields.get("conversations", []): continue
                     if field_type == "bin" and field not in exclude_utterance_meta:
-                        with open(os.path.join(filename, field + "-convo-bin.p"), "rb") as f:
-                            l_bin = pickle.load(f)
-                        for k, v in convos_meta.items():
-                            if k == field and type(v) == str and str(v).startswith(BIN_DELIM_L) and \
-                                    str(v).endswith(BIN_DELIM_R):
-                                idx = int(v[len(BIN_DELIM_L):-len(BIN_DELIM_R)])
-                                convos_meta[k] = l_bin[idx]
+                        l_bin = load_bin_field(os.path.join(filename, field + "-convo-bin.p"))
+                        for convo_id, metadata in convos_meta.items():
+                            idx = _bin_marker_index(metadata.get(field))
+                            if idx is not None:
+                                metadata[field] = l_bin[idx]
 
                 for field in exclude_conversation_meta:
                     del self.meta_index["conversations-index"][field]
@@ -153,35 +334,48 @@ class Corpus:
                 # unpack overall meta
                 for field, field_type in self.meta_index["overall-index"].items():
                     if field_type == "bin" and field not in exclude_utterance_meta:
-                        with open(os.path.join(filename, field + "-overall-bin.p"), "rb") as f:
-                            l_bin = pickle.load(f)
-                        for k, v in self.meta.items():
-                            if k == field and type(v) == str and v.startswith(BIN_DELIM_L) and \
-                                    v.endswith(BIN_DELIM_R):
-                                idx = int(v[len(BIN_DELIM_L):-len(BIN_DELIM_R)])
-                                self.meta[k] = l_bin[idx]
+                        l_bin = load_bin_field(os.path.join(filename, field + "-overall-bin.p"))
+                        idx = _bin_marker_index(self.meta.get(field))
+                        if idx is not None:
+                            self.meta[field] = l_bin[idx]
                 for field in exclude_overall_meta:
                     del self.meta_index["overall-index"][field]
 
+                # apply metadata fields saved by incremental dumps on top of the base files
+                excluded = {"utterances": exclude_utterance_meta, "users": exclude_user_meta,
+                            "conversations": exclude_conversation_meta}
+                if delta_fields:
+                    targets = {"utterances": {ut[KeyId]: ut.setdefault(KeyMeta, {}) for ut in utterances},
+                               "users": users_meta, "conversations": convos_meta}
+                    for kind, fields in delta_fields.items():
+                        for field in fields:
+                            if field in excluded[kind]: continue
+                            for obj_id, has_value, value in load_meta_delta(filename, kind, field):
+                                if obj_id not in targets[kind]: continue
+                                if has_value:
+                                    targets[kind][obj_id][field] = value
+                                else:
+                                    targets[kind][obj_id].pop(field, None)
+
+                # an incremental dump rewrites index.json from the fields loaded, so it needs all of them
+                if utterance_start_index is None and utterance_end_index is None and not merge_lines \
+                        and conversation_ids is None and shards is None and not exclude_utterance_meta \
+                        and not exclude_user_meta and not exclude_conversation_meta and not exclude_overall_meta:
+                    self._loaded_dir = os.path.abspath(filename)
+
             else:
                 users_meta = defaultdict(dict)
                 convos_meta = defaultdict(dict)
-                with open(filename, "r") as f:
-                    try:
-                        ext = filename.split(".")[-1]
-                        if ext == "json":
-                            utterances = json.load(f)
-                        elif ext == "jsonl":
-                            utterances = []
-                            if utterance_start_index is None: utterance_start_index = 0
-                            if utterance_end_index is None: utterance_end_index = float('inf')
-                            idx = 0
-                            for line in f:
-                                if utterance_start_index <= idx <= utterance_end_index:
-                                    utterances.append(json.loads(line))
-                                idx += 1
-                    except Exception as e:
-                        raise Exception("Could not load corpus. Expected json file, encountered error: \n" + str(e))
+                try:
+                    parts = os.path.basename(filename).split(".")
+                    if "." + parts[-1] in COMPRESSION_SUFFIXES.values(): parts.pop()
+                    ext = parts[-1]
+                    if ext == "json":
+                        utterances = list(iter_json_array(filename))
+                    elif ext == "jsonl":
+                        utterances = load_jsonl(filename, utterance_start_index, utterance_end_index, n_workers)
+                except Exception as e:
+                    raise Exception("Could not load corpus. Expected json file, encountered error: \n" + str(e))
 
             self.utterances = dict()
             self.all_users = dict()
@@ -189,9 +383,9 @@ class Corpus:
             for i, u in enumerate(utterances):
 
                 u = defaultdict(lambda: None, u)
-                user_key = u[KeyUser]
+                user_key = _intern(u[KeyUser])
                 if user_key not in self.all_users:
-                    self.all_users[user_key] = User(name=u[KeyUser], meta=users_meta[u[KeyUser]])
+                    self.all_users[user_key] = User(name=user_key, meta=users_meta[user_key])
 
                 user = self.all_users[user_key]
 
@@ -201,9 +395,9 @@ class Corpus:
                 else:
                     reply_to_data = u[KeyReplyTo]
 
-                ut = Utterance(id=u[KeyId], user=user,
-                               root=u[KeyConvoRoot],
-                               reply_to=reply_to_data, timestamp=u[KeyTimestamp],
+                ut = Utterance(id=_intern(u[KeyId]), user=user,
+                               root=_intern(u[KeyConvoRoot]),
+                               reply_to=_intern(reply_to_data), timestamp=u[KeyTimestamp],
                                text=u[KeyText], meta=u[KeyMeta])
                 self.utterances[ut.id] = ut
         elif utterances is not None:
@@ -223,6 +417,20 @@ class Corpus:
                     new_utterances[u.id] = u
             self.utterances = new_utterances
 
+        self._view_of = None # the Corpus this is a subset view of, if any
+        self._init_structure(convos_meta)
+        if self._loaded_dir is not None and "fingerprint" in self.meta_index:
+            self._fingerprint.restore(self.meta_index["fingerprint"])
+
+    def _init_structure(self, convos_meta: Dict, trackers: Optional[Dict[str, MetaTracker]] = None) -> None:
+        """
+        Sets up everything a Corpus derives from its utterances, for both __init__ and _view(): organizes the
+        utterances into conversations, binds the metadata to the metadata trackers, and resets the indexes. The
+        utterances, users, corpus metadata, meta_index, version and _view_of must already be set.
+
+        :param convos_meta: metadata of the conversations, by conversation id
+        :param trackers: the metadata trackers shared with the full corpus, for a view (None to create new ones)
+        """
         # organize utterances by conversation
         convo_to_utts = defaultdict(list) # temp container identifying utterances by conversation
         for u in self.utterances.values():
@@ -237,19 +445,344 @@ class Corpus:
                                  meta=convo_meta)
             self.conversations[convo_id] = convo
 
-        self.update_users_data()
+        if trackers is None:
+            trackers = {kind: MetaTracker() for kind in ["utterances", "users", "conversations"]}
+        self._meta_trackers = trackers
+        self._meta_indexes = {kind: {} for kind in self._meta_trackers}
+        self._bind_meta()
+        self._reset_indexes()
+        self._loaded_sizes = self._sizes()
+        if self._view_of is None:
+            # the Users of a view keep the utterance and conversation maps of the full corpus
+            self._reset_users_data()
+
+    def _bind_meta(self) -> None:
+        """
+        Makes the metadata of every Utterance, User and Conversation in the Corpus a ConvoKitMeta that reports
+        modified keys to the Corpus (see dump(incremental=True)).
+        """
+        trackers = self._meta_trackers
+        for utt in self.utterances.values():
+            utt._meta = bind_meta(utt._meta, trackers["utterances"], utt.id)
+        for user in self.all_users.values():
+            user._meta = bind_meta(user._meta, trackers["users"])
+        for convo in self.conversations.values():
+            convo._meta = bind_meta(convo._meta, trackers["conversations"])
+
+    def _reset_indexes(self) -> None:
+        """
+        Drops the indexes derived from the utterances of the Corpus, so that they are rebuilt on next use. Must be
+        called whenever utterances are added or removed.
+        """
+        self._arrays = None
+        self._reply_tree = None
+        self._interactions = None
+        self._timelines = {}
+        self._time_order = None
+        self._fingerprint = CorpusFingerprint(self._meta_trackers["utterances"], self.utterances)
+        for index in self._meta_indexes["utterances"].values():
+            index.stale = True
+
+    def fingerprint(self, meta_fields: Collection[Hashable] = (), refresh: bool = False) -> str:
+        """
+        Returns a content hash of the Corpus, which identifies the Corpus in its current state (e.g. as a cache key,
+        or to find identical datasets). It covers the ids, text, root, reply_to, timestamp and user of the utterances,
+        and the values of the given utterance metadata fields, but not the order of the utterances.
+
+        Each utterance is hashed separately, and the hashes are combined by summing them, so add_utterances() only
+        hashes the new utterances. The hash of each metadata field is cached, and a write to the field through the meta
+        of an utterance (e.g. Utterance.add_meta) only rehashes the value replaced and the value written. The hashes
+        are saved in index.json by dump(), and restored when the full Corpus is loaded. Like get_arrays(), the
+        fingerprint is not updated when the text, reply_to, root, user or timestamp of an Utterance is changed
+        directly. Neither is it updated when a metadata value is modified in place (e.g.
+        utt.meta['tags'].append(tag)), as only writes to the meta are tracked. Use refresh=True after doing either.
+
+        :param meta_fields: utterance metadata fields to include
+        :param refresh: if True, recompute the fingerprint from scratch
+        :return: the fingerprint, as a hexadecimal string
+        """
+        if refresh:
+            self._fingerprint = CorpusFingerprint(self._meta_trackers["utterances"], self.utterances)
+        return self._fingerprint.hexdigest(self.utterances.values(), meta_fields)
+
+    def get_arrays(self) -> CorpusArrays:
+        """
+        Returns the struct-of-arrays index of the Corpus structure (see CorpusArrays), in which utterances are
+        identified by dense integer indices. It is built on first use and cached; add_utterances() extends it and
+        methods that remove utterances discard it, but it is not updated when the reply_to, root, user or timestamp
+        of an Utterance is changed directly.
+
+        :return: CorpusArrays of the utterances of the Corpus, in iteration order
+        """
+        if self._arrays is None:
+            self._arrays = CorpusArrays(list(self.utterances.values()))
+        return self._arrays
+
+    def get_reply_tree(self) -> ReplyTree:
+        """
+        Returns the index of the reply structure of the Corpus (see ReplyTree), which gives the replies to, depth,
+        subtree size and ancestors of every utterance. It is built on first use and cached, like get_arrays().
+
+        :return: ReplyTree of the utterances of the Corpus
+        """
+        if self._reply_tree is None:
+            self._reply_tree = ReplyTree(self.get_arrays())
+        return self._reply_tree
+
+    def interaction_matrix(self) -> InteractionMatrix:
+        """
+        Returns the sparse matrix of reply counts between the users of the Corpus, with the replies grouped by
+        (speaker, target) pair (see InteractionMatrix). Users and utterances are numbered as in get_arrays(). It is
+        built on first use and cached; add_utterances() adds the new replies to it.
+
+        :return: InteractionMatrix of the utterances of the Corpus
+        """
+        if self._interactions is None:
+            self._interactions = InteractionMatrix(self.get_arrays())
+        return self._interactions
+
+    def _get_timelines(self, include_root: bool = True) -> Dict[int, np.ndarray]:
+        """
+        Returns the cached timelines of the Corpus: the indices (see get_arrays()) of the utterances of each
+        conversation, or of each comment thread below a top-level reply if include_root is False, in timestamp order.
+
+        :param include_root: whether to group utterances by conversation (True) or by top-level reply (False, in
+            which case root utterances are left out)
+        :return: dictionary from conversation index, or from the utterance index of the top-level reply, to the
+            sorted utterance indices
+        """
+        if include_root not in self._timelines:
+            arrays = self.get_arrays()
+            groups = arrays.conversation if include_root else self.get_reply_tree().top_level
+            self._timelines[include_root] = arrays.sorted_groups(groups)
+        return self._timelines[include_root]
+
+    def get_chronological_utterance_ids(self, conversation_id: Hashable) -> List[Hashable]:
+        """
+        Returns the ids of the utterances of a conversation sorted by timestamp, from a cached timeline.
+
+        :param conversation_id: id of the conversation
+        :return: list of utterance ids, in timestamp order
+        """
+        arrays = self.get_arrays()
+        if conversation_id not in arrays.conversation_index: return []
+        return [arrays.ids[i] for i in self._get_timelines()[arrays.conversation_index[conversation_id]]]
+
+    def _view(self, utterances: List[Utterance]) -> "Corpus":
+        """
+        Returns a Corpus of the given utterances of this Corpus, without copying them: the view shares its Utterance
+        and User objects, conversation metadata and corpus metadata with this Corpus, so changes to metadata made
+        through either are seen by both. The view has its own conversation and user maps, holding only the
+        conversations and users of its utterances, and its own indexes. Users keep their utterance and conversation
+        maps of the full corpus.
+
+        :param utterances: the utterances of the view, in order
+        :return: the view, a Corpus
+        """
+        view = Corpus.__new__(Corpus)
+        view.original_corpus_path = self.original_corpus_path
+        view._loaded_dir = None
+        view._view_of = self if self._view_of is None else self._view_of
+        view.meta = self.meta
+        view.meta_index = dict(self.meta_index)
+        view.version = self.version
+        view.utterances = {utt.id: utt for utt in utterances}
+        view.all_users = {utt.user.name: utt.user for utt in utterances if utt.user is not None}
+        # the conversations of the view share the metadata of those of this Corpus, which they take ownership of
+        convos_meta = {}
+        for utt in utterances:
+            convo = self.conversations.get(utt.root)
+            if convo is not None and utt.root not in convos_meta:
+                convo._meta = own_meta(convo._meta)
+                convos_meta[utt.root] = convo._meta
+        view._init_structure(convos_meta, self._meta_trackers)
+        return view
+
+    def subset(self, selector: Optional[Callable[[Utterance], bool]] = None,
+               utterance_ids: Optional[Collection[Hashable]] = None,
+               conversation_ids: Optional[Collection[Hashable]] = None) -> "Corpus":
+        """
+        Returns a view of a subset of the utterances of the Corpus, leaving the Corpus itself unchanged (unlike
+        filter_utterances_by()). The view is a Corpus that shares its Utterance and User objects, as well as the
+        conversation and corpus metadata, with this Corpus, so metadata added through the view (e.g. by a
+        Transformer run on it) is seen by both. It has its own conversation and user maps, holding only the
+        conversations and users of its utterances. Users keep the utterance and conversation maps of the full Corpus.
+
+        If several criteria are given, the view holds the utterances that meet all of them.
+
+        :param selector: optional function that takes in an Utterance and returns True to include it
+        :param utterance_ids: ids of the utterances to include, in the order given (ids not in the Corpus are ignored)
+        :param conversation_ids: ids of the conversations whose utterances to include
+        :return: a Corpus view
+        """
+        if utterance_ids is not None:
+            utts = [self.utterances[utt_id] for utt_id in utterance_ids if utt_id in self.utterances]
+            if conversation_ids is not None:
+                conversation_ids = set(conversation_ids)
+                utts = [utt for utt in utts if utt.root in conversation_ids]
+        elif conversation_ids is not None:
+            # the conversations' own utterance lists may be out of date after filter_utterances_by
+            utts = [self.utterances[utt_id] for convo_id in conversation_ids if convo_id in self.conversations
+                    for utt_id in self.conversations[convo_id]._utterance_ids if utt_id in self.utterances]
+        else:
+            utts = list(self.utterances.values())
+        if selector is not None:
+            utts = [utt for utt in utts if selector(utt)]
+        return self._view(utts)
+
+    def _get_time_order(self) -> Tuple[np.ndarray, Collection]:
+        """
+        Returns the cached time index of the Corpus: the indices (see get_arrays()) of the utterances sorted by
+        timestamp (utterances with equal timestamps in corpus order, and utterances without a timestamp last), and
+        their sorted timestamps.
+        """
+        if self._time_order is None:
+            timestamp = self.get_arrays().timestamp
+            if timestamp.dtype == object:
+                order = np.array(sorted(range(len(timestamp)), key=lambda i: timestamp_key(timestamp[i])),
+                                 dtype=np.int64)
+                sorted_timestamps = [timestamp[i] for i in order]
+                while sorted_timestamps and sorted_timestamps[-1] is None:
+                    sorted_timestamps.pop()
+                self._time_order = order, sorted_timestamps
+            else:
+                order = np.argsort(timestamp, kind="stable")
+                sorted_timestamps = timestamp[order]
+                self._time_order = order, sorted_timestamps[~np.isnan(sorted_timestamps)]
+        return self._time_order
+
+    def _time_range(self, start, end) -> np.ndarray:
+        # indices of the utterances with start <= timestamp < end, in timestamp order
+        order, timestamps = self._get_time_order()
+        search = (lambda t: int(np.searchsorted(timestamps, t, side="left"))) if isinstance(timestamps, np.ndarray) \
+            else (lambda t: bisect_left(timestamps, t))
+        lo = 0 if start is None else search(start)
+        hi = len(timestamps) if end is None else search(end)
+        return order[lo:max(lo, hi)]
+
+    def slice_by_time(self, start=None, end=None) -> "Corpus":
+        """
+        Returns a view of the Corpus (see subset()) holding the utterances with a timestamp between start (inclusive) and end
+        (exclusive), found by binary search over a cached time index. Utterances without a timestamp are left out.
+
+        :param start: earliest timestamp to include (None for no lower bound)
+        :param end: timestamp to stop before (None for no upper bound)
+        :return: a Corpus view of the utterances in the time range, in timestamp order
+        """
+        ids = self.get_arrays().ids
+        return self._view([self.utterances[ids[i]] for i in self._time_range(start, end)])
+
+    def iter_time_windows(self, width, step=None, start=None, end=None) -> Generator[Tuple[object, "Corpus"], None, None]:
+        """
+        Iterates over windows of time [t, t + width), for t = start, start + step, ... up to end, yielding a view of
+        the utterances of each window (see slice_by_time() and subset()). Each window costs a binary search plus the size of the
+        window, so rolling analyses do not rescan the Corpus.
+
+        :param width: length of each window, in the units of the timestamps (e.g. a number of seconds, or a
+            datetime.timedelta for datetime timestamps)
+        :param step: difference between the starts of consecutive windows (default: width, for disjoint windows)
+        :param start: start of the first window (default: the earliest timestamp)
+        :param end: no window starts after end (default: the latest timestamp)
+        :return: generator of (window start, Corpus view) pairs
+        """
+        if step is None: step = width
+        zero = width - width # 0, or e.g. timedelta(0) for datetime timestamps
+        if width <= zero or step <= zero:
+            raise ValueError("width and step must be positive")
+        _, timestamps = self._get_time_order()
+        if len(timestamps) == 0: return
+        t = timestamps[0] if start is None else start
+        end = timestamps[-1] if end is None else end
+        while t <= end:
+            yield t, self.slice_by_time(t, t + width)
+            t = t + step
+
+    def _objects(self, kind: str) -> Dict:
+        # the utterances, users or conversations of the Corpus, by id (or by name, for users)
+        return {"utterances": self.utterances, "users": self.all_users, "conversations": self.conversations}[kind]
+
+    def create_index(self, key: Hashable, kind: str = "utterances") -> None:
+        """
+        Builds an index of the values of a metadata key, so that filter_utterances_by() and get_ids_with_meta() look
+        up matching objects instead of scanning the whole Corpus. The index is kept up to date automatically: objects
+        added by add_utterances() are added to it, and it is rebuilt on next use after the key is written to, or
+        after utterances are removed.
+
+        :param key: the metadata key to index
+        :param kind: whether to index the metadata of "utterances", "users" or "conversations"
+        """
+        objs = self._objects(kind)
+        index = MetaIndex(key, objs.keys(), (obj._meta for obj in objs.values()))
+        self._meta_indexes[kind][key] = index
+        self._meta_trackers[kind].indexes.setdefault(key, WeakSet()).add(index)
+
+    def drop_index(self, key: Hashable, kind: str = "utterances") -> None:
+        """
+        Removes an index built by create_index().
+
+        :param key: the indexed metadata key
+        :param kind: "utterances", "users" or "conversations"
+        """
+        index = self._meta_indexes[kind].pop(key, None)
+        if index is not None:
+            self._meta_trackers[kind].indexes[key].discard(index)
+
+    def _get_meta_index(self, key: Hashable, kind: str) -> Optional[MetaIndex]:
+        # the up to date index of the key, or None if the key is not indexed
+        index = self._meta_indexes[kind].get(key)
+        if index is not None and index.stale:
+            self.drop_index(key, kind)
+            self.create_index(key, kind)
+            index = self._meta_indexes[kind][key]
+        return index
+
+    def get_ids_with_meta(self, key: Hashable, values: Optional[Collection] = None, lower=None, upper=None,
+                          kind: str = "utterances") -> List[Hashable]:
+        """
+        Finds the utterances, users or conversations whose metadata value for a key is one of the given values and/or
+        lies within the given range. Objects without the key are never found. If the key is indexed (see
+        create_index()), this takes time proportional to the number of objects found; otherwise the Corpus is
+        scanned.
+
+        :param key: metadata key
+        :param values: values to match, e.g. [value] for an equality query (None to match any value)
+        :param lower: smallest value to match, inclusive (None for no lower bound)
+        :param upper: largest value to match, inclusive (None for no upper bound)
+        :param kind: whether to search "utterances", "users" or "conversations"
+        :return: list of the ids (for users, the names) of the objects found, in corpus order
+        """
+        index = self._get_meta_index(key, kind)
+        if index is None:
+            objs = self._objects(kind)
+            index = MetaIndex(key, objs.keys(), (obj._meta for obj in objs.values()))
+        return index.lookup(values, lower, upper)
+
+    def _sizes(self) -> Tuple[int, int, int]:
+        return len(self.utterances), len(self.all_users), len(self.conversations)
 
     @staticmethod
-    def dump_helper_bin(d: Dict, d_bin: Dict, utterances_idx: Dict) -> Dict:
+    def dump_helper_bin(d: Dict, d_bin: Dict, utterances_idx: Dict, strict: bool = False) -> Dict:
         """
+        Whether a field is json serializable is tested on its first value (and on values of other types): later
+        values of the type recorded in the index are assumed serializable, so that they are not encoded twice. If one
+        is not, encoding the output raises TypeError, and the values should be separated again with strict=True.
 
         :param d: The dict to encode
         :param d_bin: The dict of accumulated lists of binary attribs
-        :param utterances_idx:
-        :return:
+        :param utterances_idx: the type annotation of each field, filled in
+        :param strict: if True, test every value
+        :return: the dict to encode as json, with binary markers in place of the unserializable values
         """
         d_out = {}
         for k, v in d.items():
+            if type(v) in JSON_SCALAR_TYPES:
+                d_out[k] = v
+                if k not in utterances_idx:
+                    utterances_idx[k] = str(type(v))
+                continue
+            if not strict and utterances_idx.get(k) == str(type(v)):
+                d_out[k] = v
+                continue
             try:   # try saving the field
                 json.dumps(v)
                 d_out[k] = v
@@ -263,18 +796,52 @@ class Corpus:
         #pickle.dump(l_bin, f)
         return d_out
 
-    def dump(self, name: str, base_path: Optional[str]=None, save_to_existing_path: bool=False) -> None:
+    def dump(self, name: str, base_path: Optional[str]=None, save_to_existing_path: bool=False,
+             columnar: bool=False, incremental: bool=False, compression: Optional[str]=None,
+             n_shards: Optional[int]=None, n_workers: int=1, fast_json: bool=False,
+             sort_by_id: bool=False) -> None:
         """Dumps the corpus and its metadata to disk.
 
         :param name: name of corpus
         :param base_path: base directory to save corpus in (None to save to a default directory)
         :param save_to_existing_path: if True, save to the path you loaded the corpus from (supersedes base_path)
+        :param columnar: if True, save utterances in the columnar format (a subdirectory of typed arrays, a text
+            blob and one file per metadata field) instead of utterances.jsonl. Columnar corpora load faster and
+            skip excluded metadata fields without reading them.
+        :param incremental: if True, only write the utterance, user and conversation metadata fields that were
+            modified since the corpus was loaded (or last dumped), as sidecar files next to the existing corpus
+            files, which are left untouched. Only possible when saving to the directory the corpus was fully
+            loaded from (with no metadata excluded), with no utterances, users or conversations added or removed
+            since. Changes to anything
+            other than metadata (e.g. utterance text) are not saved by an incremental dump.
+        :param compression: compress utterances.jsonl, users.json, conversations.json and the binary metadata files
+            with this format: "gzip", "bz2", "xz" or "zstd" (zstd requires the zstandard package). Compressed
+            corpora are read transparently, but are decompressed as a stream, so partial loads cannot seek and
+            binary metadata is read eagerly. Cannot be combined with columnar.
+        :param n_shards: if given, partition the utterances into this many shards by conversation, each saved in
+            its own directory under utterances-shards, along with a manifest mapping conversation ids to shards.
+            A sharded corpus can then be partially loaded with Corpus(filename, conversation_ids=...) or
+            Corpus(filename, shards=...), which only read the shards needed. Cannot be combined with columnar.
+        :param n_workers: if greater than 1, write users.json, conversations.json, the utterances and corpus.json
+            concurrently, and encode the utterances in chunks in a pool of this many processes (None to use all
+            available cores)
+        :param fast_json: if True, encode json with the orjson package when it is installed (several times faster
+            than the json module). orjson writes NaN and infinite float values as null.
+        :param sort_by_id: if True, save the utterances in order of utterance id (within each shard, for a sharded
+            corpus) rather than in corpus order, as required by merge_many(); a ValueError is raised if the ids cannot
+            be compared with each other
         """
         dir_name = name
         if base_path is not None and save_to_existing_path:
             raise ValueError("Not allowed to specify both base_path and save_to_existing_path!")
         if save_to_existing_path and self.original_corpus_path is None:
             raise ValueError("Cannot use save to existing path on Corpus generated from utterance list!")
+        if columnar and compression is not None:
+            raise ValueError("Compression is not supported for the columnar format.")
+        if columnar and n_shards is not None:
+            raise ValueError("Sharding is not supported for the columnar format.")
+        if n_shards is not None and n_shards < 1:
+            raise ValueError("n_shards must be a positive integer")
         if not save_to_existing_path:
             if base_path is None:
                 base_path = os.path.expanduser("~/.convokit/")
@@ -290,68 +857,300 @@ class Corpus:
         if not os.path.exists(dir_name):
             os.mkdir(dir_name)
 
+        if incremental:
+            if self._loaded_dir != os.path.abspath(dir_name) or self._sizes() != self._loaded_sizes:
+                raise ValueError("Incremental dump is only possible to the directory the corpus was fully loaded "
+                                 "from (with no metadata excluded), with no utterances, users or conversations "
+                                 "added or removed since.")
+            self._dump_meta_delta(dir_name)
+            return
+
+        if n_workers is None: n_workers = os.cpu_count()
         utterances_idx, users_idx, convos_idx, overall_idx = {}, {}, {}, {}
 
-        with open(os.path.join(dir_name, "users.json"), "w") as f:
-            d_bin = defaultdict(list)
-            users = {u: Corpus.dump_helper_bin(self.get_user(u).meta, d_bin,
-                                               users_idx) for u in self.get_usernames()}
-            json.dump(users, f)
+        def dump_users():
+            self._dump_json_meta(os.path.join(dir_name, "users.json"), "-user-bin.p",
+                                 lambda d_bin, strict: {u: Corpus.dump_helper_bin(self.get_user(u)._meta, d_bin,
+                                                                                  users_idx, strict)
+                                                        for u in self.get_usernames()}, compression, fast_json)
+
+        def dump_conversations():
+            self._dump_json_meta(os.path.join(dir_name, "conversations.json"), "-convo-bin.p",
+                                 lambda d_bin, strict: {c: Corpus.dump_helper_bin(self.get_conversation(c)._meta,
+                                                                                  d_bin, convos_idx, strict)
+                                                        for c in self.get_conversation_ids()}, compression, fast_json)
+
+        def dump_utterances():
+            utterances = None
+            if sort_by_id:
+                try:
+                    utterances = sorted(self.iter_utterances(), key=lambda ut: _id_sort_key(ut.id))
+                except TypeError:
+                    raise _unorderable_ids_error("the Corpus") from None
+            if columnar:
+                utterances_idx.update(dump_columnar_utterances(dir_name, list(self.iter_utterances())
+                                                               if utterances is None else utterances))
+            elif n_shards is not None:
+                self._dump_utterances_sharded(dir_name, utterances_idx, n_shards, compression, pool, fast_json,
+                                              utterances)
+            else:
+                self._dump_utterances_jsonl(dir_name, utterances_idx, compression, utterances, pool=pool,
+                                            fast_json=fast_json)
+
+        def dump_overall():
+            self._dump_json_meta(os.path.join(dir_name, "corpus.json"), "-overall-bin.p",
+                                 lambda d_bin, strict: Corpus.dump_helper_bin(self.meta, d_bin, overall_idx, strict),
+                                 fast_json=fast_json)
+
+        if n_workers > 1:
+            # the files are independent, so they are written concurrently. The utterances, which make up most of
+            # the work, are written from this thread. The process pool they are encoded in is started first, since
+            # forking while the other threads are running could leave their locks held in the workers.
+            pool = Pool(n_workers) if not columnar else None
+            try:
+                with ThreadPoolExecutor(3) as executor:
+                    futures = [executor.submit(task) for task in [dump_users, dump_conversations, dump_overall]]
+                    dump_utterances()
+                    for future in futures:
+                        future.result()
+            except BaseException:
+                if pool is not None: pool.terminate()
+                raise
+            finally:
+                if pool is not None:
+                    pool.close()
+                    pool.join()
+        else:
+            pool = None
+            for task in [dump_users, dump_conversations, dump_utterances, dump_overall]:
+                task()
 
-            for name, l_bin in d_bin.items():
-                with open(os.path.join(dir_name, name + "-user-bin.p"), "wb") as f_pk:
-                    pickle.dump(l_bin, f_pk)
+        self.meta_index["utterances-index"] = utterances_idx
+        self.meta_index["users-index"] = users_idx
+        self.meta_index["conversations-index"] = convos_idx
+        self.meta_index["overall-index"] = overall_idx
+        self.meta_index["version"] = self.version
+        self.meta_index["utterances-format"] = "columnar" if columnar else "sharded" if n_shards is not None \
+            else "jsonl"
+        # the fingerprint is only saved if it was computed, so that dumping does not hash the whole Corpus
+        self.meta_index["fingerprint"] = self._fingerprint.state()
+        if self.meta_index["fingerprint"] is None: del self.meta_index["fingerprint"]
+        self.meta_index.pop("delta-fields", None)
+        remove_meta_delta(dir_name)
 
-        with open(os.path.join(dir_name, "conversations.json"), "w") as f:
-            d_bin = defaultdict(list)
-            convos = {c: Corpus.dump_helper_bin(self.get_conversation(c).meta,
-                                                d_bin, convos_idx) for c in self.get_conversation_ids()}
-            json.dump(convos, f)
+        with open(os.path.join(dir_name, "index.json"), "w") as f:
+            json.dump(self.meta_index, f)
+
+        if self._view_of is not None:
+            # the metadata trackers are shared with the full corpus, which still needs them for incremental dumps
+            return
+        self._loaded_dir = os.path.abspath(dir_name)
+        self._loaded_sizes = self._sizes()
+        for tracker in self._meta_trackers.values():
+            tracker.reset()
+
+    def _dump_meta_delta(self, dir_name: str) -> None:
+        """
+        Helper function for dump(incremental=True). Writes each modified utterance, user and conversation metadata
+        field as a sidecar column, rewrites corpus.json (which is small), and updates index.json to match.
+
+        :param dir_name: directory the corpus was loaded from
+        """
+        delta_fields = self.meta_index.setdefault("delta-fields", {})
+        for kind, objs, index_key in [("utterances", self.utterances, "utterances-index"),
+                                      ("users", self.all_users, "users-index"),
+                                      ("conversations", self.conversations, "conversations-index")]:
+            tracker = self._meta_trackers[kind]
+            if not tracker.dirty: continue
+            ids = list(objs.keys())
+            metas = [obj._meta for obj in objs.values()]
+            fields = delta_fields.setdefault(kind, [])
+            for field in sorted(tracker.dirty, key=str):
+                field_type = dump_meta_delta(dir_name, kind, field, ids, metas)
+                if field_type is None:
+                    self.meta_index[index_key].pop(field, None)
+                else:
+                    self.meta_index[index_key][field] = field_type
+                if field not in fields: fields.append(field)
+            tracker.reset()
 
-            for name, l_bin in d_bin.items():
-                with open(os.path.join(dir_name, name + "-convo-bin.p"), "wb") as f_pk:
-                    pickle.dump(l_bin, f_pk)
+        overall_idx = {}
+        self._dump_json_meta(os.path.join(dir_name, "corpus.json"), "-overall-bin.p",
+                             lambda d_bin, strict: Corpus.dump_helper_bin(self.meta, d_bin, overall_idx, strict))
+        self.meta_index["overall-index"] = overall_idx
+        self.meta_index["version"] = self.version
+        # the utterances are unchanged, but the sums of the metadata fields written to are dropped
+        self.meta_index["fingerprint"] = self._fingerprint.state()
+        if self.meta_index["fingerprint"] is None: del self.meta_index["fingerprint"]
 
-        with open(os.path.join(dir_name, "utterances.jsonl"), "w") as f:
+        with open(os.path.join(dir_name, "index.json"), "w") as f:
+            json.dump(self.meta_index, f)
+
+    @staticmethod
+    def _dump_json_meta(filename: str, bin_suffix: str, encode: Callable[[Dict], object],
+                        compression: Optional[str] = None, fast_json: bool = False) -> None:
+        """
+        Helper function for dump(). Writes a json file of metadata (users.json, conversations.json or corpus.json),
+        and the binary metadata files that go with it.
+
+        :param filename: path of the json file
+        :param bin_suffix: suffix of the binary metadata files, e.g. "-user-bin.p"
+        :param encode: function that takes the dict of accumulated lists of binary attribs and whether to test every
+            value (see dump_helper_bin), and returns the json serializable contents of the file
+        :param compression: compression format to write the files with, if any
+        :param fast_json: whether to use the fast json encoder (see dump())
+        """
+        try:
             d_bin = defaultdict(list)
+            data = json_dumps(encode(d_bin, False), fast_json)
+        except (TypeError, OverflowError):
+            d_bin = defaultdict(list)
+            data = json_dumps(encode(d_bin, True), fast_json)
+        with open_file(filename, "wb", compression) as f:
+            f.write(data)
+        for name, l_bin in d_bin.items():
+            dump_bin_records(os.path.join(os.path.dirname(filename), name + bin_suffix), l_bin, compression)
+
+    def _dump_utterances_sharded(self, dir_name: str, utterances_idx: Dict, n_shards: int,
+                                 compression: Optional[str] = None, pool: Optional[Pool] = None,
+                                 fast_json: bool = False, utterances: Optional[List[Utterance]] = None) -> None:
+        """
+        Helper function for dump(n_shards=...). Writes the utterances of each shard to its own directory, in the same
+        format as an unsharded utterances.jsonl, followed by the shard manifest.
+
+        :param dir_name: corpus directory to write to
+        :param utterances_idx: utterances-index to fill in with the type of each metadata field
+        :param n_shards: number of shards
+        :param compression: compression format to write the files with, if any
+        :param pool: process pool to encode the utterances in (None to encode them in this process)
+        :param fast_json: whether to use the fast json encoder (see dump())
+        :param utterances: utterances to write, in order (None to write all utterances of the corpus)
+        """
+        if utterances is None: utterances = self.iter_utterances()
+        shards_dir = os.path.join(dir_name, SHARDS_DIR)
+        if os.path.exists(shards_dir):
+            shutil.rmtree(shards_dir)
+        os.mkdir(shards_dir)
+
+        convo_shards = {convo_id: shard_of(convo_id, n_shards) for convo_id in self.get_conversation_ids()}
+        shard_utts = [[] for _ in range(n_shards)]
+        for ut in utterances:
+            shard_utts[convo_shards[ut.root]].append(ut)
+        for shard, utts in enumerate(shard_utts):
+            os.mkdir(shard_path(dir_name, shard))
+            self._dump_utterances_jsonl(shard_path(dir_name, shard), utterances_idx, compression, utts, pool,
+                                        fast_json)
+        dump_shard_manifest(dir_name, n_shards, convo_shards)
+
+    def _dump_utterances_jsonl(self, dir_name: str, utterances_idx: Dict, compression: Optional[str] = None,
+                               utterances: Optional[List[Utterance]] = None, pool: Optional[Pool] = None,
+                               fast_json: bool = False, chunk_size: int = 10000) -> None:
+        """
+        Helper function for dump(). Writes utterances.jsonl, the byte-offset index and binary utterance metadata.
+
+        :param dir_name: corpus (or shard) directory to write to
+        :param utterances_idx: utterances-index to fill in with the type of each metadata field
+        :param compression: compression format to write the files with, if any
+        :param utterances: utterances to write (None to write all utterances of the corpus)
+        :param pool: process pool to encode the utterances in, chunk_size utterances at a time (None to encode them
+            in this process)
+        :param fast_json: whether to use the fast json encoder (see dump())
+        :param chunk_size: number of utterances encoded at a time
+        """
+        if utterances is None: utterances = list(self.iter_utterances())
 
-            for ut in self.iter_utterances():
-                ut_obj = {
+        def chunks(d_bin, strict, failed):
+            # binary metadata is separated out here, in order, so that workers only encode json
+            it = iter(utterances)
+            while not failed:
+                chunk = [{
                     KeyId: ut.id,
                     KeyConvoRoot: ut.root,
                     KeyText: ut.text,
                     KeyUser: ut.user.name,
-                    KeyMeta: self.dump_helper_bin(ut.meta, d_bin, utterances_idx),
+                    KeyMeta: self.dump_helper_bin(ut._meta, d_bin, utterances_idx, strict),
                     KeyReplyTo: ut.reply_to,
                     KeyTimestamp: ut.timestamp
-                }
-                json.dump(ut_obj, f)
-                f.write("\n")
-
-            for name, l_bin in d_bin.items():
-                with open(os.path.join(dir_name, name + "-bin.p"), "wb") as f_pk:
-                    pickle.dump(l_bin, f_pk)
+                } for ut in islice(it, chunk_size)]
+                if not chunk: return
+                yield chunk, fast_json
+
+        # the file is written again, testing every metadata value, if a value assumed serializable is not (see
+        # dump_helper_bin)
+        for strict in [False, True]:
+            d_bin, failed = defaultdict(list), []
+            try:
+                with open_file(os.path.join(dir_name, "utterances.jsonl"), "wb", compression) as f:
+                    line_lengths = []
+                    encoded = pool.imap(encode_jsonl_chunk, chunks(d_bin, strict, failed)) if pool is not None \
+                        else map(encode_jsonl_chunk, chunks(d_bin, strict, failed))
+                    for data, lengths in encoded:
+                        f.write(data)
+                        line_lengths.extend(lengths)
+                break
+            except (TypeError, OverflowError):
+                if strict: raise
+                failed.append(True) # stops the pool from encoding the remaining chunks
+        for name, l_bin in d_bin.items():
+            dump_bin_records(os.path.join(dir_name, name + "-bin.p"), l_bin, compression)
+
+        # sidecar index of line byte offsets, used to seek to utterance_start_index when loading. Compressed files
+        # cannot be seeked into, so they are read as a stream instead.
+        offsets_file = offsets_path(os.path.join(dir_name, "utterances.jsonl"))
+        if compression is None:
+            dump_jsonl_offsets(os.path.join(dir_name, "utterances.jsonl"), line_lengths)
+        elif os.path.exists(offsets_file):
+            os.remove(offsets_file)
 
-        with open(os.path.join(dir_name, "corpus.json"), "w") as f:
-            d_bin = defaultdict(list)
-            meta_up = Corpus.dump_helper_bin(self.meta, d_bin, overall_idx)
-            #            keys = ["utterances-index", "conversations-index", "users-index",
-            #                "overall-index"]
-            #            meta_minus = {k: v for k, v in overall_idx.items() if k not in keys}
-            #            meta_up["overall-index"] = meta_minus
-            json.dump(meta_up, f)
-            for name, l_bin in d_bin.items():
-                with open(os.path.join(dir_name, name + "-overall-bin.p"), "wb") as f_pk:
-                    pickle.dump(l_bin, f_pk)
+    @staticmethod
+    def stream(filename: str, fields: Optional[Collection[str]] = None,
+               exclude_utterance_meta: Optional[List[str]] = None,
+               by_conversation: bool = False) -> Generator:
+        """
+        Iterates over the utterances saved in a corpus directory or utterances file without loading the corpus:
+        utterances are read from disk one at a time, so memory use does not grow with the size of the corpus.
+        This is meant for jobs that make a single pass over the utterances (e.g. counting or exporting features).
 
-        self.meta_index["utterances-index"] = utterances_idx
-        self.meta_index["users-index"] = users_idx
-        self.meta_index["conversations-index"] = convos_idx
-        self.meta_index["overall-index"] = overall_idx
-        self.meta_index["version"] = self.version
+        The Utterances are not part of any Corpus, and their Users only have a name (no metadata). Metadata fields
+        saved by incremental dumps (see dump(incremental=True)) are held in memory while iterating.
 
-        with open(os.path.join(dir_name, "index.json"), "w") as f:
-            json.dump(self.meta_index, f)
+        :param filename: Path to a folder containing a Corpus or to an utterances.jsonl / utterances.json file
+        :param fields: Utterance attributes to read, among "user", "root", "reply_to", "timestamp", "text" and
+            "meta" (None to read all of them). The id is always read; the attributes that are not read are None.
+        :param exclude_utterance_meta: utterance metadata to be ignored
+        :param by_conversation: if True, yield the utterances of each conversation together, as a list. This
+            requires the utterances of each conversation to be stored consecutively (e.g. an utterances file sorted
+            by root); a ValueError is raised if a conversation's utterances are found to be split up.
+        :return: a generator of Utterances, or of lists of Utterances if by_conversation is True
+        """
+        fields = {"user", "root", "reply_to", "timestamp", "text", "meta"} if fields is None else set(fields)
+        exclude_utterance_meta = [] if exclude_utterance_meta is None else exclude_utterance_meta
+        utts = (Utterance(id=u[KeyId],
+                          user=User(name=u.get(KeyUser)) if "user" in fields else None,
+                          root=u.get(KeyConvoRoot) if "root" in fields or by_conversation else None,
+                          # temp fix for reddit reply_to
+                          reply_to=u.get("reply_to", u.get(KeyReplyTo)) if "reply_to" in fields else None,
+                          timestamp=u.get(KeyTimestamp) if "timestamp" in fields else None,
+                          text=u.get(KeyText) if "text" in fields else None,
+                          meta=u.get(KeyMeta) if "meta" in fields else None)
+                for u in _iter_utterance_dicts(filename, exclude_utterance_meta, "meta" in fields))
+        if not by_conversation:
+            yield from utts
+            return
+
+        convo, seen_roots = [], set()
+        for utt in utts:
+            if convo and utt.root != convo[0].root:
+                yield convo
+                convo = []
+            if not convo:
+                if utt.root in seen_roots:
+                    raise ValueError("Utterances of conversation {} are not stored consecutively; "
+                                     "cannot group utterances by conversation".format(utt.root))
+                seen_roots.add(utt.root)
+            convo.append(utt)
+        if convo:
+            yield convo
 
     def get_utterance_ids(self) -> List:
         return list(self.utterances.keys())
@@ -378,7 +1177,11 @@ class Corpus:
         """
         Creates a subset of the utterances filtered by certain attributes. Irreversible.
         If the method is run again, it will filter the already filtered subset.
-        Always takes the intersection of the specified key-pairs
+        Always takes the intersection of the specified key-pairs. To keep the full corpus,
+        use subset() to get a view of the filtered utterances instead.
+
+        Metadata keys that are indexed (see create_index()) are looked up in their index, and only the utterances
+        found are checked against the other key-pairs.
         """
         if regular_kv_pairs is None: regular_kv_pairs = dict()
         if meta_kv_pairs is None: meta_kv_pairs = dict()
@@ -386,14 +1189,29 @@ class Corpus:
 
         regular_keys = list(regular_kv_pairs.keys())
         meta_keys = list(meta_kv_pairs.keys())
-        for uid, utterance in self.utterances.items():
-            meta_dict = utterance.meta
+        candidates = None
+        for key in meta_keys:
+            index = self._get_meta_index(key, "utterances")
+            if index is None: continue
+            found = index.lookup([meta_kv_pairs[key]])
+            if candidates is None:
+                candidates = found
+            else:
+                found = set(found)
+                candidates = [uid for uid in candidates if uid in found]
+        if candidates is not None:
+            meta_keys = [key for key in meta_keys if key not in self._meta_indexes["utterances"]]
+        items = self.utterances.items() if candidates is None else ((uid, self.utterances[uid]) for uid in candidates)
+        for uid, utterance in items:
+            meta_dict = utterance._meta
             regular = all(utterance.get(key) == regular_kv_pairs[key] for key in regular_keys)
             meta = all(meta_dict[key] == meta_kv_pairs[key] for key in meta_keys)
             if regular and meta:
                 new_utterances[uid] = utterance
 
         self.utterances = new_utterances
+        self._loaded_dir = None
+        self._reset_indexes()
 
     #    def earliest_n_utterances(self, n, uts=None):
     #        """Returns the first n utterances (ordered by time)."""
@@ -419,17 +1237,15 @@ class Corpus:
         :return: Dictionary from thread root ids to threads, where a thread is
             itself a dictionary from utterance ids to utterances.
         """
-        threads = defaultdict(list)
-        for ut in self.utterances.values():
-            if include_root:
-                threads[ut.root].append(ut)
-            else:
-                top_level_comment = ut.get("meta")["top_level_comment"]
-                if top_level_comment is None: continue # i.e. this is a post (root) utterance
-                threads[top_level_comment].append(ut)
-        return {root: {utt.id: utt for utt in list(sorted(l,
-                                                          key=lambda x: x.timestamp))[-suffix_len:prefix_len]}
-                for root, l in threads.items()}
+        # threads are sliced from the cached timelines, so each thread costs O(prefix_len + suffix_len). Comment
+        # threads are grouped by the top-level reply they belong to in the reply tree.
+        arrays = self.get_arrays()
+        keys = arrays.conversation_ids if include_root else arrays.ids
+        threads = {}
+        for key, timeline in self._get_timelines(include_root).items():
+            thread = [self.utterances[arrays.ids[i]] for i in timeline[-suffix_len:prefix_len]]
+            threads[keys[key]] = {utt.id: utt for utt in thread}
+        return threads
 
     def get_meta(self) -> Dict:
         return self.meta
@@ -488,14 +1304,12 @@ class Corpus:
             function, or all speaking pairs in the dataset if no selector
             function was used.
         """
+        arrays = self.get_arrays()
         pairs = set()
-        for u2 in self.utterances.values():
-            if u2.user is not None and u2.reply_to is not None and u2.reply_to in self.utterances:
-                u1 = self.utterances[u2.reply_to]
-                if u1.user is not None:
-                    if selector is None or selector(u2.user, u1.user):
-                        pairs.add((u2.user.name, u1.user.name) if
-                                  user_names_only else (u2.user, u1.user))
+        for speaker, target in zip(*(idx.tolist() for idx in self.interaction_matrix().pairs())):
+            u2, u1 = arrays.users[speaker], arrays.users[target]
+            if selector is None or selector(u2, u1):
+                pairs.add((u2.name, u1.name) if user_names_only else (u2, u1))
         return pairs
 
     def pairwise_exchanges(self, selector: Optional[Callable[[User, User], bool]]=None,
@@ -512,14 +1326,14 @@ class Corpus:
         :return: Dictionary mapping (speaker, target) tuples to a list of
             utterances given by the speaker in reply to the target.
         """
+        arrays, interactions = self.get_arrays(), self.interaction_matrix()
+        utts = list(self.utterances.values())
         pairs = defaultdict(list)
-        for u2 in self.utterances.values():
-            if u2.user is not None and u2.reply_to is not None:
-                u1 = self.utterances[u2.reply_to]
-                if u1.user is not None:
-                    if selector is None or selector(u2.user, u1.user):
-                        key = (u2.user.name, u1.user.name) if user_names_only else (u2.user, u1.user)
-                        pairs[key].append(u2)
+        for k, (speaker, target) in enumerate(zip(*(idx.tolist() for idx in interactions.pairs()))):
+            u2, u1 = arrays.users[speaker], arrays.users[target]
+            if selector is None or selector(u2, u1):
+                key = (u2.name, u1.name) if user_names_only else (u2, u1)
+                pairs[key].extend(utts[i] for i in interactions.pair_replies(k))
         return pairs
 
     def iterate_by(self, iter_type: str,
@@ -704,44 +1518,279 @@ class Corpus:
                                   "Overwriting with other corpus's conversation metadata".format(convo.id, key)))
                 curr_meta[key] = val
 
-        new_corpus.update_users_data()
-
         return new_corpus
 
-    def add_utterances(self, utterances=List[Utterance]):
+    @staticmethod
+    def merge_many(paths: List[str], out_path: str, warnings: bool = True, compression: Optional[str] = None,
+                   fast_json: bool = False) -> None:
         """
-        Add utterances to the Corpus
+        Merges corpora saved on disk into a new corpus directory, with the same result as loading them and merging
+        them one after the other with merge(), but without loading them: the utterances of all the corpora are read
+        and written in a single streaming k-way merge by utterance id, so memory use does not grow with the number
+        of utterances. User, conversation and corpus metadata, which is much smaller, is merged in memory.
 
-        If the corpus has utterances that share an id with an utterance in the input utterance list,
+        The utterances of each corpus must be stored in order of utterance id, as saved by dump(sort_by_id=True) or
+        by merge_many(); a ValueError is raised if they are not, or if ids (of the same or different corpora) cannot be
+        compared with each other. Sharded corpora are read one shard at a time, so they can only be merged if they were
+        saved with a single shard.
 
+        Conflicting data and metadata are handled as by merge(), with each corpus taking the place of the other
+        corpus for the ones before it in paths, and the same warnings are printed.
+
+        :param paths: corpus directories (or utterances files) to merge
+        :param out_path: directory to save the merged corpus in
+        :param warnings: print warnings when data conflicts are encountered
+        :param compression: compression format to save the merged corpus with (see dump())
+        :param fast_json: whether to use the fast json encoder (see dump())
+        :return: None
+        """
+        if os.path.abspath(out_path) in [os.path.abspath(path) for path in paths]:
+            raise ValueError("Cannot save the merged corpus to the directory of one of the corpora being merged")
+        if not os.path.exists(out_path):
+            os.mkdir(out_path)
+        utterances_idx, users_idx, convos_idx, overall_idx = {}, {}, {}, {}
+
+        def sorted_utterances(path):
+            prev_id = None
+            for u in _iter_utterance_dicts(path, []):
+                if prev_id is not None:
+                    try:
+                        unordered = _id_sort_key(u[KeyId]) < _id_sort_key(prev_id)
+                    except TypeError:
+                        raise _unorderable_ids_error("{} ({!r} and {!r})".format(path, prev_id, u[KeyId])) from None
+                    if unordered:
+                        raise ValueError("Utterances of {} are not stored in order of utterance id (found {} after "
+                                         "{}); save the corpus with dump(sort_by_id=True) to merge it"
+                                         .format(path, u[KeyId], prev_id))
+                prev_id = u[KeyId]
+                yield Utterance(id=u[KeyId], user=User(name=u.get(KeyUser)), root=u.get(KeyConvoRoot),
+                                # temp fix for reddit reply_to
+                                reply_to=u.get("reply_to", u.get(KeyReplyTo)), timestamp=u.get(KeyTimestamp),
+                                text=u.get(KeyText), meta=u.get(KeyMeta))
+
+        def merged_utterances():
+            # the utterances of all the corpora, in order of id
+            merged = heapq.merge(*[sorted_utterances(path) for path in paths], key=lambda ut: _id_sort_key(ut.id))
+            while True:
+                try:
+                    utt = next(merged)
+                except StopIteration:
+                    return
+                except TypeError:
+                    # ids of different corpora that cannot be compared
+                    raise _unorderable_ids_error("the corpora being merged") from None
+                yield utt
+
+        # Merge UTTERANCES, writing each one out once all the corpora holding its id have been read
+        merged = merged_utterances()
+        d_bin = BinRecordWriters(out_path, "-bin.p", compression)
+        line_lengths = array("Q")
+        try:
+            with open_file(os.path.join(out_path, "utterances.jsonl"), "wb", compression) as f:
+                for _, same_id in groupby(merged, key=lambda ut: ut.id):
+                    utt = next(same_id)
+                    for other in same_id:
+                        utt, = Corpus._merge_utterances([utt], [other], warnings=warnings)
+                    obj = {
+                        KeyId: utt.id,
+                        KeyConvoRoot: utt.root,
+                        KeyText: utt.text,
+                        KeyUser: utt.user.name,
+                        KeyMeta: Corpus.dump_helper_bin(utt.meta, d_bin, utterances_idx),
+                        KeyReplyTo: utt.reply_to,
+                        KeyTimestamp: utt.timestamp
+                    }
+                    try:
+                        line = json_dumps(obj, fast_json) + b"\n"
+                    except (TypeError, OverflowError):
+                        # a value assumed serializable is not (see dump_helper_bin): the values that were not
+                        # separated out are tested again
+                        meta = obj[KeyMeta]
+                        meta.update(Corpus.dump_helper_bin({k: utt.meta[k] for k, v in meta.items()
+                                                            if _bin_marker_index(v) is None},
+                                                           d_bin, utterances_idx, strict=True))
+                        line = json_dumps(obj, fast_json) + b"\n"
+                    f.write(line)
+                    line_lengths.append(len(line))
+        finally:
+            d_bin.close()
+        offsets_file = offsets_path(os.path.join(out_path, "utterances.jsonl"))
+        if compression is None:
+            dump_jsonl_offsets(os.path.join(out_path, "utterances.jsonl"), line_lengths)
+        elif os.path.exists(offsets_file):
+            os.remove(offsets_file)
+
+        # Merge USER, CONVERSATION and CORPUS metadata
+        users_meta, users_meta_conflict = defaultdict(dict), {}
+        convos_meta, overall_meta = defaultdict(dict), {}
+        for path in paths:
+            if not os.path.isdir(path): continue
+            with open(os.path.join(path, "index.json"), "r") as f:
+                meta_index = json.load(f)
+            for name, meta in _load_json_meta(path, meta_index, "users").items():
+                for key, val in meta.items():
+                    if key in users_meta[name] and users_meta[name][key] != val:
+                        users_meta_conflict[name, key] = True
+                    users_meta[name][key] = val
+            for convo_id, meta in _load_json_meta(path, meta_index, "conversations").items():
+                for key, val in meta.items():
+                    if key in convos_meta[convo_id] and convos_meta[convo_id][key] != val:
+                        if warnings: print(warning("Found conflicting values for conversation: {} for meta key: {}. "
+                                      "Overwriting with other corpus's conversation metadata".format(convo_id, key)))
+                    convos_meta[convo_id][key] = val
+            for key, val in _load_json_meta(path, meta_index, "overall").items():
+                if key in overall_meta and overall_meta[key] != val:
+                    if warnings: print(warning("Found conflicting values for corpus metadata: {}. "
+                                  "Overwriting with other corpus's metadata.".format(key)))
+                overall_meta[key] = val
+        if warnings:
+            for name, key in users_meta_conflict:
+                print(warning("Multiple values found for {} for meta key: {}. "
+                              "Taking the latest one found".format(name, key)))
+
+        Corpus._dump_json_meta(os.path.join(out_path, "users.json"), "-user-bin.p",
+                               lambda d_bin, strict: {name: Corpus.dump_helper_bin(meta, d_bin, users_idx, strict)
+                                                      for name, meta in users_meta.items()}, compression, fast_json)
+        Corpus._dump_json_meta(os.path.join(out_path, "conversations.json"), "-convo-bin.p",
+                               lambda d_bin, strict: {convo_id: Corpus.dump_helper_bin(meta, d_bin, convos_idx,
+                                                                                       strict)
+                                                      for convo_id, meta in convos_meta.items()},
+                               compression, fast_json)
+        Corpus._dump_json_meta(os.path.join(out_path, "corpus.json"), "-overall-bin.p",
+                               lambda d_bin, strict: Corpus.dump_helper_bin(overall_meta, d_bin, overall_idx, strict),
+                               fast_json=fast_json)
+        remove_meta_delta(out_path)
+
+        meta_index = {"utterances-index": utterances_idx, "users-index": users_idx,
+                      "conversations-index": convos_idx, "overall-index": overall_idx,
+                      "version": 0, "utterances-format": "jsonl"}
+        with open(os.path.join(out_path, "index.json"), "w") as f:
+            json.dump(meta_index, f)
+
+    def add_utterances(self, utterances: List[Utterance]) -> "Corpus":
+        """
+        Add utterances to the Corpus, in place. The Corpus is updated rather than rebuilt: the utterances are
+        appended to their conversations (new conversations are created for new roots), the utterance and
+        conversation maps of their Users are updated, and any metadata indexes, CorpusArrays, interaction matrix and
+        conversation timelines already built are extended with them, in (amortized) time proportional to the number
+        of utterances added and to the size of the conversations they join. The reply tree, the comment thread
+        timelines and the time index of slice_by_time() are instead rebuilt on next use, in time linear in the size
+        of the Corpus.
+
+        Utterances with the same id as an utterance of the Corpus are handled as by merge():
         Warnings will be printed:
         - if the utterances with same id do not share the same data (added utterance is ignored)
         - added utterances' metadata have the same key but different values (added utterance's metadata will overwrite)
 
+        A User of the added utterances with the same name as a User of the Corpus is replaced by the User of the
+        Corpus, with its metadata updated as by merge().
+
         :param utterances: Utterances to be added to the Corpus
-        :return: a new Corpus with the utterances from this Corpus and the input utterances combined
+        :return: this Corpus, with the input utterances added
+        """
+        trackers = self._meta_trackers
+        new_utts, new_users, new_convos = [], [], []
+        for utt in utterances:
+            if utt.id in self.utterances:
+                self._merge_utterances([self.utterances[utt.id]], [utt], warnings=True)
+                continue
+
+            user = utt.user
+            if user is not None:
+                corpus_user = self.all_users.get(user.name)
+                if corpus_user is None:
+                    user._meta = bind_meta(user._meta, trackers["users"])
+                    if self._view_of is None:
+                        user._owner, user._utterances, user._conversations = self, {}, {}
+                    self.all_users[user.name] = user
+                    new_users.append(user)
+                elif corpus_user is not user:
+                    for key, val in user.meta.items():
+                        if key in corpus_user.meta and corpus_user.meta[key] != val:
+                            print(warning("Multiple values found for {} for meta key: {}. "
+                                          "Taking the latest one found".format(corpus_user, key)))
+                        corpus_user.meta[key] = val
+                    utt.user = user = corpus_user
+
+            convo = self.conversations.get(utt.root)
+            if convo is None:
+                convo = Conversation(self, id=utt.root, utterances=[], meta=trackers["conversations"].empty)
+                self.conversations[utt.root] = convo
+                new_convos.append(convo)
+            convo._utterance_ids.append(utt.id)
+            if convo._usernames is not None and user is not None:
+                convo._usernames.add(user.name)
+
+            utt._meta = bind_meta(utt._meta, trackers["utterances"], utt.id)
+            self.utterances[utt.id] = utt
+            if user is not None and self._view_of is None and user._utterances is not None:
+                # maps that have not been built yet will include the utterance when they are. The Users of a view
+                # keep the utterance and conversation maps of the full corpus.
+                user._utterances[utt.id] = utt
+                user._conversations[convo.id] = convo
+            new_utts.append(utt)
+
+        for kind, objs in [("utterances", {utt.id: utt for utt in new_utts}),
+                           ("users", {user.name: user for user in new_users}),
+                           ("conversations", {convo.id: convo for convo in new_convos})]:
+            for index in self._meta_indexes[kind].values():
+                if not index.stale:
+                    index.add(objs.keys(), (obj._meta for obj in objs.values()))
+        timelines = None
+        if self._arrays is not None:
+            arrays, start = self._arrays, len(self._arrays)
+            was_object = arrays.timestamp.dtype == object
+            linked = arrays.extend(new_utts)
+            if self._interactions is not None:
+                self._interactions.add(linked)
+            timelines = self._timelines.get(True)
+            if timelines is not None and (arrays.timestamp.dtype == object) == was_object:
+                arrays.extend_groups(timelines, arrays.conversation, start)
+            else:
+                # the timestamps were converted to objects, so the timelines are sorted again
+                timelines = None
+        # the reply tree, the comment thread timelines (which depend on it) and the time index are rebuilt from the
+        # arrays on next use, in time linear in the size of the Corpus
+        self._reply_tree = None
+        self._timelines = {} if timelines is None else {True: timelines}
+        self._time_order = None
+        self._fingerprint.add(new_utts)
+        return self
+
+    def _reset_users_data(self) -> None:
+        """
+        Makes the Users of the Corpus build their utterance and conversation maps on first access (see
+        update_users_data), instead of building them when the Corpus is constructed.
         """
-        helper_corpus = Corpus(utterances=utterances)
-        return self.merge(helper_corpus)
+        for user in self.all_users.values():
+            user._owner = self
+            user._utterances = None
+            user._conversations = None
 
     def update_users_data(self) -> None:
         """
-        Updates the conversation and utterance lists of every User in the Corpus
+        Updates the conversation and utterance lists of every User in the Corpus. This is done automatically when
+        the lists of a User are first accessed.
+
         :return: None
         """
-        users_utts = defaultdict(list)
-        users_convos = defaultdict(list)
-
-        for utt in self.iter_utterances():
-            users_utts[utt.user].append(utt)
-
-        for convo in self.iter_conversations():
-            for utt in convo.iter_utterances():
-                users_convos[utt.user].append(convo)
-
-        for user in self.iter_users():
-            user.utterances = {utt.id: utt for utt in users_utts[user]}
-            user.conversations = {convo.id: convo for convo in users_convos[user]}
+        users_utts = defaultdict(dict)
+        users_convos = defaultdict(dict)
+
+        for utt in self.utterances.values():
+            users_utts[utt.user][utt.id] = utt
+
+        for convo in self.conversations.values():
+            for utt_id in convo._utterance_ids:
+                # filter_utterances_by() leaves the removed utterances in the conversations' lists
+                utt = self.utterances.get(utt_id)
+                if utt is not None:
+                    users_convos[utt.user][convo.id] = convo
+
+        for user in self.all_users.values():
+            user._owner = self
+            user._utterances = users_utts.get(user, {})
+            user._conversations = users_convos.get(user, {})
 
     def print_summary_stats(self) -> None:
         """
@@ -0,0 +1,203 @@
+from typing import Dict, List, Collection, Optional, Tuple
+import numpy as np
+
+_NUMBERS = (int, float, np.integer, np.floating)
+
+
+def timestamp_key(timestamp):
+    """Sort key for timestamps stored as Python objects, which puts missing (None) timestamps last instead of
+    comparing them to the others."""
+    return timestamp is None, timestamp
+
+class CorpusArrays:
+    """A struct-of-arrays view of the structure of a Corpus: every utterance gets a dense integer index (its position
+    in Corpus.iter_utterances()), and its reply-to parent, conversation, user and timestamp are stored in NumPy arrays
+    indexed by it. Thread, reply and speaker-pair computations can then run vectorized over the arrays instead of
+    looping over Utterance objects.
+
+    Built by Corpus.get_arrays(), and extended by Corpus.add_utterances(); otherwise the arrays reflect the corpus as it
+    was when they were built.
+
+    :param utterances: the Utterances of the corpus, in iteration order
+
+    :ivar ids: utterance ids, by utterance index
+    :ivar index: dictionary from utterance id to utterance index
+    :ivar parent: index of the utterance each utterance replies to, or -1 if it is not a reply or the utterance it
+        replies to is not in the corpus
+    :ivar conversation: index (into conversation_ids) of the conversation of each utterance
+    :ivar user: index (into users) of the user of each utterance, or -1 if it has no user
+    :ivar timestamp: timestamps of the utterances, as float64 (NaN for missing timestamps), or as an object array
+        if some timestamps are not numbers
+    :ivar conversation_ids: conversation ids, by conversation index
+    :ivar conversation_index: dictionary from conversation id to conversation index
+    :ivar users: Users, by user index
+    """
+
+    def __init__(self, utterances: List):
+        self.ids, self.index = [], {}
+        self.conversation_index, self.conversation_ids = {}, []
+        self._user_index, self.users = {}, []
+        # the arrays are views of the first len(self) entries of buffers whose capacity is doubled as needed, so
+        # that extending them costs amortized constant time per utterance rather than a copy of the arrays
+        self._n = 0
+        self._parent = np.empty(0, dtype=np.int64)
+        self._conversation = np.empty(0, dtype=np.int64)
+        self._user = np.empty(0, dtype=np.int64)
+        self._timestamp = np.empty(0, dtype=np.float64)
+        # indices of the replies to utterances that are not in the corpus, by the id replied to
+        self._dangling = {}
+        self.extend(utterances)
+
+    parent = property(lambda self: self._parent[:self._n])
+    conversation = property(lambda self: self._conversation[:self._n])
+    user = property(lambda self: self._user[:self._n])
+    timestamp = property(lambda self: self._timestamp[:self._n])
+
+    def _reserve(self, k: int) -> None:
+        # makes room in the buffers for k more utterances
+        if self._n + k <= len(self._parent): return
+        capacity = max(2 * len(self._parent), self._n + k)
+        for name in ["_parent", "_conversation", "_user", "_timestamp"]:
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self._n] = old[:self._n]
+            setattr(self, name, new)
+
+    def extend(self, utterances: List) -> np.ndarray:
+        """Appends utterances that were added to the corpus, in amortized time proportional to their number.
+        Replies already indexed whose parent is among the new utterances are linked to it.
+
+        :param utterances: the new Utterances, in iteration order
+        :return: the indices of the utterances whose parent was set: the new replies, and the replies already
+            indexed that were linked to a new utterance
+        """
+        start, stop = self._n, self._n + len(utterances)
+        self._reserve(len(utterances))
+        for i, utt in enumerate(utterances, start):
+            self.ids.append(utt.id)
+            self.index[utt.id] = i
+
+        parent = self._parent[start:stop]
+        parent[:] = np.fromiter((self.index.get(utt.reply_to, -1) if utt.reply_to is not None else -1
+                                 for utt in utterances), dtype=np.int64, count=len(utterances))
+        for i, utt in enumerate(utterances, start):
+            if utt.reply_to is not None and parent[i - start] < 0:
+                self._dangling.setdefault(utt.reply_to, []).append(i)
+        linked = [start + np.flatnonzero(parent >= 0)]
+        for i, utt in enumerate(utterances, start):
+            if utt.id in self._dangling:
+                linked.append(np.array(self._dangling[utt.id], dtype=np.int64))
+                self._parent[self._dangling.pop(utt.id)] = i
+
+        convo_index, user_index = self.conversation_index, self._user_index
+        conversation = self._conversation[start:stop]
+        user = self._user[start:stop]
+        for i, utt in enumerate(utterances):
+            if utt.root not in convo_index:
+                convo_index[utt.root] = len(self.conversation_ids)
+                self.conversation_ids.append(utt.root)
+            conversation[i] = convo_index[utt.root]
+            if utt.user is None:
+                user[i] = -1
+                continue
+            if utt.user not in user_index:
+                user_index[utt.user] = len(self.users)
+                self.users.append(utt.user)
+            user[i] = user_index[utt.user]
+
+        timestamps = [utt.timestamp for utt in utterances]
+        if self._timestamp.dtype != object:
+            # only numbers are stored as float64: other timestamps (e.g. strings, even numeric ones) are compared as
+            # Python objects
+            if all(t is None or isinstance(t, _NUMBERS) for t in timestamps):
+                timestamps = [np.nan if t is None else t for t in timestamps]
+            else:
+                # the timestamps already indexed are converted back
+                converted = np.empty(len(self._timestamp), dtype=object)
+                converted[:start] = [None if np.isnan(t) else t for t in self._timestamp[:start].tolist()]
+                self._timestamp = converted
+        self._timestamp[start:stop] = np.array(timestamps, dtype=self._timestamp.dtype)
+        self._n = stop
+        return np.concatenate(linked)
+
+    def __len__(self):
+        return self._n
+
+    def replies_to_missing(self, utt_id) -> np.ndarray:
+        """
+        :param utt_id: id of an utterance that is not in the corpus
+        :return: the indices of the utterances replying to it
+        """
+        return np.array(self._dangling.get(utt_id, []), dtype=np.int64)
+
+    def usernames(self) -> List[str]:
+        """
+        :return: the names of the users, by user index
+        """
+        return [user.name for user in self.users]
+
+    def user_mask(self, users: Collection, names: bool = False) -> np.ndarray:
+        """Returns a boolean array over user indices, with one extra entry at the end (for utterances with no user,
+        whose user index is -1) that is always False.
+
+        :param users: the Users (or usernames) to select
+        :param names: whether users holds usernames rather than Users
+        """
+        mask = np.zeros(len(self.users) + 1, dtype=bool)
+        for i, user in enumerate(self.users):
+            mask[i] = (user.name if names else user) in users
+        return mask
+
+    def sorted_groups(self, groups: np.ndarray, members: Optional[np.ndarray] = None) -> Dict[int, np.ndarray]:
+        """Groups utterances, and sorts the utterances of each group by timestamp (keeping utterances with equal
+        timestamps in corpus order).
+
+        :param groups: the group of each utterance (by utterance index), or -1 for utterances not in any group
+        :param members: the indices of the utterances to group (default: all of them)
+        :return: dictionary from group to the indices of its utterances, in timestamp order. Groups are ordered by
+            their first utterance in the corpus.
+        """
+        if members is None: members = np.arange(len(groups))
+        members = members[groups[members] >= 0]
+        if len(members) == 0: return {}
+        if self.timestamp.dtype == object:
+            order = np.array(sorted(members, key=lambda i: (groups[i], timestamp_key(self.timestamp[i]))),
+                             dtype=np.int64)
+        else:
+            order = members[np.lexsort((self.timestamp[members], groups[members]))]
+        keys, starts = np.unique(groups[order], return_index=True)
+        parts = np.split(order, starts[1:])
+        firsts = np.argsort([part.min() for part in parts], kind="stable")
+        return {int(keys[i]): parts[i] for i in firsts}
+
+    def extend_groups(self, sorted_groups: Dict[int, np.ndarray], groups: np.ndarray, start: int) -> None:
+        """Updates the result of sorted_groups() in place with the utterances appended by extend() from index start
+        on, in time proportional to the sizes of the groups they belong to.
+
+        :param sorted_groups: the result of sorted_groups(groups) for the utterances before start
+        :param groups: the group of each utterance, as for sorted_groups()
+        :param start: index of the first utterance to add
+        """
+        timestamp = self.timestamp
+        for key, part in self.sorted_groups(groups, np.arange(start, len(groups))).items():
+            if key not in sorted_groups:
+                sorted_groups[key] = part
+                continue
+            # the new utterances come after those of the group in corpus order, so a stable sort keeps ties in
+            # corpus order
+            merged = np.concatenate([sorted_groups[key], part])
+            if timestamp.dtype == object:
+                sorted_groups[key] = np.array(sorted(merged, key=lambda i: timestamp_key(timestamp[i])),
+                                              dtype=np.int64)
+            else:
+                sorted_groups[key] = merged[np.argsort(timestamp[merged], kind="stable")]
+
+    def reply_indices(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Finds the replies between utterances that both have a user.
+
+        :return: the indices of the replying utterances, and of the utterances they reply to
+        """
+        replies = np.flatnonzero(self.parent >= 0)
+        parents = self.parent[replies]
+        has_users = (self.user[replies] >= 0) & (self.user[parents] >= 0)
+        return replies[has_users], parents[has_users]
@@ -0,0 +1,177 @@
+import hashlib
+from typing import Collection, Dict, Hashable, Iterable, Optional
+from weakref import WeakSet
+import numpy as np
+from .convoKitMeta import ConvoKitMeta, LazyValue, MetaTracker, MISSING
+from .utterance import Utterance
+
+# digests are summed modulo 2^128, so that the fingerprint does not depend on the order of the utterances and can be
+# updated as utterances are added
+_MOD = 1 << 128
+
+_PLAIN_TYPES = (str, int, float, bool, complex, bytes)
+
+
+def stable_repr(value) -> str:
+    """A representation of a value that does not change across processes or machines: dictionaries and sets are
+    sorted, numpy values are converted to Python values, functions are represented by their code, and objects with
+    the default repr (which holds their address) by their type.
+
+    :param value: the value to represent
+    """
+    if value is None or type(value) in _PLAIN_TYPES:
+        return repr(value)
+    if isinstance(value, np.generic):
+        # checked before subclasses of the plain types, since e.g. numpy.float64 subclasses float
+        return stable_repr(value.item())
+    if isinstance(value, _PLAIN_TYPES):
+        # other subclasses of the plain types are represented by their plain value
+        return repr(next(t for t in _PLAIN_TYPES if isinstance(value, t))(value))
+    if isinstance(value, dict):
+        return "{" + ", ".join(sorted(stable_repr(k) + ": " + stable_repr(v) for k, v in value.items())) + "}"
+    if isinstance(value, (set, frozenset)):
+        return "{" + ", ".join(sorted(stable_repr(v) for v in value)) + "}"
+    if isinstance(value, (list, tuple)):
+        return "[" + ", ".join(stable_repr(v) for v in value) + "]"
+    if isinstance(value, np.ndarray):
+        return "ndarray({}, {}, {})".format(value.dtype, value.shape, hashlib.sha1(value.tobytes()).hexdigest())
+    name = type(value).__module__ + "." + type(value).__qualname__
+    if callable(value) and hasattr(value, "__code__"):
+        # functions (including lambdas) are identified by their code
+        code = value.__code__
+        return name + "(" + value.__qualname__ + ", " + code.co_code.hex() + ", " + stable_repr(
+            [c for c in code.co_consts if not hasattr(c, "co_code")]) + ")"
+    if isinstance(getattr(value, "meta", None), dict):
+        # e.g. spaCy pipelines, whose meta holds the name and version of the model
+        return name + "(" + stable_repr(value.meta) + ")"
+    if type(value).__repr__ is not object.__repr__:
+        return name + "(" + repr(value) + ")"
+    return name
+
+
+def _digest(data: str) -> int:
+    return int.from_bytes(hashlib.blake2b(data.encode(), digest_size=16).digest(), "big")
+
+
+def _content_sum(utterances: Iterable[Utterance]) -> int:
+    user_reprs = {None: "None"} # repr(User) builds a string, so it is computed once per user
+    total = 0
+    for utt in utterances:
+        user = utt.user
+        user_repr = user_reprs.get(user)
+        if user_repr is None:
+            user_repr = user_reprs[user] = stable_repr(repr(user))
+        total += _digest("[" + ", ".join([stable_repr(utt.id), stable_repr(utt.root), stable_repr(utt.reply_to),
+                                          stable_repr(utt.timestamp), user_repr, stable_repr(utt.text)]) + "]")
+    return total
+
+
+def _value_digest(key: Hashable, utt_id: Hashable, value) -> int:
+    return _digest(stable_repr([key, utt_id, value]))
+
+
+def _field_digest(utt: Utterance, key: Hashable) -> int:
+    # 0 (which leaves the sum unchanged) for utterances without the field
+    if key not in utt._meta: return 0
+    return _value_digest(key, utt.id, utt._meta[key])
+
+
+class _FieldSum:
+    # the sum of the digests of one metadata field over the utterances of a Corpus, which the MetaTracker updates when
+    # the field is written to, or marks stale if the write cannot be attributed to an utterance
+    __slots__ = ("key", "value", "utterances", "stale", "__weakref__")
+
+    def __init__(self, key: Hashable, value: int, utterances: Dict[Hashable, Utterance]):
+        self.key = key
+        self.value = value
+        self.utterances = utterances
+        self.stale = False
+
+    def update(self, meta: ConvoKitMeta, owner_id: Optional[Hashable], value) -> bool:
+        # swaps the digest of the value held by meta for the digest of the value written (see MetaTracker.mark)
+        if self.stale or owner_id is None or isinstance(value, LazyValue): return False
+        utt = self.utterances.get(owner_id)
+        if utt is None or utt._meta is not meta:
+            # not the metadata of one of the utterances summed, e.g. of an utterance outside a subset view
+            return True
+        key = self.key
+        old = _value_digest(key, owner_id, meta[key]) if key in meta else 0
+        new = 0 if value is MISSING else _value_digest(key, owner_id, value)
+        self.value = (self.value - old + new) % _MOD
+        return True
+
+
+class CorpusFingerprint:
+    """Content hash of the utterances of a Corpus: their ids, text, structure (root and reply_to), timestamps and
+    users, and optionally some of their metadata fields. The hash of each utterance is computed separately and the
+    hashes are summed, so that the fingerprint does not depend on the order of the utterances, and utterances added
+    to the Corpus are hashed without rehashing the others. The hash of each metadata field is cached, and a write to
+    the field swaps the hash of the value replaced for the hash of the value written; values modified in place are not
+    noticed.
+
+    Built by Corpus.fingerprint(), and saved in index.json when the Corpus is dumped after it was computed.
+
+    :param tracker: the MetaTracker of the utterances of the Corpus
+    :param utterances: the utterances of the Corpus, by id
+    """
+
+    def __init__(self, tracker: MetaTracker, utterances: Dict[Hashable, Utterance]):
+        self._tracker = tracker
+        self._utterances = utterances
+        self._content = None
+        self._fields = {}
+
+    def add(self, utterances: Iterable[Utterance]) -> None:
+        """Updates the fingerprint with utterances added to the Corpus.
+
+        :param utterances: the new utterances
+        """
+        utterances = list(utterances)
+        if self._content is not None:
+            self._content = (self._content + _content_sum(utterances)) % _MOD
+        for key, field_sum in self._fields.items():
+            if not field_sum.stale:
+                field_sum.value = (field_sum.value + sum(_field_digest(utt, key) for utt in utterances)) % _MOD
+
+    def _field_sum(self, key: Hashable, utterances: Collection[Utterance]) -> int:
+        field_sum = self._fields.get(key)
+        if field_sum is None or field_sum.stale:
+            self._set_field(key, sum(_field_digest(utt, key) for utt in utterances) % _MOD)
+        return self._fields[key].value
+
+    def _set_field(self, key: Hashable, value: int) -> None:
+        field_sum = _FieldSum(key, value, self._utterances)
+        self._fields[key] = field_sum
+        self._tracker.indexes.setdefault(key, WeakSet()).add(field_sum)
+
+    def hexdigest(self, utterances: Collection[Utterance], meta_fields: Collection[Hashable] = ()) -> str:
+        """
+        :param utterances: the utterances of the Corpus
+        :param meta_fields: utterance metadata fields to include
+        :return: the fingerprint, as a hexadecimal string
+        """
+        if self._content is None:
+            self._content = _content_sum(utterances) % _MOD
+        h = hashlib.sha1("{:032x}".format(self._content).encode())
+        for key in sorted(set(meta_fields), key=stable_repr):
+            h.update("\0{}\0{:032x}".format(stable_repr(key), self._field_sum(key, utterances)).encode())
+        return h.hexdigest()
+
+    def state(self) -> Optional[Dict]:
+        """
+        :return: the sums computed so far (for the fields whose sums are not stale), to be saved in index.json, or
+            None if the fingerprint has not been computed
+        """
+        if self._content is None: return None
+        return {"content": "{:032x}".format(self._content),
+                "fields": {key: "{:032x}".format(field_sum.value) for key, field_sum in self._fields.items()
+                           if not field_sum.stale and isinstance(key, str)}}
+
+    def restore(self, state: Dict) -> None:
+        """Restores the sums saved by state(), for a Corpus loaded in full (with no metadata excluded).
+
+        :param state: the saved sums
+        """
+        self._content = int(state["content"], 16)
+        for key, value in state["fields"].items():
+            self._set_field(key, int(value, 16))
@@ -0,0 +1,967 @@
+"""
+Helper functions used by Corpus for reading and writing corpus files on disk.
+"""
+
+import bz2
+import gzip
+import json
+import lzma
+import mmap
+import os
+import pickle
+import re
+import shutil
+import sys
+import zlib
+from array import array
+from itertools import islice
+from multiprocessing import Pool
+from typing import List, Dict, Optional, Tuple, Iterable
+import numpy as np
+from .convoKitMeta import ConvoKitMeta, LazyValue
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def json_dumps(obj, fast: bool = False) -> bytes:
+    """
+    Encodes an object as utf-8 json.
+
+    :param obj: the object to encode
+    :param fast: if True and the orjson package is installed, encode with orjson, which is several times faster
+        than the json module. Objects orjson cannot encode fall back to the json module. Note that orjson writes
+        NaN and infinite floats as null.
+    :return: the encoded bytes
+    """
+    if fast and orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass
+    return json.dumps(obj).encode("utf-8")
+
+
+def encode_jsonl_chunk(args: Tuple[List, bool]) -> Tuple[bytes, List[int]]:
+    """
+    Encodes a chunk of objects as jsonl lines, e.g. in a worker process of Corpus.dump().
+
+    :param args: tuple of the list of objects to encode, and whether to use the fast encoder (see json_dumps)
+    :return: tuple of the encoded lines, concatenated, and the length in bytes of each line
+    """
+    objs, fast = args
+    lines = [json_dumps(obj, fast) + b"\n" for obj in objs]
+    return b"".join(lines), [len(line) for line in lines]
+
+
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "bz2": ".bz2", "xz": ".xz", "zstd": ".zst"}
+COMPRESSION_MAGIC = [(b"\x1f\x8b", "gzip"), (b"BZh", "bz2"), (b"\xfd7zXZ\x00", "xz"), (b"\x28\xb5\x2f\xfd", "zstd")]
+
+
+def detect_compression(filename: str) -> Optional[str]:
+    """
+    Detects the compression format of a file from its first bytes.
+
+    :param filename: path to the file
+    :return: "gzip", "bz2", "xz" or "zstd", or None if the file is not compressed
+    """
+    with open(filename, "rb") as f:
+        head = f.read(6)
+    for magic, compression in COMPRESSION_MAGIC:
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def resolve_path(filename: str) -> str:
+    """
+    Finds the file to read for a given corpus file name: the file itself if it exists, otherwise its compressed
+    version (e.g. utterances.jsonl.gz for utterances.jsonl).
+
+    :param filename: path of the uncompressed file
+    :return: path of the file that exists, or filename if there is none
+    """
+    if os.path.exists(filename): return filename
+    for suffix in COMPRESSION_SUFFIXES.values():
+        if os.path.exists(filename + suffix):
+            return filename + suffix
+    return filename
+
+
+def open_file(filename: str, mode: str = "r", compression: Optional[str] = None):
+    """
+    Opens a corpus file, transparently (de)compressing it as a stream.
+
+    When reading, the compression format is detected from the file's first bytes, whatever its name. When writing
+    with a compression format, the compression suffix (e.g. ".gz") is appended to filename, and any other version
+    of the file, compressed or not, is removed so that it cannot be read in place of the new one.
+
+    :param filename: path to the file (without compression suffix when writing)
+    :param mode: "r", "rb", "w" or "wb"
+    :param compression: when writing, one of "gzip", "bz2", "xz" and "zstd", or None for no compression. The zstd
+        format requires the zstandard package.
+    :return: a file object
+    """
+    text = "b" not in mode
+    if mode.startswith("r"):
+        compression = detect_compression(filename)
+    else:
+        if compression is not None and compression not in COMPRESSION_SUFFIXES:
+            raise ValueError("Unknown compression format: {}. Expected one of {}".format(
+                compression, ", ".join(COMPRESSION_SUFFIXES)))
+        for path in [filename] + [filename + suffix for suffix in COMPRESSION_SUFFIXES.values()]:
+            if os.path.exists(path): os.remove(path)
+        if compression is not None:
+            filename += COMPRESSION_SUFFIXES[compression]
+
+    raw_mode = mode[0] + ("t" if text else "b")
+    if compression is None:
+        return open(filename, mode)
+    elif compression == "gzip":
+        return gzip.open(filename, raw_mode)
+    elif compression == "bz2":
+        return bz2.open(filename, raw_mode)
+    elif compression == "xz":
+        return lzma.open(filename, raw_mode)
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("Reading or writing zstd-compressed corpora requires the zstandard package. "
+                          "Run `pip install zstandard` and retry.")
+    return zstandard.open(filename, raw_mode)
+
+
+def offsets_path(filename: str) -> str:
+    """
+    :param filename: path to a jsonl file
+    :return: path of the byte-offset index for that file, e.g. utterances-offsets.bin for utterances.jsonl
+    """
+    return os.path.splitext(filename)[0] + "-offsets.bin"
+
+
+def dump_jsonl_offsets(filename: str, line_lengths: Iterable[int]) -> None:
+    """
+    Writes the byte-offset index for a jsonl file: the byte offset at which every line starts, followed by the
+    total size of the file (which is used to detect a stale index).
+
+    :param filename: path to the jsonl file that was written
+    :param line_lengths: length in bytes of every line of the file, including the trailing newline
+    """
+    offsets = array("Q", [0])
+    for length in line_lengths:
+        offsets.append(offsets[-1] + length)
+    if sys.byteorder == "big": offsets.byteswap()
+    with open(offsets_path(filename), "wb") as f:
+        offsets.tofile(f)
+
+
+def load_jsonl_offsets(filename: str) -> Optional[array]:
+    """
+    Loads the byte-offset index for a jsonl file.
+
+    :param filename: path to the jsonl file
+    :return: array of line start offsets (with the file size as its last entry), or None if there is no index or
+        it does not match the current contents of the file
+    """
+    path = offsets_path(filename)
+    if not os.path.exists(path): return None
+    offsets = array("Q")
+    with open(path, "rb") as f:
+        offsets.frombytes(f.read())
+    if sys.byteorder == "big": offsets.byteswap()
+    if len(offsets) == 0 or offsets[-1] != os.path.getsize(filename):
+        return None
+    return offsets
+
+
+def _jsonl_chunk_boundaries(filename: str, n_chunks: int) -> List[Tuple[int, int]]:
+    """
+    Splits a jsonl file into (at most) n_chunks byte ranges, each of which starts and ends on a line boundary.
+
+    :param filename: path to the jsonl file
+    :param n_chunks: number of ranges to split the file into
+    :return: list of (start byte, end byte) tuples, in file order
+    """
+    size = os.path.getsize(filename)
+    bounds = [0]
+    with open(filename, "rb") as f:
+        for i in range(1, n_chunks):
+            pos = size * i // n_chunks
+            if pos <= bounds[-1]: continue
+            f.seek(pos)
+            f.readline() # move to the start of the next line
+            pos = f.tell()
+            if pos >= size: break
+            if pos > bounds[-1]:
+                bounds.append(pos)
+    bounds.append(size)
+    return [(start, end) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+
+def _load_jsonl_chunk(args: Tuple[str, int, int]) -> List[Dict]:
+    """
+    Decodes every line in the given byte range of a jsonl file. Runs inside a worker process.
+
+    :param args: (path to the jsonl file, start byte, end byte)
+    :return: list of decoded json objects, in file order
+    """
+    filename, start, end = args
+    with open(filename, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return [json.loads(line) for line in data.splitlines() if line.strip()]
+
+
+def _decode_jsonl_lines(lines: List[bytes]) -> List[Dict]:
+    return [json.loads(line) for line in lines if line.strip()]
+
+
+def _iter_line_batches(lines: Iterable, start_index: int, end_index: float,
+                       batch_size: int = 10000) -> Iterable[List]:
+    """
+    Groups the lines numbered start_index to end_index (inclusive) into batches, stopping as soon as end_index is
+    passed.
+    """
+    batch = []
+    for idx, line in enumerate(lines):
+        if idx > end_index: break
+        if idx < start_index: continue
+        batch.append(line)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch: yield batch
+
+
+def load_jsonl(filename: str, start_index: Optional[int] = None, end_index: Optional[int] = None,
+               n_workers: int = 1) -> List[Dict]:
+    """
+    Loads the lines of a jsonl file (e.g. utterances.jsonl) as a list of dicts.
+
+    :param filename: path to the jsonl file. If the file does not exist, a compressed version of it (see
+        resolve_path) is read instead.
+    :param start_index: line number (zero-indexed) to begin parsing from
+    :param end_index: line number (zero-indexed) of the last line to be parsed
+    :param n_workers: number of processes to decode the file with. If greater than 1, the file is split into byte
+        ranges that are decoded in parallel; results are returned in file order.
+
+    If a byte-offset index (see dump_jsonl_offsets) exists for the file, only the requested range of lines is read.
+    Compressed files are decompressed as a stream; with several workers, batches of lines are decoded in parallel.
+    :return: list of decoded json objects
+    """
+    if start_index is None: start_index = 0
+    if end_index is None: end_index = float('inf')
+    if n_workers is None: n_workers = os.cpu_count()
+
+    filename = resolve_path(filename)
+    if detect_compression(filename) is not None:
+        with open_file(filename, "rb") as f:
+            batches = _iter_line_batches(f, start_index, end_index)
+            if n_workers > 1:
+                with Pool(n_workers) as pool:
+                    return [obj for chunk in pool.imap(_decode_jsonl_lines, batches) for obj in chunk]
+            return [obj for batch in batches for obj in _decode_jsonl_lines(batch)]
+
+    offsets = load_jsonl_offsets(filename)
+    if offsets is not None:
+        # seek straight to the requested range of lines instead of scanning from the start of the file
+        first, last = max(start_index, 0), min(end_index, len(offsets) - 2)
+        if first > last: return []
+        if n_workers > 1:
+            n_lines = last - first + 1
+            n_chunks = min(n_workers * 4, n_lines)
+            line_bounds = [first + n_lines * i // n_chunks for i in range(n_chunks + 1)]
+            tasks = [(filename, offsets[lo], offsets[hi]) for lo, hi in zip(line_bounds[:-1], line_bounds[1:])]
+            with Pool(n_workers) as pool:
+                chunks = pool.map(_load_jsonl_chunk, tasks)
+            return [obj for chunk in chunks for obj in chunk]
+        utterances = []
+        with open(filename, "rb") as f:
+            f.seek(offsets[first])
+            for idx, line in enumerate(f, first):
+                if idx > last: break
+                utterances.append(json.loads(line))
+        return utterances
+
+    if n_workers > 1:
+        # use a few chunks per worker so that uneven line lengths do not leave workers idle
+        tasks = [(filename, start, end) for start, end in _jsonl_chunk_boundaries(filename, n_workers * 4)]
+        with Pool(n_workers) as pool:
+            chunks = pool.map(_load_jsonl_chunk, tasks)
+        lines = [obj for chunk in chunks for obj in chunk]
+        start_index = max(start_index, 0)
+        if end_index == float('inf'):
+            return lines[start_index:]
+        return lines[start_index:max(end_index + 1, 0)]
+
+    utterances = []
+    with open(filename, "r") as f:
+        for idx, line in enumerate(f):
+            if idx > end_index: break
+            if start_index <= idx:
+                utterances.append(json.loads(line))
+    return utterances
+
+
+def bin_offsets_path(filename: str) -> str:
+    """
+    :param filename: path to a binary metadata file, e.g. parsed-bin.p
+    :return: path of the per-record offset index for that file, e.g. parsed-bin-offsets.bin
+    """
+    return os.path.splitext(filename)[0] + "-offsets.bin"
+
+
+def dump_bin_records(filename: str, values: List, compression: Optional[str] = None) -> None:
+    """
+    Writes binary (not json serializable) metadata values as a sequence of individually pickled records, together
+    with an index of the byte offset of every record, so that single values can be read without unpickling the
+    whole file.
+
+    :param filename: path of the file to write, e.g. parsed-bin.p
+    :param values: the values to write; the i-th value can later be read with BinRecordReader(filename).load(i)
+    :param compression: compression to write the file with (see open_file); offsets then refer to positions in the
+        uncompressed stream
+    """
+    with BinRecordWriter(filename, compression) as writer:
+        for value in values:
+            writer.append(value)
+
+
+class BinRecordWriter:
+    """
+    Writes binary metadata values one at a time, in the format of dump_bin_records, e.g. while streaming utterances
+    to disk. Use as a context manager, or call close() to write the offset index.
+
+    :param filename: path of the file to write, e.g. parsed-bin.p
+    :param compression: compression to write the file with (see open_file)
+    """
+    def __init__(self, filename: str, compression: Optional[str] = None):
+        self.filename = filename
+        self.offsets = array("Q", [0])
+        self._file = open_file(filename, "wb", compression)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def append(self, value) -> int:
+        """
+        Writes a value.
+
+        :return: the position of the value, to read it back with BinRecordReader(filename).load(position)
+        """
+        record = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        self._file.write(record)
+        self.offsets.append(self.offsets[-1] + len(record))
+        return len(self.offsets) - 2
+
+    def close(self) -> None:
+        self._file.close()
+        offsets = array("Q", self.offsets)
+        if sys.byteorder == "big": offsets.byteswap()
+        with open(bin_offsets_path(self.filename), "wb") as f:
+            offsets.tofile(f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class BinRecordWriters(dict):
+    """
+    Dictionary of BinRecordWriters by metadata field, each opened when its field is first written to. It can stand
+    in for the dictionary of lists of binary values filled in by Corpus.dump_helper_bin, so that the values are
+    written out as they are found rather than accumulated in memory. Call close() once done.
+
+    :param dir_name: directory to write the files to
+    :param suffix: suffix of the file names, after the field name (e.g. "-bin.p")
+    :param compression: compression to write the files with (see open_file)
+    """
+    def __init__(self, dir_name: str, suffix: str, compression: Optional[str] = None):
+        super().__init__()
+        self.dir_name = dir_name
+        self.suffix = suffix
+        self.compression = compression
+
+    def __missing__(self, field: str) -> BinRecordWriter:
+        writer = BinRecordWriter(os.path.join(self.dir_name, field + self.suffix), self.compression)
+        self[field] = writer
+        return writer
+
+    def close(self) -> None:
+        for writer in self.values():
+            writer.close()
+
+
+class BinRecordReader:
+    """
+    Reads individual records from a binary metadata file written by dump_bin_records. The file is opened on first
+    use and kept open.
+
+    :param filename: path of the binary metadata file
+    """
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.offsets = array("Q")
+        with open(bin_offsets_path(filename), "rb") as f:
+            self.offsets.frombytes(f.read())
+        if sys.byteorder == "big": self.offsets.byteswap()
+        self._file = None
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def load(self, idx: int):
+        if self._file is None:
+            self._file = open(self.filename, "rb")
+        self._file.seek(self.offsets[idx])
+        return pickle.load(self._file)
+
+    def load_all(self) -> List:
+        with open_file(resolve_path(self.filename), "rb") as f:
+            return [pickle.load(f) for _ in range(len(self))]
+
+    def __getstate__(self):
+        # open file handles cannot be pickled; reopen lazily after unpickling
+        state = self.__dict__.copy()
+        state["_file"] = None
+        return state
+
+    def __del__(self):
+        if getattr(self, "_file", None) is not None:
+            self._file.close()
+
+
+def load_bin_field(filename: str, lazy: bool = False):
+    """
+    Loads a binary metadata file, in either the per-record format written by dump_bin_records or the older format
+    of a single pickled list.
+
+    :param filename: path of the binary metadata file. If the file does not exist, a compressed version of it (see
+        resolve_path) is read instead.
+    :param lazy: if True and the file has a per-record offset index, return a BinRecordReader instead of reading
+        the values. Compressed files cannot be read lazily and are always read in full.
+    :return: a list of values, or a BinRecordReader
+    """
+    if os.path.exists(bin_offsets_path(filename)):
+        reader = BinRecordReader(filename)
+        lazy = lazy and detect_compression(resolve_path(filename)) is None
+        return reader if lazy else reader.load_all()
+    with open_file(resolve_path(filename), "rb") as f:
+        return pickle.load(f)
+
+
+_JSON_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+def iter_json_array(filename: str, chunk_size: int = 1 << 20) -> Iterable:
+    """
+    Iterates over the elements of a (possibly compressed) file holding a single json array, such as utterances.json,
+    decoding one element at a time. Unlike json.load, the file is read in chunks, so only the element being decoded
+    needs to fit in memory.
+
+    :param filename: path to the json file. If the file does not exist, a compressed version of it (see
+        resolve_path) is read instead.
+    :param chunk_size: number of characters to read at a time
+    :return: generator of decoded elements
+    """
+    decoder = json.JSONDecoder()
+    with open_file(resolve_path(filename), "r") as f:
+        buf, pos, eof = "", 0, False
+        state = "start" # "start": before "[", "first": after "[", "value": after ",", "sep": after an element
+        while True:
+            pos = _JSON_WHITESPACE.match(buf, pos).end()
+            if pos == len(buf):
+                if eof:
+                    raise ValueError("{}: unexpected end of file while reading json array".format(filename))
+                chunk = f.read(chunk_size)
+                buf, pos, eof = buf[pos:] + chunk, 0, not chunk
+                continue
+            c = buf[pos]
+            if state == "start":
+                if c != "[":
+                    raise ValueError("{}: expected a json array".format(filename))
+                pos, state = pos + 1, "first"
+                continue
+            if state in ("first", "sep") and c == "]":
+                return
+            if state == "sep":
+                if c != ",":
+                    raise ValueError("{}: expected ',' or ']' at character {}".format(filename, pos))
+                pos, state = pos + 1, "value"
+                continue
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+                # a value that ends exactly at the end of the buffer may have been cut off (e.g. a number)
+                truncated = end == len(buf) and not eof
+            except json.JSONDecodeError:
+                if eof: raise
+                truncated = True
+            if truncated:
+                # grow the buffer geometrically so that large elements are not re-parsed too many times
+                chunk = f.read(max(chunk_size, len(buf) - pos))
+                buf, pos, eof = buf[pos:] + chunk, 0, not chunk
+                continue
+            yield obj
+            pos, state = end, "sep"
+            if pos > chunk_size:
+                buf, pos = buf[pos:], 0
+
+
+def json_array_to_jsonl(filename: str, out_filename: str, compression: Optional[str] = None) -> int:
+    """
+    Converts a file holding a json array (e.g. utterances.json) into a jsonl file with one element per line (e.g.
+    utterances.jsonl), reading the input incrementally. For uncompressed output, the byte-offset index used by
+    load_jsonl is also written.
+
+    :param filename: path to the json file
+    :param out_filename: path of the jsonl file to write (without compression suffix)
+    :param compression: compression format to write the jsonl file with, if any (see open_file)
+    :return: number of elements written
+    """
+    line_lengths = []
+    with open_file(out_filename, "w", compression) as f:
+        for obj in iter_json_array(filename):
+            line = json.dumps(obj) + "\n"
+            f.write(line)
+            line_lengths.append(len(line.encode("utf-8")))
+    if compression is None:
+        dump_jsonl_offsets(out_filename, line_lengths)
+    return len(line_lengths)
+
+
+COLUMNS_DIR = "utterances-columns"
+
+
+def _dump_meta_column(path: str, values: List, missing: List[int]) -> str:
+    """
+    Writes a single utterance metadata field as its own column file: <path>.json if every value is json
+    serializable, otherwise <path>.p (pickled).
+
+    :param path: path of the column file, without extension
+    :param values: values of the field for the utterances that have it, in row order
+    :param missing: row numbers of the utterances that do not have the field
+    :return: the type annotation of the field for index.json
+    """
+    column = {"missing": missing, "values": values}
+    try:
+        encoded = json.dumps(column)
+    except (TypeError, OverflowError): # unserializable
+        dump_bin_records(path + ".p", values)
+        with open(path + "-missing.json", "w") as f:
+            json.dump(missing, f)
+        return "bin"
+    with open(path + ".json", "w") as f:
+        f.write(encoded)
+    return str(type(values[0])) if values else str(type(None))
+
+
+def _load_meta_column(path: str) -> Dict:
+    """
+    Loads a column written by _dump_meta_column. Values of binary columns are LazyValues that are only unpickled
+    when first accessed.
+    """
+    if os.path.exists(path + ".json"):
+        with open(path + ".json", "r") as f:
+            return json.load(f)
+    with open(path + "-missing.json", "r") as f:
+        missing = json.load(f)
+    reader = BinRecordReader(path + ".p")
+    return {"missing": missing, "values": [LazyValue(reader, i) for i in range(len(reader))]}
+
+
+def _dump_string_column(path: str, strings: List[Optional[str]]) -> None:
+    """
+    Writes a list of strings as one utf-8 blob (<path>.bin) plus the byte offset of every string
+    (<path>-offsets.npy). None values are recorded in <path>-null.npy.
+    """
+    encoded = [b"" if s is None else s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    np.save(path + "-offsets.npy", offsets)
+    with open(path + ".bin", "wb") as f:
+        f.write(b"".join(encoded))
+    nulls = np.array([s is None for s in strings], dtype=bool)
+    if nulls.any():
+        np.save(path + "-null.npy", nulls)
+    elif os.path.exists(path + "-null.npy"):
+        os.remove(path + "-null.npy")
+
+
+def _timestamp_column_type(timestamps: List) -> str:
+    if all(t is None or (isinstance(t, int) and not isinstance(t, bool)) for t in timestamps):
+        return "int64"
+    if all(t is None or isinstance(t, (int, float)) and not isinstance(t, bool) for t in timestamps):
+        return "float64"
+    return "json"
+
+
+def dump_columnar_utterances(dir_name: str, utterances: List) -> Dict[str, str]:
+    """
+    Writes utterances in the columnar format: ids, roots, reply-tos, users and timestamps as typed arrays, texts as
+    one offsets + bytes blob, and each metadata field as its own column file, all within the utterances-columns
+    subdirectory of dir_name.
+
+    :param dir_name: corpus directory to write to
+    :param utterances: list of Utterances to write, in row order
+    :return: the utterances-index (metadata field name -> type annotation) for index.json
+    """
+    # read every metadata column before the old column files are removed, since lazily loaded values may still
+    # need to be read from them
+    fields = []
+    for utt in utterances:
+        for k in utt._meta:
+            if k not in fields: fields.append(k)
+    meta_columns = []
+    for field in fields:
+        values, missing = [], []
+        for i, utt in enumerate(utterances):
+            if field in utt._meta:
+                values.append(utt._meta[field])
+            else:
+                missing.append(i)
+        meta_columns.append((field, values, missing))
+
+    col_dir = os.path.join(dir_name, COLUMNS_DIR)
+    if os.path.exists(col_dir):
+        shutil.rmtree(col_dir)
+    os.mkdir(col_dir)
+    os.mkdir(os.path.join(col_dir, "meta"))
+
+    # every id referenced by the utterances; the first len(utterances) entries are the utterance ids themselves
+    keys = [utt.id for utt in utterances]
+    key_idx = {key: i for i, key in enumerate(keys)}
+    def key_index(key):
+        if key is None: return -1
+        if key not in key_idx:
+            key_idx[key] = len(keys)
+            keys.append(key)
+        return key_idx[key]
+    root = np.array([key_index(utt.root) for utt in utterances], dtype=np.int64)
+    reply_to = np.array([key_index(utt.reply_to) for utt in utterances], dtype=np.int64)
+
+    user_names = []
+    user_idx = {}
+    for utt in utterances:
+        if utt.user is not None and utt.user.name not in user_idx:
+            user_idx[utt.user.name] = len(user_names)
+            user_names.append(utt.user.name)
+    user = np.array([-1 if utt.user is None else user_idx[utt.user.name] for utt in utterances], dtype=np.int32)
+
+    timestamps = [utt.timestamp for utt in utterances]
+    timestamp_type = _timestamp_column_type(timestamps)
+    if timestamp_type == "json":
+        with open(os.path.join(col_dir, "timestamp.json"), "w") as f:
+            json.dump(timestamps, f)
+    else:
+        np.save(os.path.join(col_dir, "timestamp.npy"),
+                np.array([0 if t is None else t for t in timestamps], dtype=timestamp_type))
+        np.save(os.path.join(col_dir, "timestamp-null.npy"), np.array([t is None for t in timestamps], dtype=bool))
+
+    with open(os.path.join(col_dir, "keys.json"), "w") as f:
+        json.dump(keys, f)
+    with open(os.path.join(col_dir, "users.json"), "w") as f:
+        json.dump(user_names, f)
+    np.save(os.path.join(col_dir, "root.npy"), root)
+    np.save(os.path.join(col_dir, "reply_to.npy"), reply_to)
+    np.save(os.path.join(col_dir, "user.npy"), user)
+    _dump_string_column(os.path.join(col_dir, "text"), [utt.text for utt in utterances])
+
+    utterances_idx = {}
+    for field, values, missing in meta_columns:
+        utterances_idx[field] = _dump_meta_column(os.path.join(col_dir, "meta", field), values, missing)
+
+    with open(os.path.join(col_dir, "columns.json"), "w") as f:
+        json.dump({"n_utterances": len(utterances), "timestamp": timestamp_type, "meta": fields}, f)
+    return utterances_idx
+
+
+class _ColumnarRows:
+    """
+    Reads rows of the structural and text columns written by dump_columnar_utterances, as utterance dicts with empty
+    metadata. Each column file is opened once: the arrays and the text blob are memory-mapped, and a json timestamp
+    column is decoded as rows are read, so reading consecutive batches of rows only reads each row once.
+
+    :param col_dir: the utterances-columns directory
+    :param info: the contents of its columns.json
+    """
+    def __init__(self, col_dir: str, info: Dict):
+        self.col_dir = col_dir
+        with open(os.path.join(col_dir, "keys.json"), "r") as f:
+            self.keys = json.load(f)
+        with open(os.path.join(col_dir, "users.json"), "r") as f:
+            self.user_names = json.load(f)
+        load = lambda name: np.load(os.path.join(col_dir, name), mmap_mode="r")
+        self._root, self._reply_to, self._user = load("root.npy"), load("reply_to.npy"), load("user.npy")
+        self._timestamp = self._timestamp_null = None
+        if info["timestamp"] != "json":
+            self._timestamp, self._timestamp_null = load("timestamp.npy"), load("timestamp-null.npy")
+        # the json timestamp column is decoded lazily (see _read_timestamps)
+        self._timestamps, self._timestamp_row = None, 0
+        self._text_offsets = load("text-offsets.npy")
+        self._text_null = load("text-null.npy") if os.path.exists(os.path.join(col_dir, "text-null.npy")) else None
+        self._text_file = open(os.path.join(col_dir, "text.bin"), "rb")
+        # empty files cannot be memory-mapped
+        self._text = mmap.mmap(self._text_file.fileno(), 0, access=mmap.ACCESS_READ) \
+            if self._text_offsets[-1] > 0 else b""
+
+    def _read_timestamps(self, start: int, stop: int) -> List:
+        if self._timestamp is not None:
+            timestamps = self._timestamp[start:stop].tolist()
+            for i in np.flatnonzero(self._timestamp_null[start:stop]):
+                timestamps[i] = None
+            return timestamps
+        # the json column is decoded from the start again only if rows before the last ones read are requested
+        if self._timestamps is None or start < self._timestamp_row:
+            if self._timestamps is not None: self._timestamps.close()
+            self._timestamps, self._timestamp_row = iter_json_array(os.path.join(self.col_dir, "timestamp.json")), 0
+        timestamps = list(islice(self._timestamps, start - self._timestamp_row, stop - self._timestamp_row))
+        self._timestamp_row = stop
+        return timestamps
+
+    def _read_texts(self, start: int, stop: int) -> List[Optional[str]]:
+        offsets = self._text_offsets[start:stop + 1].tolist()
+        data, base = self._text[offsets[0]:offsets[-1]], offsets[0]
+        texts = [data[lo - base:hi - base].decode("utf-8") for lo, hi in zip(offsets[:-1], offsets[1:])]
+        if self._text_null is not None:
+            for i in np.flatnonzero(self._text_null[start:stop]):
+                texts[i] = None
+        return texts
+
+    def read(self, start: int, stop: int) -> List[Dict]:
+        """
+        :return: rows start to stop (exclusive)
+        """
+        if stop <= start: return []
+        keys, user_names = self.keys, self.user_names
+        root = self._root[start:stop].tolist()
+        reply_to = self._reply_to[start:stop].tolist()
+        user = self._user[start:stop].tolist()
+        timestamps = self._read_timestamps(start, stop)
+        texts = self._read_texts(start, stop)
+        return [{"id": keys[start + i],
+                 "root": None if root[i] < 0 else keys[root[i]],
+                 "reply-to": None if reply_to[i] < 0 else keys[reply_to[i]],
+                 "user": None if user[i] < 0 else user_names[user[i]],
+                 "timestamp": timestamps[i],
+                 "text": texts[i],
+                 "meta": ConvoKitMeta()} for i in range(stop - start)]
+
+    def close(self) -> None:
+        if self._timestamps is not None: self._timestamps.close()
+        if not isinstance(self._text, bytes): self._text.close()
+        self._text_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def load_columnar_utterances(dir_name: str, start_index: Optional[int] = None, end_index: Optional[int] = None,
+                             exclude_meta: Optional[List[str]] = None) -> List[Dict]:
+    """
+    Loads utterances written by dump_columnar_utterances. The structural columns are memory-mapped so that only the
+    requested rows are read, and the column files of excluded metadata fields are never opened.
+
+    :param dir_name: corpus directory to read from
+    :param start_index: row number (zero-indexed) of the first utterance to load
+    :param end_index: row number (zero-indexed) of the last utterance to load
+    :param exclude_meta: utterance metadata fields to skip
+    :return: list of utterance dicts in the same form as the lines of utterances.jsonl
+    """
+    col_dir = os.path.join(dir_name, COLUMNS_DIR)
+    with open(os.path.join(col_dir, "columns.json"), "r") as f:
+        info = json.load(f)
+    n = info["n_utterances"]
+    start = 0 if start_index is None else max(start_index, 0)
+    stop = n if end_index is None else max(min(end_index + 1, n), start)
+    if start >= stop: return []
+
+    with _ColumnarRows(col_dir, info) as rows:
+        utterances = rows.read(start, stop)
+
+    exclude_meta = set() if exclude_meta is None else set(exclude_meta)
+    for field in info["meta"]:
+        if field in exclude_meta: continue
+        column = _load_meta_column(os.path.join(col_dir, "meta", field))
+        missing = set(column["missing"])
+        values = iter(column["values"])
+        for row in range(n):
+            if row in missing: continue
+            value = next(values)
+            if start <= row < stop:
+                utterances[row - start]["meta"][field] = value
+            elif row >= stop:
+                break
+    return utterances
+
+
+def iter_columnar_utterances(dir_name: str, exclude_meta: Optional[List[str]] = None,
+                             batch_size: int = 10000, with_meta: bool = True) -> Iterable[Dict]:
+    """
+    Iterates over the utterances written by dump_columnar_utterances, reading the structural and text columns a
+    batch of rows at a time. Each column file is opened once; metadata columns are loaded in full (binary values
+    are only unpickled when accessed).
+
+    :param dir_name: corpus directory to read from
+    :param exclude_meta: utterance metadata fields to skip
+    :param batch_size: number of rows to read at a time
+    :param with_meta: whether to read the metadata columns at all
+    :return: generator of utterance dicts in the same form as the lines of utterances.jsonl
+    """
+    col_dir = os.path.join(dir_name, COLUMNS_DIR)
+    with open(os.path.join(col_dir, "columns.json"), "r") as f:
+        info = json.load(f)
+    exclude_meta = set() if exclude_meta is None else set(exclude_meta)
+    columns = []
+    for field in info["meta"] if with_meta else []:
+        if field in exclude_meta: continue
+        column = _load_meta_column(os.path.join(col_dir, "meta", field))
+        columns.append((field, set(column["missing"]), iter(column["values"])))
+
+    with _ColumnarRows(col_dir, info) as reader:
+        for start in range(0, info["n_utterances"], batch_size):
+            rows = reader.read(start, min(start + batch_size, info["n_utterances"]))
+            for row, utt in enumerate(rows, start):
+                for field, missing, values in columns:
+                    if row not in missing:
+                        utt["meta"][field] = next(values)
+            yield from rows
+
+
+def iter_jsonl(filename: str) -> Iterable[Dict]:
+    """
+    Iterates over the lines of a (possibly compressed) jsonl file, decoding one line at a time.
+
+    :param filename: path to the jsonl file. If the file does not exist, a compressed version of it (see
+        resolve_path) is read instead.
+    :return: generator of decoded json objects
+    """
+    with open_file(resolve_path(filename), "rb") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+DELTA_DIR = "delta"
+
+
+def dump_meta_delta(dir_name: str, kind: str, field: str, ids: List, metas: List[Dict]) -> Optional[str]:
+    """
+    Writes the current values of one metadata field as a sidecar column, to be applied on top of the base corpus
+    files when the corpus is loaded (see load_meta_delta).
+
+    :param dir_name: corpus directory
+    :param kind: "utterances", "users" or "conversations"
+    :param field: name of the metadata field
+    :param ids: ids of the objects (utterance ids, user names or conversation ids)
+    :param metas: metadata dicts of the objects, in the same order as ids
+    :return: the type annotation of the field for index.json, or None if no object has the field anymore
+    """
+    kind_dir = os.path.join(dir_name, DELTA_DIR, kind)
+    if not os.path.exists(kind_dir):
+        os.makedirs(kind_dir)
+    path = os.path.join(kind_dir, field)
+    values, missing = [], []
+    for i, meta in enumerate(metas):
+        if field in meta:
+            values.append(meta[field])
+        else:
+            missing.append(i)
+    for ext in [".json", ".p", "-offsets.bin", "-missing.json"]:
+        if os.path.exists(path + ext): os.remove(path + ext)
+    with open(path + "-ids.json", "w") as f:
+        json.dump(ids, f)
+    field_type = _dump_meta_column(path, values, missing)
+    return field_type if values else None
+
+
+def load_meta_delta(dir_name: str, kind: str, field: str) -> List[Tuple]:
+    """
+    Loads a sidecar column written by dump_meta_delta.
+
+    :return: list of (object id, has value, value) tuples; has value is False if the object no longer has the field
+    """
+    path = os.path.join(dir_name, DELTA_DIR, kind, field)
+    with open(path + "-ids.json", "r") as f:
+        ids = json.load(f)
+    column = _load_meta_column(path)
+    missing = set(column["missing"])
+    values = iter(column["values"])
+    return [(obj_id, False, None) if row in missing else (obj_id, True, next(values))
+            for row, obj_id in enumerate(ids)]
+
+
+def remove_meta_delta(dir_name: str) -> None:
+    """
+    Removes all sidecar columns, e.g. after the base corpus files have been rewritten.
+    """
+    if os.path.exists(os.path.join(dir_name, DELTA_DIR)):
+        shutil.rmtree(os.path.join(dir_name, DELTA_DIR))
+
+
+SHARDS_DIR = "utterances-shards"
+SHARD_MANIFEST = "manifest.json"
+
+
+def shard_of(conversation_id: str, n_shards: int) -> int:
+    """
+    Assigns a conversation to a shard (hash bucket). The assignment only depends on the conversation id, so it is
+    the same across processes and Python versions.
+
+    :param conversation_id: id of the conversation (i.e. of its root utterance)
+    :param n_shards: total number of shards
+    :return: shard number, between 0 and n_shards - 1
+    """
+    return zlib.crc32(str(conversation_id).encode("utf-8")) % n_shards
+
+
+def shard_path(dir_name: str, shard: int) -> str:
+    """
+    :return: directory holding the utterances of the given shard of a sharded corpus
+    """
+    return os.path.join(dir_name, SHARDS_DIR, "shard-{:05d}".format(shard))
+
+
+def dump_shard_manifest(dir_name: str, n_shards: int, conversations: Dict[str, int]) -> None:
+    """
+    Writes the manifest of a sharded corpus, which maps every conversation id to the shard holding its utterances.
+    Conversation ids are stored as strings (json object keys), as in shard_of.
+
+    :param dir_name: corpus directory
+    :param n_shards: total number of shards
+    :param conversations: dict mapping each conversation id to its shard
+    """
+    with open(os.path.join(dir_name, SHARDS_DIR, SHARD_MANIFEST), "w") as f:
+        json.dump({"n-shards": n_shards,
+                   "conversations": {str(convo_id): shard for convo_id, shard in conversations.items()}}, f)
+
+
+def select_shards(dir_name: str, conversation_ids: Optional[Iterable[str]] = None,
+                  shards: Optional[Iterable[int]] = None) -> List[int]:
+    """
+    Finds the shards of a sharded corpus that need to be read.
+
+    :param dir_name: corpus directory
+    :param conversation_ids: if given, only the shards holding these conversations are selected
+    :param shards: if given, only these shards are selected
+    :return: sorted list of shard numbers
+    """
+    with open(os.path.join(dir_name, SHARDS_DIR, SHARD_MANIFEST), "r") as f:
+        manifest = json.load(f)
+    selected = set(range(manifest["n-shards"]))
+    if shards is not None:
+        unknown = set(shards) - selected
+        if unknown:
+            raise ValueError("Corpus has {} shards; no such shard(s): {}".format(manifest["n-shards"],
+                                                                                 sorted(unknown)))
+        selected &= set(shards)
+    if conversation_ids is not None:
+        convo_shards = manifest["conversations"]
+        selected &= {convo_shards[str(convo_id)] for convo_id in conversation_ids if str(convo_id) in convo_shards}
+    return sorted(selected)
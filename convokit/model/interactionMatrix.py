@@ -0,0 +1,102 @@
+from typing import Tuple
+import numpy as np
+from scipy import sparse
+from .corpusArrays import CorpusArrays
+
+
+class InteractionMatrix:
+    """The replies between the users of a Corpus, as a sparse users x users matrix of reply counts (from the speaker,
+    by row, to the user replied to, by column), along with the replies themselves grouped by (speaker, target) pair
+    in the same order as the stored entries of the matrix. Users are numbered by their index in CorpusArrays.users,
+    and replies by their utterance index. Only replies between utterances that both have a user are counted.
+
+    Built by Corpus.interaction_matrix(). Corpus.add_utterances() queues the new replies, which are merged in on next
+    use in one vectorized pass.
+
+    :param arrays: the CorpusArrays of the corpus
+    """
+
+    def __init__(self, arrays: CorpusArrays):
+        self._arrays = arrays
+        self._speaker = np.empty(0, dtype=np.int64)
+        self._target = np.empty(0, dtype=np.int64)
+        self._replies = np.empty(0, dtype=np.int64)
+        self._pending = [arrays.reply_indices()[0]]
+        self._counts = None
+        self._pair_ptr = None
+
+    def add(self, replies: np.ndarray) -> None:
+        """Queues replies added to the corpus after the matrix was built.
+
+        :param replies: utterance indices of the new replies
+        """
+        self._pending.append(np.asarray(replies, dtype=np.int64))
+
+    def _update(self) -> None:
+        arrays = self._arrays
+        if not self._pending and self._counts.shape[0] == len(arrays.users): return
+        replies = np.concatenate(self._pending + [self._replies[:0]])
+        self._pending = []
+        parents = arrays.parent[replies]
+        replies, parents = replies[parents >= 0], parents[parents >= 0]
+        has_users = (arrays.user[replies] >= 0) & (arrays.user[parents] >= 0)
+        replies, parents = replies[has_users], parents[has_users]
+
+        speaker = np.concatenate([self._speaker, arrays.user[replies]])
+        target = np.concatenate([self._target, arrays.user[parents]])
+        replies = np.concatenate([self._replies, replies])
+        order = np.lexsort((replies, target, speaker))
+        self._speaker, self._target, self._replies = speaker[order], target[order], replies[order]
+
+        # the replies of each pair are stored contiguously, with _pair_ptr[k] the offset of the replies of the k-th
+        # pair; the pairs are in row-major order, which is also the order of the stored entries of the matrix
+        new_pair = np.ones(len(self._replies), dtype=bool)
+        new_pair[1:] = (self._speaker[1:] != self._speaker[:-1]) | (self._target[1:] != self._target[:-1])
+        starts = np.flatnonzero(new_pair)
+        self._pair_ptr = np.append(starts, len(self._replies))
+        n_users = len(arrays.users)
+        self._counts = sparse.csr_matrix((np.diff(self._pair_ptr), (self._speaker[starts], self._target[starts])),
+                                         shape=(n_users, n_users), dtype=np.int64)
+
+    @property
+    def counts(self) -> sparse.csr_matrix:
+        """scipy.sparse CSR matrix of the number of replies from each user (row) to each user (column)"""
+        self._update()
+        return self._counts
+
+    def pairs(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :return: the speaker and target indices of the pairs of users with at least one reply, in row-major order
+            (the order of the stored entries of counts)
+        """
+        counts = self.counts
+        return np.repeat(np.arange(counts.shape[0]), np.diff(counts.indptr)), counts.indices.astype(np.int64)
+
+    def select(self, speaker_mask: np.ndarray, target_mask: np.ndarray) -> np.ndarray:
+        """Selects pairs of users by boolean masks over user indices (e.g. from CorpusArrays.user_mask).
+
+        :return: the positions (in the order of pairs()) of the pairs whose speaker and target are both selected
+        """
+        speakers, targets = self.pairs()
+        return np.flatnonzero(speaker_mask[speakers] & target_mask[targets])
+
+    def pair_replies(self, k: int) -> np.ndarray:
+        """
+        :param k: position of a pair of users, in the order of pairs()
+        :return: utterance indices of the replies of the pair, in utterance order
+        """
+        self._update()
+        return self._replies[self._pair_ptr[k]:self._pair_ptr[k + 1]]
+
+    def get_replies(self, speaker: int, target: int) -> np.ndarray:
+        """
+        :param speaker: index of the replying user
+        :param target: index of the user replied to
+        :return: utterance indices of the replies from speaker to target, in utterance order
+        """
+        counts = self.counts
+        start, stop = counts.indptr[speaker], counts.indptr[speaker + 1]
+        k = start + np.searchsorted(counts.indices[start:stop], target)
+        if k == stop or counts.indices[k] != target:
+            return self._replies[:0]
+        return self.pair_replies(k)
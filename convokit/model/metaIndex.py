@@ -0,0 +1,105 @@
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Collection, Hashable, Iterable, Optional
+
+
+def _in_range(value, lower, upper) -> bool:
+    # values that cannot be compared to the bounds are out of range
+    try:
+        return (lower is None or lower <= value) and (upper is None or value <= upper)
+    except TypeError:
+        return False
+
+
+class MetaIndex:
+    """An index of the values of one metadata key over the utterances, users or conversations of a Corpus: a hash
+    index from each value to the ids of the objects holding it, and a sorted list of the values (built on the first
+    range query). Objects that do not have the key are not indexed.
+
+    Built by Corpus.create_index(). Objects added with Corpus.add_utterances() are added to the index; it is marked
+    stale when the key is written to (or objects are removed), and the Corpus rebuilds it on next use.
+
+    :param key: the metadata key to index
+    :param ids: ids of the objects, in corpus order
+    :param metas: metadata of the objects, in the same order
+
+    :ivar stale: whether the index is out of date
+    """
+
+    def __init__(self, key: Hashable, ids: Iterable[Hashable], metas: Iterable[Dict]):
+        self.key = key
+        self.stale = False
+        self._position = {}
+        self._by_value = {}
+        self._unhashable = []
+        self._sorted_values = None
+        self.add(ids, metas)
+
+    def add(self, ids: Iterable[Hashable], metas: Iterable[Dict]) -> None:
+        """Indexes objects added to the Corpus after the ones already indexed, in time proportional to their number.
+
+        :param ids: ids of the new objects, in corpus order
+        :param metas: metadata of the new objects, in the same order
+        """
+        key = self.key
+        for obj_id, meta in zip(ids, metas):
+            self._position[obj_id] = len(self._position)
+            if key not in meta: continue
+            value = meta[key]
+            try:
+                if value not in self._by_value:
+                    self._sorted_values = None
+                self._by_value.setdefault(value, []).append(obj_id)
+            except TypeError:   # e.g. a list; such values can only be found by scanning
+                self._unhashable.append((obj_id, value))
+
+    def update(self, meta: Dict, owner_id: Optional[Hashable], value) -> bool:
+        """Called by the MetaTracker when the key is written to (see MetaTracker.mark). The index is rebuilt rather
+        than updated, so the write is never accepted.
+
+        :return: False, so that the index is marked stale
+        """
+        return False
+
+    def _values_in_range(self, lower, upper) -> List:
+        if self._sorted_values is None:
+            try:
+                self._sorted_values = sorted(self._by_value)
+            except TypeError:   # values of mixed types: range queries scan the distinct values instead
+                self._sorted_values = False
+        if self._sorted_values is False:
+            return [value for value in self._by_value if _in_range(value, lower, upper)]
+        start = 0 if lower is None else bisect_left(self._sorted_values, lower)
+        stop = len(self._sorted_values) if upper is None else bisect_right(self._sorted_values, upper)
+        return self._sorted_values[start:stop]
+
+    def lookup(self, values: Optional[Collection] = None, lower=None, upper=None) -> List[Hashable]:
+        """Finds the objects whose value for the key is one of the given values and/or within the given range. The
+        time taken is proportional to the number of objects found (plus the number of unhashable values indexed).
+
+        :param values: values to match (None to match any value)
+        :param lower: smallest value to match, inclusive (None for no lower bound)
+        :param upper: largest value to match, inclusive (None for no upper bound)
+        :return: ids of the objects found, in corpus order
+        """
+        bounded = lower is not None or upper is not None
+        if values is not None:
+            values = list(values)
+            matched = []
+            for value in values:
+                try:
+                    if value in self._by_value and (not bounded or _in_range(value, lower, upper)):
+                        matched.append(value)
+                except TypeError:
+                    pass
+        elif bounded:
+            matched = self._values_in_range(lower, upper)
+        else:
+            matched = list(self._by_value)
+
+        found = set()
+        for value in matched:
+            found.update(self._by_value[value])
+        for obj_id, value in self._unhashable:
+            if (values is None or value in values) and (not bounded or _in_range(value, lower, upper)):
+                found.add(obj_id)
+        return sorted(found, key=self._position.__getitem__)
@@ -0,0 +1,103 @@
+from typing import List, Hashable
+import numpy as np
+from .corpusArrays import CorpusArrays
+
+
+def _gather(ptr: np.ndarray, values: np.ndarray, nodes: np.ndarray) -> np.ndarray:
+    # Concatenates values[ptr[i]:ptr[i + 1]] for every i in nodes, without a python loop
+    starts = ptr[nodes]
+    lengths = ptr[nodes + 1] - starts
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return values[offsets + np.arange(lengths.sum())]
+
+
+class ReplyTree:
+    """The reply structure of the utterances of a Corpus: for every utterance, the utterances replying to it, its
+    depth and the size of the subtree of replies below it. Utterances that are not replies, or that reply to an
+    utterance which is not in the corpus, are the roots of the trees and have depth 0.
+
+    Built by Corpus.get_reply_tree() (or Conversation.get_reply_tree()); it reflects the corpus as it was when it was
+    built.
+
+    :param arrays: the CorpusArrays of the corpus
+
+    :ivar depth: depth of each utterance (by utterance index, see CorpusArrays), or -1 for utterances that are part
+        of a reply cycle
+    :ivar subtree_size: number of utterances in the subtree rooted at each utterance (by utterance index),
+        including itself
+    :ivar top_level: index of the top-level reply that each utterance belongs to, i.e. the top-level comment of its
+        comment thread, or -1 for utterances that are not in a comment thread (conversation roots, and replies whose
+        chain of replies is cut off before it reaches a top-level reply). A top-level reply replies to the root of
+        its conversation, whether or not the root is in the corpus.
+    """
+
+    def __init__(self, arrays: CorpusArrays):
+        self._arrays = arrays
+        parent = arrays.parent
+        n = len(parent)
+        is_root = parent < 0
+        # children are stored contiguously by parent (in utterance order), with _child_ptr[i] the offset of the
+        # children of utterance i
+        self._child_ptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(parent[~is_root], minlength=n), out=self._child_ptr[1:])
+        self._child_idx = np.argsort(parent, kind="stable")[int(is_root.sum()):]
+
+        self.depth = np.full(n, -1, dtype=np.int64)
+        levels = []
+        frontier = np.flatnonzero(is_root)
+        while len(frontier) > 0:
+            self.depth[frontier] = len(levels)
+            levels.append(frontier)
+            frontier = _gather(self._child_ptr, self._child_idx, frontier)
+
+        # top-level replies are found from the conversation roots rather than by depth, since the roots may not be
+        # in the corpus (e.g. in a subset, or a partially loaded corpus)
+        is_top = np.zeros(n, dtype=bool)
+        root_index = np.fromiter((arrays.index.get(convo_id, -1) for convo_id in arrays.conversation_ids),
+                                 dtype=np.int64, count=len(arrays.conversation_ids))
+        replies = np.flatnonzero(~is_root)
+        is_top[replies] = parent[replies] == root_index[arrays.conversation[replies]]
+        for convo_id in arrays.conversation_ids:
+            if convo_id not in arrays.index:
+                is_top[arrays.replies_to_missing(convo_id)] = True
+        self.top_level = np.where(is_top, np.arange(n), -1)
+        for level in levels[1:]:
+            level = level[~is_top[level]]
+            self.top_level[level] = self.top_level[parent[level]]
+
+        self.subtree_size = np.ones(n, dtype=np.int64)
+        for level in reversed(levels[1:]):
+            np.add.at(self.subtree_size, parent[level], self.subtree_size[level])
+
+    def get_children(self, utt_id: Hashable) -> List[Hashable]:
+        """
+        :return: the ids of the utterances replying to the given utterance, in corpus order
+        """
+        i = self._arrays.index[utt_id]
+        ids = self._arrays.ids
+        return [ids[j] for j in self._child_idx[self._child_ptr[i]:self._child_ptr[i + 1]]]
+
+    def get_depth(self, utt_id: Hashable) -> int:
+        """
+        :return: the number of replies between the given utterance and the root of its tree (0 for a root)
+        """
+        return int(self.depth[self._arrays.index[utt_id]])
+
+    def get_subtree_size(self, utt_id: Hashable) -> int:
+        """
+        :return: the number of utterances in the subtree rooted at the given utterance, including itself
+        """
+        return int(self.subtree_size[self._arrays.index[utt_id]])
+
+    def get_ancestors(self, utt_id: Hashable) -> List[Hashable]:
+        """
+        :return: the ids of the utterances the given utterance is (indirectly) a reply to, from the utterance it
+            replies to up to the root of its tree
+        """
+        parent, ids = self._arrays.parent, self._arrays.ids
+        ancestors = []
+        i = parent[self._arrays.index[utt_id]]
+        while i >= 0 and len(ancestors) < len(ids):
+            ancestors.append(ids[i])
+            i = parent[i]
+        return ancestors
@@ -1,5 +1,18 @@
 from functools import total_ordering
 from typing import Dict, List, Collection, Hashable, Callable, Set, Generator, Tuple, Optional, ValuesView
+from weakref import WeakValueDictionary
+from .convoKitMeta import replace_meta, get_meta
+
+
+class _Identity:
+    # shared by the Users with the same identity (see User._identity), which keep it alive. Its address is their
+    # integer id, by which they are hashed and compared: it is unique among the identities alive.
+    __slots__ = ("__weakref__",)
+
+
+# the identities of the Users alive in this process, looked up only when a User's identity changes. An entry is
+# freed as soon as no User has its identity anymore (e.g. once the Users built by Corpus.stream are discarded).
+_identities = WeakValueDictionary()
 
 @total_ordering
 class User:
@@ -15,14 +28,21 @@ class User:
 
     :ivar name: name of the user.
     :ivar meta: dictionary of attributes associated with the user.
+    :ivar utterances: dictionary of the utterances by the user, by utterance id. For a User of a Corpus, it is
+        built on first access (see Corpus.update_users_data).
+    :ivar conversations: dictionary of the conversations the user took part in, by conversation id. Built on first
+        access, like utterances.
     """
+    __slots__ = ("_name", "_utterances", "_conversations", "_owner", "_meta", "_split_attribs", "_identity_ref",
+                 "_uid")
 
     def __init__(self, name: str=None, utts=None, convos=None, meta: Optional[Dict]=None):
         self._name = name
-        self.utterances = utts if utts is not None else dict()
-        self.conversations = convos if convos is not None else dict()
+        self._utterances = utts if utts is not None else dict()
+        self._conversations = convos if convos is not None else dict()
+        self._owner = None # the Corpus that builds the utterance and conversation maps on first access, if any
         self._meta = meta if meta is not None else {}
-        self._split_attribs = set()
+        self._split_attribs = ()
         self._update_uid()
 
     def identify_by_attribs(self, attribs: Collection) -> None:
@@ -49,6 +69,26 @@ class User:
 
     name = property(_get_name, _set_name)
 
+    def _get_utterances(self):
+        if self._utterances is None:
+            self._owner.update_users_data()
+        return self._utterances
+
+    def _set_utterances(self, value: Dict):
+        self._utterances = value
+
+    utterances = property(_get_utterances, _set_utterances)
+
+    def _get_conversations(self):
+        if self._conversations is None:
+            self._owner.update_users_data()
+        return self._conversations
+
+    def _set_conversations(self, value: Dict):
+        self._conversations = value
+
+    conversations = property(_get_conversations, _set_conversations)
+
     def get_utterance_ids(self) -> List[Hashable]:
         """
 
@@ -97,10 +137,11 @@ class User:
         for v in self.conversations.values():
             yield v
 
-    def _get_meta(self): return self._meta
+    def _get_meta(self):
+        return get_meta(self)
 
     def _set_meta(self, value: Dict):
-        self._meta = value
+        self._meta = replace_meta(self._meta, value)
         self._update_uid()
     meta = property(_get_meta, _set_meta)
 
@@ -112,25 +153,43 @@ class User:
         """
         self.meta[key] = value
 
+    def _identity(self):
+        # the user's name, or for a user identified by attributes, its name and the values of the attributes
+        if not self._split_attribs:
+            return self._name
+        return self._name, str(sorted((k, self._meta[k]) for k in self._split_attribs if k in self._meta))
+
     def _update_uid(self):
-        rep = dict()
-        rep["name"] = self._name
-        if self._split_attribs:
-            rep["attribs"] = {k: self._meta[k] for k in self._split_attribs
-                              if k in self._meta}
-        self._uid = "User(" + str(sorted(rep.items())) + ")"
+        identity = self._identity()
+        ref = _identities.get(identity)
+        if ref is None:
+            ref = _identities[identity] = _Identity()
+        self._identity_ref = ref
+        self._uid = id(ref)
+
+    def __getstate__(self):
+        # identities are only meaningful within a process, so they are looked up again when unpickling
+        return {attr: getattr(self, attr) for attr in self.__slots__ if attr not in ("_identity_ref", "_uid")}
+
+    def __setstate__(self, state: Dict):
+        for attr, value in state.items():
+            setattr(self, attr, value)
+        self._update_uid()
 
     def __eq__(self, other):
         return self._uid == other._uid
 
     def __lt__(self, other):
-        return self._uid < other._uid
+        return repr(self) < repr(other)
 
     def __hash__(self):
-        return hash(self._uid)
+        return self._uid
 
     def __repr__(self):
-        return self._uid
+        rep = {"name": self._name}
+        if self._split_attribs:
+            rep["attribs"] = {k: self._meta[k] for k in self._split_attribs if k in self._meta}
+        return "User(" + str(sorted(rep.items())) + ")"
 
     # def copy(self):
     #     """
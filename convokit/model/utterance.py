@@ -1,5 +1,6 @@
 from typing import Dict, List, Collection, Hashable, Callable, Set, Generator, Tuple, Optional, ValuesView
 from .user import User
+from .convoKitMeta import replace_meta, get_meta
 
 class Utterance:
     """Represents a single utterance in the dataset.
@@ -20,6 +21,7 @@ class Utterance:
     :ivar timestamp: timestamp of the utterance.
     :ivar text: text of the utterance.
     """
+    __slots__ = ("id", "user", "root", "reply_to", "timestamp", "text", "_meta")
 
     def __init__(self, id: Optional[Hashable]=None, user: Optional[User]=None,
                  root: Optional[Hashable]=None, reply_to: Optional[Hashable]=None,
@@ -31,7 +33,15 @@ class Utterance:
         self.reply_to = reply_to
         self.timestamp = timestamp
         self.text = text
-        self.meta = meta if meta is not None else {}
+        self._meta = meta if meta is not None else {}
+
+    def _get_meta(self):
+        return get_meta(self, self.id)
+
+    def _set_meta(self, value: Dict):
+        self._meta = replace_meta(self._meta, value, self.id)
+
+    meta = property(_get_meta, _set_meta)
 
     def get(self, key: str):
         if key == "id":
@@ -69,8 +79,12 @@ class Utterance:
         """
         self.meta[key] = value
 
+    def _attribs(self) -> Dict:
+        # the attributes of the Utterance, as they would appear in its __dict__ if it had one
+        return {name: getattr(self, name) for name in Utterance.__slots__}
+
     def __eq__(self, other):
-        return self.__dict__ == other.__dict__
+        return self._attribs() == other._attribs()
 
     def __repr__(self):
-        return "Utterance(" + str(self.__dict__) + ")"
+        return "Utterance(" + str(self._attribs()) + ")"
@@ -0,0 +1,187 @@
+import hashlib
+import inspect
+import os
+import pickle
+from typing import Callable, Collection, Dict, Hashable, List, Optional, Tuple
+from .model import Corpus
+from .model.corpusFingerprint import stable_repr
+from .transformer import Transformer
+
+__all__ = ["Pipeline"]
+
+# bumped whenever the contents of the cache files change, so that older files are no longer used
+_CACHE_FORMAT = 1
+
+# parameters of Transformers that only affect how their output is computed, not what it is
+_IGNORED_PARAMS = {"verbose", "n_workers", "n_threads"}
+
+
+class Pipeline(Transformer):
+    """
+    Chains Transformers, which are run on the Corpus one after the other, and
+    (if given a cache directory) memoizes the metadata each of them adds.
+
+    Each step is identified by a fingerprint of the Corpus it is run on and
+    of the Transformer's class and constructor parameters, which are read
+    from the attributes named after them (as in scikit-learn), so that the
+    state set by fit() does not change the fingerprint. The fingerprint of the Corpus is computed once (see
+    Corpus.fingerprint); the Corpus given to each following step is then
+    identified by the fingerprint of the step before it. When the output of
+    a step is found in the cache, the metadata it added is loaded back into
+    the Corpus instead of running the step (so the Transformer is then not
+    fitted). Changing the parameters of a step thus only reruns it and the
+    steps after it.
+
+    Steps are expected to only add, modify or delete metadata of the
+    utterances, users, conversations or Corpus, in a way that only depends
+    on the Corpus and on their parameters.
+
+    :param steps: list of (name, Transformer) pairs, in the order they are run
+    :param cache_dir: directory in which the output of each step is saved (created if needed), or None to not
+        memoize the steps
+    :param meta_fields: utterance metadata fields of the input Corpus that the steps depend on, to include in its
+        fingerprint. Changes to these fields are only noticed when they are written to (e.g. utt.meta[field] = x),
+        not when their values are modified in place (e.g. utt.meta[field].append(x)); call
+        corpus.fingerprint(refresh=True) after such changes.
+    :param verbose: whether or not to print which steps are run or loaded from the cache
+
+    :ivar named_steps: dictionary of the Transformers of the steps, by name
+    """
+
+    def __init__(self, steps: List[Tuple[str, Transformer]], cache_dir: Optional[str] = None,
+                 meta_fields: Collection[Hashable] = (), verbose: bool = False):
+        self.steps = steps
+        self.named_steps = dict(steps)
+        self.cache_dir = cache_dir
+        self.meta_fields = meta_fields
+        self.verbose = verbose
+
+    def fit(self, corpus: Corpus):
+        """Runs fit_transform() on the Corpus (each step needs the output of the previous ones to be fitted).
+
+        :param corpus: the Corpus to use for fitting
+
+        :return: the fitted Pipeline
+        """
+        self.fit_transform(corpus)
+        return self
+
+    def transform(self, corpus: Corpus) -> Corpus:
+        """Runs transform() of each step on the Corpus, or loads its output from the cache.
+
+        :param corpus: the Corpus to transform
+
+        :return: the transformed Corpus
+        """
+        return self._run(corpus, "transform")
+
+    def fit_transform(self, corpus: Corpus) -> Corpus:
+        """Runs fit_transform() of each step on the Corpus, or loads its output from the cache.
+
+        :param corpus: the Corpus to use
+
+        :return: the transformed Corpus
+        """
+        return self._run(corpus, "fit_transform")
+
+    def _run(self, corpus: Corpus, method: str) -> Corpus:
+        key = corpus.fingerprint(self.meta_fields) if self.cache_dir is not None else None
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+        for name, step in self.steps:
+            run_step = lambda: getattr(step, method)(corpus)
+            if self.cache_dir is None:
+                if self.verbose: print("Running {}...".format(name))
+                run_step()
+                continue
+
+            key = _fingerprint(key, method, type(step).__module__, type(step).__qualname__,
+                               _params_fingerprint(step))
+            filename = os.path.join(self.cache_dir, key + ".p")
+            if os.path.exists(filename):
+                if self.verbose: print("Loading {} from the cache...".format(name))
+                with open(filename, "rb") as f:
+                    _load_output(corpus, pickle.load(f))
+                continue
+
+            if self.verbose: print("Running {}...".format(name))
+            output = _record_output(corpus, run_step)
+            # written to a temporary file first, so that an interrupted run does not leave a partial cache file
+            with open(filename + ".tmp", "wb") as f:
+                pickle.dump(output, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(filename + ".tmp", filename)
+        return corpus
+
+
+def _fingerprint(*parts) -> str:
+    h = hashlib.sha1(str(_CACHE_FORMAT).encode())
+    for part in parts:
+        h.update(b"\0" + str(part).encode())
+    return h.hexdigest()
+
+
+def _params_fingerprint(step: Transformer) -> str:
+    params = {}
+    for name, param in inspect.signature(type(step).__init__).parameters.items():
+        if name == "self" or name in _IGNORED_PARAMS or param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+            continue
+        if not hasattr(step, name):
+            raise ValueError("Cannot memoize {}: its parameter {} is not stored in an attribute of the same name"
+                             .format(type(step).__name__, name))
+        params[name] = _param_repr(getattr(step, name))
+    return stable_repr(params)
+
+
+def _param_repr(value):
+    # Transformers given as parameters (e.g. the steps of a nested Pipeline) are identified by their own parameters
+    if isinstance(value, Transformer):
+        return type(value).__module__ + "." + type(value).__qualname__ + _params_fingerprint(value)
+    if isinstance(value, (list, tuple)):
+        return [_param_repr(v) for v in value]
+    return value
+
+
+def _record_output(corpus: Corpus, run: Callable[[], object]) -> Dict:
+    """
+    Helper for Pipeline. Runs a step, and returns the metadata it wrote: for each kind of object, the values of each
+    metadata key written to, by object id (for the objects that still have the key), and the corpus metadata added,
+    modified or deleted.
+    """
+    trackers = corpus._meta_trackers
+    # the keys written to are those marked by the trackers while the step runs; the keys marked before are kept
+    # marked afterwards, since incremental dumps rely on them
+    marked = {kind: tracker.dirty for kind, tracker in trackers.items()}
+    for tracker in trackers.values():
+        tracker.reset()
+    overall = dict(corpus.meta)
+    try:
+        run()
+    finally:
+        written = {kind: tracker.dirty for kind, tracker in trackers.items()}
+        for kind, tracker in trackers.items():
+            tracker.dirty = marked[kind] | written[kind]
+
+    output = {}
+    for kind in trackers:
+        objs = corpus._objects(kind)
+        output[kind] = {key: {obj_id: obj._meta[key] for obj_id, obj in objs.items() if key in obj._meta}
+                        for key in written[kind]}
+    output["corpus"] = {key: value for key, value in corpus.meta.items()
+                        if key not in overall or overall[key] is not value}
+    output["corpus-deleted"] = [key for key in overall if key not in corpus.meta]
+    return output
+
+
+def _load_output(corpus: Corpus, output: Dict) -> None:
+    # adds the metadata recorded by _record_output to the Corpus
+    for kind in corpus._meta_trackers:
+        objs = corpus._objects(kind)
+        for key, values in output[kind].items():
+            for obj_id, obj in objs.items():
+                if obj_id in values:
+                    obj.meta[key] = values[obj_id]
+                elif key in obj._meta:
+                    del obj.meta[key]
+    corpus.meta.update(output["corpus"])
+    for key in output["corpus-deleted"]:
+        corpus.meta.pop(key, None)
@@ -9,7 +9,7 @@ from convokit.politeness_api.features.politeness_strategies import get_politenes
 from convokit.politeness_api.features.vectorizer import get_unigrams_and_bigrams
 
 from convokit.transformer import Transformer
-from convokit.model import Corpus
+from convokit.model import Corpus, Utterance
 
 class PolitenessStrategies(Transformer):
     """
@@ -17,12 +17,15 @@ class PolitenessStrategies(Transformer):
     Corpus.
 
     :param verbose: whether or not to print status messages while computing features
+    :param n_workers: number of processes to extract the strategies in (None to use all available cores; see
+        Transformer.parallel_transform)
 
     """
 
-    def __init__(self, verbose: bool=False):
+    def __init__(self, verbose: bool=False, n_workers: Optional[int]=1):
         self.ATTR_NAME = "politeness_strategies"
         self.verbose = verbose
+        self.n_workers = n_workers
 
     def transform(self, corpus: Corpus):
         """Extract politeness strategies from each utterances in the corpus and annotate
@@ -34,49 +37,39 @@ class PolitenessStrategies(Transformer):
         :type corpus: Corpus
         """
 
-        # preprocess the utterances in the format expected by the API
-        if self.verbose: print("Preprocessing comments...")
-        comment_ids, processed_comments = self._preprocess_utterances(corpus)
-
-        # use the bundled politeness API to extract politeness features for each
-        # preprocessed comment
         if self.verbose: print("Extracting politeness strategies...")
-        feature_dicts = [get_politeness_strategy_features(doc) for doc in processed_comments]
+        self.parallel_transform(corpus, n_workers=self.n_workers)
+        if self.verbose: print("Done!")
+        return corpus
 
-        # add the extracted strategies to the utterance metadata
-        for utt_id, strats in zip(comment_ids, feature_dicts):
-            corpus.get_utterance(utt_id).meta[self.ATTR_NAME] = strats
+    def transform_utterance(self, utterance: Utterance) -> Dict:
+        """Extract the politeness strategies of one Utterance, using the bundled politeness API.
 
-        return corpus
+        :param utterance: the parsed Utterance
+        :return: dictionary holding the extracted strategies under the "politeness_strategies" key
+        """
+        return {self.ATTR_NAME: get_politeness_strategy_features(self._preprocess_utterance(utterance))}
 
-    def _preprocess_utterances(self, corpus: Corpus) -> Tuple[List[Hashable], List[Dict]]:
-        """Convert each Utterance in the given Corpus into the representation expected
-        by the politeness API. Assumes that the Corpus has already been parsed, so that
-        each Utterance contains the `parsed` metadata entry
-        
-        :param corpus: the corpus to compute features for.
-        :type corpus: Corpus
+    @staticmethod
+    def _preprocess_utterance(utterance: Utterance) -> Dict:
+        """Convert an Utterance into the representation expected by the politeness API.
+        Assumes that the Utterance has already been parsed, so that it contains the
+        `parsed` metadata entry
+
+        :param utterance: the utterance to compute features for.
+        :type utterance: Utterance
         """
 
-        utt_ids = [] # keep track of the order in which we process the utterances, so we can join with the corpus at the end
-        documents = []
-        for i, utterance in enumerate(corpus.iter_utterances()):
-            if self.verbose and i > 0 and (i % self.verbose) == 0:
-                print("\t%03d" % i)
-            utt_ids.append(utterance.id)
-            doc = {"text": utterance.text, "sentences": [], "parses": []}
-            # the politeness API goes sentence-by-sentence
-            for sent in utterance.meta["parsed"].sents:
-                doc["sentences"].append(sent.text)
-                sent_parses = []
-                pos = sent.start
-                for tok in sent:
-                    if tok.dep_ != "punct": # the politeness API does not know how to handle punctuation in parses
-                        ele = "%s(%s-%d, %s-%d)"%(tok.dep_, tok.head.text, tok.head.i + 1 - pos, tok.text, tok.i + 1 - pos)
-                        sent_parses.append(ele)
-                doc["parses"].append(sent_parses)
-            doc["unigrams"], doc["bigrams"] = get_unigrams_and_bigrams(doc)
-            documents.append(doc)
-        if self.verbose:
-            print("Done!")
-        return utt_ids, documents
+        doc = {"text": utterance.text, "sentences": [], "parses": []}
+        # the politeness API goes sentence-by-sentence
+        for sent in utterance.meta["parsed"].sents:
+            doc["sentences"].append(sent.text)
+            sent_parses = []
+            pos = sent.start
+            for tok in sent:
+                if tok.dep_ != "punct": # the politeness API does not know how to handle punctuation in parses
+                    ele = "%s(%s-%d, %s-%d)"%(tok.dep_, tok.head.text, tok.head.i + 1 - pos, tok.text, tok.i + 1 - pos)
+                    sent_parses.append(ele)
+            doc["parses"].append(sent_parses)
+        doc["unigrams"], doc["bigrams"] = get_unigrams_and_bigrams(doc)
+        return doc
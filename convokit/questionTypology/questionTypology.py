@@ -94,6 +94,8 @@ class QuestionTypology(Transformer):
         self.snip = snip
         self.leaves_only_for_extract = leaves_only_for_extract
         self.random_seed = random_seed
+        self.questions_only = questions_only
+        self.enforce_formatting = enforce_formatting
         if not is_question: is_question = MotifsExtractor.is_utterance_question
 
         if questions_only:
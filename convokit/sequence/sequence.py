@@ -29,6 +29,17 @@ class Sequence(Transformer):
             returns the modified Corpus).
         """
 
+        # depths are read from the reply tree of the corpus, relative to the root post of the conversation: a
+        # comment's depth in its comment thread (post_depth in e.g. the reddit corpora) is its number of ancestors
+        # other than the root post, which may not be in the corpus
+        tree = corpus.get_reply_tree()
+
+        def post_depth(utt):
+            depth = tree.get_depth(utt.id)
+            if utt.root in corpus.utterances and utt.root != utt.id:
+                depth -= tree.get_depth(utt.root) + 1
+            return depth
+
         #counter = 0
         for convo in corpus.iter_conversations():
             
@@ -36,7 +47,7 @@ class Sequence(Transformer):
 
             for utt in convo.iter_utterances():
                 
-                if utt.meta['post_depth'] == 2:
+                if post_depth(utt) == 2:
                     temp_chain.append(utt.id)
             
             if len(temp_chain) > 0:
@@ -54,13 +65,13 @@ class Sequence(Transformer):
                 chosen_chain_tox = []
                 chosen_chain_tox.append(utt.meta['toxicity'])
 
-                while(utt.meta['post_depth'] > 0):
-                    if utt.reply_to in corpus.utterances:
-                        utt = convo.get_utterance(utt.reply_to)
-                        chosen_chain.append(utt.id)
-                        chosen_chain_tox.append(utt.meta['toxicity'])
-                    else:
-                        break
+                # walk up to the top-level comment
+                root = utt.root
+                for ancestor_id in tree.get_ancestors(uttid):
+                    if ancestor_id == root: break
+                    utt = convo.get_utterance(ancestor_id)
+                    chosen_chain.append(utt.id)
+                    chosen_chain_tox.append(utt.meta['toxicity'])
                         
                 #counter+=1
                 chosen_chain.reverse()
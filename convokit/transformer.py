@@ -1,5 +1,8 @@
+import os
 from abc import ABC, abstractmethod
-from .model import Corpus
+from multiprocessing import Pool
+from typing import Dict, List, Optional, Tuple, Hashable, Generator
+from .model import Corpus, Conversation, User, Utterance
 
 class Transformer(ABC):
     """
@@ -8,7 +11,7 @@ class Transformer(ABC):
     Transformer API. Exposes ``fit()`` and ``transform()`` methods. ``fit()`` performs any
     necessary precomputation (or “training” in machine learning parlance) while
     ``transform()`` does the work of actually computing the modification and
-    applying it to the corpus. 
+    applying it to the corpus.
 
     All subclasses must implement ``transform()``;
     subclasses that require precomputation should also override ``fit()``, which by
@@ -18,6 +21,12 @@ class Transformer(ABC):
     but designers of Transformer subclasses may also choose to overwrite the
     default implementation in cases where the combined operation can be
     implemented more efficiently than doing the steps separately.
+
+    Subclasses whose work is done independently for each utterance or each
+    conversation can also implement ``transform_utterance()`` or
+    ``transform_conversation()``, and compute their metadata with
+    ``parallel_transform()``, which runs them over the conversations of the
+    Corpus in a pool of processes.
     """
 
     def fit(self, corpus: Corpus):
@@ -25,7 +34,7 @@ class Transformer(ABC):
         later perform the actual transformation step.
 
         :param corpus: the Corpus to use for fitting
-        
+
         :return: the fitted Transformer
         """
         return self
@@ -37,7 +46,7 @@ class Transformer(ABC):
 
         :param corpus: the Corpus to transform
 
-        :return: modified version of the input Corpus. Note that unlike the 
+        :return: modified version of the input Corpus. Note that unlike the
             scikit-learn equivalent, ``transform()`` operates inplace on the Corpus
             (though for convenience and compatibility with scikit-learn, it also
             returns the modified Corpus).
@@ -53,3 +62,134 @@ class Transformer(ABC):
         """
         self.fit(corpus)
         return self.transform(corpus)
+
+    def transform_utterance(self, utt: Utterance) -> Optional[Dict]:
+        """Per-utterance kernel used by ``parallel_transform()``: computes the
+        metadata of one utterance. It may be run in another process, on a copy
+        of the utterance, so it must not modify the utterance, and should
+        only depend on the utterance and on the Transformer (as fitted).
+
+        :param utt: the Utterance
+
+        :return: dictionary of the metadata to add to the utterance (None to
+            add nothing)
+        """
+        raise NotImplementedError
+
+    def transform_conversation(self, convo: Conversation) -> Optional[Dict]:
+        """Per-conversation kernel used by ``parallel_transform()``: computes
+        the metadata of one conversation. Like ``transform_utterance()``, it
+        may be run in another process, on a copy of the conversation and its
+        utterances (which belong to a Corpus holding only some of the
+        conversations of the original one).
+
+        :param convo: the Conversation
+
+        :return: dictionary of the metadata to add to the conversation (None
+            to add nothing)
+        """
+        raise NotImplementedError
+
+    def _kernel(self) -> str:
+        # which kernel the subclass implements: "utterances" or "conversations"
+        if type(self).transform_utterance is not Transformer.transform_utterance:
+            return "utterances"
+        if type(self).transform_conversation is not Transformer.transform_conversation:
+            return "conversations"
+        raise NotImplementedError("{} implements neither transform_utterance() nor transform_conversation()"
+                                  .format(type(self).__name__))
+
+    def parallel_transform(self, corpus: Corpus, n_workers: Optional[int] = 1,
+                           shard_size: Optional[int] = None) -> Corpus:
+        """Runs the kernel of the Transformer (``transform_utterance()`` or
+        ``transform_conversation()``) over every utterance or conversation of
+        the Corpus, and adds the metadata it returns.
+
+        With several workers, the Corpus is split into shards of whole
+        conversations, and copies of the shards (holding their utterances,
+        with their users and metadata, and the metadata of their
+        conversations) are processed in a pool of processes, each of which
+        receives a copy of the Transformer. The metadata returned for each
+        shard is written back to the Corpus as the shards complete, in order
+        of the shards (i.e. by conversation).
+
+        :param corpus: the Corpus to transform
+        :param n_workers: number of processes to run the kernel in (None to
+            use all available cores). With 1, the kernel runs in this process,
+            directly on the objects of the Corpus.
+        :param shard_size: approximate number of utterances per shard (by
+            default, the utterances are split into 4 shards per worker)
+
+        :return: the modified Corpus
+        """
+        kind = self._kernel()
+        if n_workers is None: n_workers = os.cpu_count()
+        objs = corpus.utterances if kind == "utterances" else corpus.conversations
+        if n_workers <= 1:
+            kernel = self.transform_utterance if kind == "utterances" else self.transform_conversation
+            results = ((obj_id, kernel(obj)) for obj_id, obj in objs.items())
+            _add_results(objs, results)
+            return corpus
+
+        if shard_size is None: shard_size = max(1, len(corpus.utterances) // (4 * n_workers))
+        tasks = ((kind, shard) for shard in _shards(corpus, shard_size))
+        with Pool(n_workers, initializer=_init_worker, initargs=(self,)) as pool:
+            for results in pool.imap(_run_kernel, tasks):
+                _add_results(objs, results)
+        return corpus
+
+
+# the Transformer of a worker process of Transformer.parallel_transform()
+_worker_transformer = None
+
+def _init_worker(transformer: Transformer) -> None:
+    global _worker_transformer
+    _worker_transformer = transformer
+
+def _shards(corpus: Corpus, shard_size: int) -> Generator[Tuple[List[Utterance], Dict], None, None]:
+    """
+    Helper for Transformer.parallel_transform(). Splits the conversations of the Corpus into shards of about
+    shard_size utterances, and yields copies of the utterances of each shard that do not refer back to the Corpus,
+    along with the metadata of its conversations.
+    """
+    utts, convos_meta = [], {}
+    users = {}
+    for convo in corpus.iter_conversations():
+        for utt in convo.iter_utterances():
+            user = utt.user
+            # keyed by the User itself, since users identified by attributes may share a name
+            if user is not None and user not in users:
+                users[user] = User(name=user.name, meta=dict(user.meta.items()))
+                if user._split_attribs:
+                    users[user].identify_by_attribs(user._split_attribs)
+            utts.append(Utterance(id=utt.id, user=None if user is None else users[user], root=utt.root,
+                                  reply_to=utt.reply_to, timestamp=utt.timestamp, text=utt.text,
+                                  meta=dict(utt.meta.items())))
+        convos_meta[convo.id] = dict(convo.meta.items())
+        if len(utts) >= shard_size:
+            yield utts, convos_meta
+            utts, convos_meta, users = [], {}, {}
+    if utts:
+        yield utts, convos_meta
+
+def _run_kernel(args: Tuple[str, Tuple[List[Utterance], Dict]]) -> List[Tuple[Hashable, Optional[Dict]]]:
+    # runs the kernel of the worker's Transformer over one shard
+    kind, (utts, convos_meta) = args
+    transformer = _worker_transformer
+    if kind == "utterances":
+        return [(utt.id, transformer.transform_utterance(utt)) for utt in utts]
+    shard = Corpus(utterances=utts)
+    results = []
+    for convo_id, meta in convos_meta.items():
+        convo = shard.get_conversation(convo_id)
+        convo.meta.update(meta)
+        results.append((convo_id, transformer.transform_conversation(convo)))
+    return results
+
+def _add_results(objs: Dict, results) -> None:
+    # adds the metadata returned by a kernel to the utterances or conversations it was computed for
+    for obj_id, meta in results:
+        if not meta: continue
+        obj_meta = objs[obj_id].meta
+        for key, value in meta.items():
+            obj_meta[key] = value
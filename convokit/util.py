@@ -3,8 +3,11 @@ import shutil
 import os
 import zipfile
 import json
-from typing import Dict
+from collections import defaultdict
+from multiprocessing import Pool
+from typing import Dict, List, Optional
 from convokit.model import Utterance, Corpus
+from convokit.model.corpusUtil import json_array_to_jsonl, COMPRESSION_SUFFIXES
 import requests
 
 
@@ -229,19 +232,25 @@ def meta_index(corpus: Corpus=None, filename: str=None) -> Dict:
             d = json.load(f)
             return d
 
-def display_thread_helper(thread: Dict[str, Utterance], root: str, indent: int=0) -> None:
+def display_thread_helper(thread: Dict[str, Utterance], root: str, indent: int=0,
+                          children: Optional[Dict[str, List[str]]]=None) -> None:
     """
     Helper method for display_thread().
 
     :param thread: Dict for Utterance id -> Utterance for all utterances in the thread
     :param root: root of thread, aka thread id
     :param indent: Level of indentation so that reply structure of thread can be visualized
+    :param children: Dict for Utterance id -> ids of the utterances of the thread replying to it (computed from
+        thread if None)
     """
+    if children is None:
+        children = defaultdict(list)
+        for k, v in thread.items():
+            children[v.reply_to].append(k)
 
     print(" "*indent + thread[root].user.name)
-    children = [k for k, v in thread.items() if v.reply_to == root]
-    for child in children:
-        display_thread_helper(thread, child, indent=indent+4)
+    for child in children.get(root, []):
+        display_thread_helper(thread, child, indent=indent+4, children=children)
 
 def display_thread(threads: Dict[str, Dict[str, Utterance]], root: str) -> None:
     """
@@ -254,3 +263,52 @@ def display_thread(threads: Dict[str, Dict[str, Utterance]], root: str) -> None:
     """
 
     return display_thread_helper(threads[root],root)
+
+
+def convert_utterances_to_jsonl(filename: str, compression: Optional[str] = None,
+                                remove_json: bool = False) -> str:
+    """Converts a corpus' utterances.json into utterances.jsonl, which loads faster and supports partial loading.
+    The utterances are parsed and written one at a time, so the conversion uses little memory however large the
+    file is.
+
+    :param filename: path to a corpus directory, or to an utterances.json file
+    :param compression: compression format to write utterances.jsonl with ("gzip", "bz2", "xz" or "zstd"), if any
+    :param remove_json: if True, delete utterances.json after the conversion
+
+    :return: the path to the written utterances.jsonl
+    """
+    if os.path.isdir(filename):
+        filename = os.path.join(filename, "utterances.json")
+    jsonl_filename = os.path.splitext(filename)[0] + ".jsonl"
+    json_array_to_jsonl(filename, jsonl_filename, compression)
+    if remove_json:
+        os.remove(filename)
+    return jsonl_filename if compression is None else jsonl_filename + COMPRESSION_SUFFIXES[compression]
+
+
+def _find_utterance_jsons(path: str) -> List[str]:
+    found = []
+    for dir_path, _, filenames in os.walk(path):
+        if "utterances.json" in filenames:
+            found.append(os.path.join(dir_path, "utterances.json"))
+    return sorted(found)
+
+
+def convert_corpora_to_jsonl(path: str, n_workers: Optional[int] = None, compression: Optional[str] = None,
+                             remove_json: bool = False) -> List[str]:
+    """Converts the utterances.json of every corpus under a directory into utterances.jsonl (see
+    convert_utterances_to_jsonl), converting several corpora in parallel.
+
+    :param path: directory to search (recursively) for utterances.json files
+    :param n_workers: number of corpora to convert in parallel (None to use all available cores)
+    :param compression: compression format to write utterances.jsonl with, if any
+    :param remove_json: if True, delete each utterances.json after its conversion
+
+    :return: the paths to the written utterances.jsonl files
+    """
+    filenames = _find_utterance_jsons(path)
+    args = [(filename, compression, remove_json) for filename in filenames]
+    if n_workers == 1:
+        return [convert_utterances_to_jsonl(*arg) for arg in args]
+    with Pool(n_workers, maxtasksperchild=1) as pool:
+        return pool.starmap(convert_utterances_to_jsonl, args)
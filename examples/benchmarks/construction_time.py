@@ -0,0 +1,38 @@
+import sys
+import time
+from convokit.model import Utterance, User, Corpus
+
+# Reports the time taken to construct a Corpus, and to then build the utterance and conversation maps of its Users
+# (which is done on first access to User.utterances or User.conversations). With no arguments, a synthetic corpus
+# with many users is built; otherwise the corpus directory given as the first argument is loaded.
+#
+#   python construction_time.py [corpus-dir] [n-utterances]
+
+
+def synthetic_utterances(n_utts: int):
+    # one user per 4 utterances, as in corpora with millions of users (e.g. reddit)
+    users = [User(name="user{}".format(i)) for i in range(n_utts // 4)]
+    for i in range(n_utts):
+        yield Utterance(id="utt{}".format(i), text="", user=users[(i * 7919) % len(users)],
+                        root="utt{}".format(i - i % 50), reply_to=None if i % 50 == 0 else "utt{}".format(i - 1),
+                        timestamp=i)
+
+
+def timed(f):
+    start = time.perf_counter()
+    result = f()
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] != "-":
+        corpus, construct = timed(lambda: Corpus(filename=sys.argv[1]))
+    else:
+        n_utts = int(sys.argv[2]) if len(sys.argv) > 2 else 1000000
+        utterances = list(synthetic_utterances(n_utts))
+        corpus, construct = timed(lambda: Corpus(utterances=utterances))
+    _, users_data = timed(corpus.update_users_data)
+    print("Utterances: {}, users: {}, conversations: {}".format(len(corpus.utterances), len(corpus.all_users),
+                                                               len(corpus.conversations)))
+    print("Construction: {:.2f}s".format(construct))
+    print("User utterance and conversation maps: {:.2f}s".format(users_data))
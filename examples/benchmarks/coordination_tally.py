@@ -0,0 +1,39 @@
+import random
+import sys
+import time
+from convokit.model import Utterance, User, Corpus
+from convokit.coordination.coordination import Coordination, CoordinationWordCategories
+
+# Times the tally loop of Coordination.scores_over_utterances, which counts marker usage in dictionaries keyed by
+# (speaker, target) Users, on a synthetic corpus whose utterances are already annotated with LIWC categories.
+#
+#   python coordination_tally.py [n-utterances] [n-users]
+
+
+def synthetic_corpus(n_utts: int, n_users: int) -> Corpus:
+    rng = random.Random(0)
+    users = [User(name="user{}".format(i)) for i in range(n_users)]
+    utts = []
+    for i in range(n_utts):
+        cats = {cat for cat in CoordinationWordCategories if rng.random() < 0.3}
+        utts.append(Utterance(id="utt{}".format(i), text="", user=rng.choice(users),
+                              root="utt{}".format(i - i % 20), reply_to=None if i % 20 == 0 else "utt{}".format(i - 1),
+                              timestamp=i, meta={"liwc-categories": cats}))
+    return Corpus(utterances=utts)
+
+
+if __name__ == "__main__":
+    n_utts = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    n_users = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    corpus = synthetic_corpus(n_utts, n_users)
+    coord = Coordination()
+    coord.corpus = corpus
+    coord.precomputed = True # the utterances are annotated above, instead of by fit()
+
+    utterances = list(corpus.iter_utterances())
+    speakers = set(corpus.iter_users())
+    for fine_grained, label in [(True, "Users"), (False, "usernames")]:
+        start = time.perf_counter()
+        coord.scores_over_utterances(speakers if fine_grained else {user.name for user in speakers}, utterances,
+                                     0, 3, 0, 0, 0, 0, None, fine_grained, fine_grained)
+        print("Tally over {} utterances, keyed by {}: {:.2f}s".format(n_utts, label, time.perf_counter() - start))
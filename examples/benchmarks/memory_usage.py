@@ -0,0 +1,40 @@
+import gc
+import sys
+import tracemalloc
+from convokit.model import Utterance, User, Corpus
+
+# Reports the memory taken up by a Corpus, per utterance. With no arguments, a synthetic corpus is built (most of
+# its utterances and users have no metadata, as in e.g. the reddit corpora); otherwise the corpus directory given
+# as the first argument is loaded.
+#
+#   python memory_usage.py [corpus-dir] [n-utterances]
+
+
+def synthetic_utterances(n_utts: int):
+    users = [User(name="user{}".format(i), meta={"karma": i} if i % 10 == 0 else None) for i in range(n_utts // 20)]
+    for i in range(n_utts):
+        yield Utterance(id="utt{}".format(i), text="", user=users[i % len(users)],
+                        root="utt{}".format(i - i % 50), reply_to=None if i % 50 == 0 else "utt{}".format(i - 1),
+                        timestamp=i, meta={"score": i} if i % 4 == 0 else None)
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    corpus = build()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return corpus, size
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] != "-":
+        corpus, size = measure(lambda: Corpus(filename=sys.argv[1]))
+    else:
+        n_utts = int(sys.argv[2]) if len(sys.argv) > 2 else 200000
+        corpus, size = measure(lambda: Corpus(utterances=list(synthetic_utterances(n_utts))))
+    n_utts = len(corpus.utterances)
+    print("Utterances: {}, users: {}, conversations: {}".format(n_utts, len(corpus.all_users),
+                                                               len(corpus.conversations)))
+    print("Total: {:.1f} MB, {:.0f} bytes per utterance".format(size / 2 ** 20, size / n_utts))
@@ -0,0 +1,28 @@
+from typing import Callable, Dict, Optional
+from convokit.model import Utterance, User, Corpus
+
+
+def make_corpus(n_utts: int = 50, n_users: int = 5, thread_length: int = 10,
+                user_meta: Callable[[int], Optional[Dict]] = lambda i: None,
+                utt_meta: Callable[[int], Optional[Dict]] = lambda i: None,
+                text: Callable[[int], str] = "utterance number {}".format) -> Corpus:
+    """
+    Builds the Corpus the tests run on: utterances "utt0", "utt1", ... by users "user0", "user1", ... in turn, in
+    threads of thread_length utterances that each reply to the one before, with the i-th utterance at timestamp i.
+
+    :param n_utts: number of utterances
+    :param n_users: number of users
+    :param thread_length: number of utterances of each conversation
+    :param user_meta: metadata of the i-th user (None for no metadata)
+    :param utt_meta: metadata of the i-th utterance (None for no metadata)
+    :param text: text of the i-th utterance
+    :return: the Corpus
+    """
+    users = [User(name="user{}".format(i), meta=user_meta(i)) for i in range(n_users)]
+    utts = []
+    for i in range(n_utts):
+        reply_to = None if i % thread_length == 0 else "utt{}".format(i - 1)
+        utts.append(Utterance(id="utt{}".format(i), text=text(i), user=users[i % n_users],
+                              root="utt{}".format(i - i % thread_length), reply_to=reply_to,
+                              timestamp=i, meta=utt_meta(i)))
+    return Corpus(utterances=utts)
@@ -0,0 +1,454 @@
+import unittest
+import bz2
+import gzip
+import lzma
+import json
+import shutil
+import tempfile
+import os
+import pickle
+import numpy as np
+from functools import partial
+from convokit.model import Utterance, User, Corpus
+from convokit.model.convoKitMeta import LazyValue
+from convokit.model.corpusUtil import shard_of, shard_path, iter_json_array, load_columnar_utterances, \
+    iter_columnar_utterances
+from convokit import convert_corpora_to_jsonl
+import corpus_fixtures
+
+
+# every user and utterance has metadata
+make_corpus = partial(corpus_fixtures.make_corpus, user_meta=lambda i: {'idx': i},
+                      utt_meta=lambda i: {'position': i, 'tags': ["a", "b"]})
+
+
+class CorpusLoading(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.corpus = make_corpus()
+        self.corpus.dump("test-corpus", base_path=self.tmp_dir.name)
+        self.path = os.path.join(self.tmp_dir.name, "test-corpus")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_parallel_load(self):
+        """
+        Loading with several worker processes produces the same utterances, in the same order
+        """
+        sequential = Corpus(filename=self.path)
+        parallel = Corpus(filename=self.path, n_workers=3)
+        self.assertEqual(sequential.get_utterance_ids(), parallel.get_utterance_ids())
+        for utt in sequential.iter_utterances():
+            self.assertEqual(utt, parallel.get_utterance(utt.id))
+
+    def test_parallel_dump(self):
+        """
+        Dumping with several workers and the fast json encoder writes a corpus that loads the same
+        """
+        self.corpus.get_utterance("utt3").meta["binary"] = bytearray([3])
+        self.corpus.get_user("user1").meta["binary"] = bytearray([1])
+        self.corpus.meta["name"] = "test"
+        for kwargs in [{"n_workers": 3}, {"n_workers": 2, "fast_json": True}, {"n_workers": 2, "n_shards": 2}]:
+            self.corpus.dump("parallel-corpus", base_path=self.tmp_dir.name, **kwargs)
+            loaded = Corpus(filename=os.path.join(self.tmp_dir.name, "parallel-corpus"))
+            for utt in self.corpus.iter_utterances():
+                self.assertEqual(utt, loaded.get_utterance(utt.id))
+            self.assertEqual(loaded.get_user("user1").meta, {"idx": 1, "binary": bytearray([1])})
+            self.assertEqual(loaded.meta, {"name": "test"})
+        partial = Corpus(filename=os.path.join(self.tmp_dir.name, "parallel-corpus"), conversation_ids=["utt10"])
+        self.assertEqual(len(partial.get_utterance_ids()), 10)
+
+    def test_dump_late_binary_values(self):
+        """
+        Values that cannot be saved as json are saved as binary metadata, even in fields whose earlier values of the
+        same type could be
+        """
+        self.corpus.get_utterance("utt45").meta["tags"] = ["a", bytearray([45])]
+        self.corpus.get_conversation("utt0").meta["info"] = {"a": 1}
+        self.corpus.get_conversation("utt40").meta["info"] = {"a": bytearray([40])}
+        for kwargs in [{}, {"n_workers": 2}, {"n_workers": 2, "fast_json": True}, {"n_shards": 2}]:
+            self.corpus.dump("binary-corpus", base_path=self.tmp_dir.name, **kwargs)
+            loaded = Corpus(filename=os.path.join(self.tmp_dir.name, "binary-corpus"))
+            self.assertEqual(loaded.get_utterance("utt45").meta["tags"], ["a", bytearray([45])])
+            self.assertEqual(loaded.get_utterance("utt44").meta["tags"], ["a", "b"])
+            self.assertEqual(loaded.get_conversation("utt40").meta["info"], {"a": bytearray([40])})
+            self.assertEqual(loaded.get_conversation("utt0").meta["info"], {"a": 1})
+            self.assertEqual(loaded.meta_index["utterances-index"]["tags"], "bin")
+
+    def test_parallel_partial_load(self):
+        parallel = Corpus(filename=self.path, utterance_start_index=12, utterance_end_index=30, n_workers=3)
+        self.assertEqual(parallel.get_utterance_ids(), ["utt{}".format(i) for i in range(12, 31)])
+
+    def test_offset_index_partial_load(self):
+        """
+        Dump writes a byte-offset index, which partial loading uses to seek to the requested lines
+        """
+        self.assertTrue(os.path.exists(os.path.join(self.path, "utterances-offsets.bin")))
+        for n_workers in [1, 2]:
+            partial = Corpus(filename=self.path, utterance_start_index=45, n_workers=n_workers)
+            self.assertEqual(partial.get_utterance_ids(), ["utt{}".format(i) for i in range(45, 50)])
+            for utt in partial.iter_utterances():
+                self.assertEqual(utt, self.corpus.get_utterance(utt.id))
+            self.assertEqual(len(Corpus(filename=self.path, utterance_start_index=99).utterances), 0)
+
+    def test_stale_offset_index(self):
+        """
+        An offset index that no longer matches utterances.jsonl is ignored
+        """
+        with open(os.path.join(self.path, "utterances.jsonl"), "r") as f:
+            first_line = f.readline()
+        with open(os.path.join(self.path, "utterances.jsonl"), "w") as f:
+            f.write(first_line)
+        partial = Corpus(filename=self.path, utterance_start_index=0, utterance_end_index=5)
+        self.assertEqual(partial.get_utterance_ids(), ["utt0"])
+
+    def test_columnar_round_trip(self):
+        """
+        A corpus dumped in the columnar format loads with the same utterances, including binary metadata
+        """
+        utt = self.corpus.get_utterance("utt3")
+        utt.meta["binary"] = bytearray([1, 2, 3])
+        utt.timestamp = None
+        utt.text = None
+        self.corpus.dump("columnar-corpus", base_path=self.tmp_dir.name, columnar=True)
+        loaded = Corpus(filename=os.path.join(self.tmp_dir.name, "columnar-corpus"))
+        self.assertEqual(loaded.get_utterance_ids(), self.corpus.get_utterance_ids())
+        for utt in self.corpus.iter_utterances():
+            self.assertEqual(utt, loaded.get_utterance(utt.id))
+        self.assertEqual(loaded.meta_index["utterances-index"]["binary"], "bin")
+
+    def test_columnar_partial_load(self):
+        self.corpus.dump("columnar-corpus", base_path=self.tmp_dir.name, columnar=True)
+        path = os.path.join(self.tmp_dir.name, "columnar-corpus")
+        partial = Corpus(filename=path, utterance_start_index=20, utterance_end_index=24,
+                         exclude_utterance_meta=["tags"])
+        self.assertEqual(partial.get_utterance_ids(), ["utt{}".format(i) for i in range(20, 25)])
+        self.assertEqual(partial.get_utterance("utt21").meta, {'position': 21})
+        self.assertEqual(partial.get_utterance("utt21").reply_to, "utt20")
+
+    def test_columnar_batches(self):
+        """
+        Reading the columns in batches yields the same rows as reading them at once, for every timestamp column type
+        """
+        path = os.path.join(self.tmp_dir.name, "columnar-corpus")
+        for timestamp in [None, 2.5, "2020-01-01"]:
+            self.corpus.get_utterance("utt7").timestamp = timestamp
+            self.corpus.dump("columnar-corpus", base_path=self.tmp_dir.name, columnar=True)
+            rows = load_columnar_utterances(path)
+            self.assertEqual(rows[7]["timestamp"], timestamp)
+            self.assertEqual(list(iter_columnar_utterances(path, batch_size=3)), rows)
+            self.assertTrue(all(row["meta"] == {} for row in iter_columnar_utterances(path, with_meta=False)))
+
+    def test_lazy_binary_meta(self):
+        """
+        Binary utterance metadata is only unpickled when it is accessed
+        """
+        for utt in self.corpus.iter_utterances():
+            utt.meta["binary"] = bytearray([int(utt.id[3:])])
+        self.corpus.get_conversation("utt0").meta["binary"] = bytearray([7])
+        self.corpus.dump("binary-corpus", base_path=self.tmp_dir.name)
+        loaded = Corpus(filename=os.path.join(self.tmp_dir.name, "binary-corpus"))
+
+        meta = loaded.get_utterance("utt5").meta
+        self.assertIsInstance(dict.__getitem__(meta, "binary"), LazyValue)
+        self.assertEqual(meta["binary"], bytearray([5]))
+        self.assertNotIsInstance(dict.__getitem__(meta, "binary"), LazyValue)
+        self.assertEqual(dict(loaded.get_utterance("utt6").meta)["binary"], bytearray([6]))
+        self.assertEqual(loaded.get_conversation("utt0").meta["binary"], bytearray([7]))
+
+    def test_legacy_binary_meta(self):
+        """
+        Binary metadata saved as a single pickled list (without a per-record offset index) still loads
+        """
+        for utt in self.corpus.iter_utterances():
+            utt.meta["binary"] = bytearray([int(utt.id[3:])])
+        path = os.path.join(self.tmp_dir.name, "binary-corpus")
+        self.corpus.dump("binary-corpus", base_path=self.tmp_dir.name)
+        with open(os.path.join(path, "binary-bin.p"), "wb") as f:
+            pickle.dump([bytearray([i]) for i in range(50)], f)
+        os.remove(os.path.join(path, "binary-bin-offsets.bin"))
+
+        loaded = Corpus(filename=path)
+        for utt in self.corpus.iter_utterances():
+            self.assertEqual(utt, loaded.get_utterance(utt.id))
+
+    def test_incremental_dump(self):
+        """
+        An incremental dump only writes the modified metadata fields, and the base files are left untouched
+        """
+        with open(os.path.join(self.path, "utterances.jsonl"), "r") as f:
+            base_utterances = f.read()
+        loaded = Corpus(filename=self.path)
+        for utt in loaded.iter_utterances():
+            utt.meta["score"] = int(utt.id[3:]) * 2
+            utt.meta["parse"] = bytearray([int(utt.id[3:])])
+            del utt.meta["tags"]
+        loaded.get_user("user1").meta = {"idx": 100}
+        loaded.get_conversation("utt10").add_meta("label", "good")
+        loaded.dump("test-corpus", base_path=self.tmp_dir.name, incremental=True)
+
+        with open(os.path.join(self.path, "utterances.jsonl"), "r") as f:
+            self.assertEqual(f.read(), base_utterances)
+        reloaded = Corpus(filename=self.path)
+        for utt in loaded.iter_utterances():
+            self.assertEqual(utt, reloaded.get_utterance(utt.id))
+        self.assertEqual(reloaded.get_utterance("utt7").meta, {"position": 7, "score": 14, "parse": bytearray([7])})
+        self.assertEqual(reloaded.get_user("user1").meta, {"idx": 100})
+        self.assertEqual(reloaded.get_conversation("utt10").meta, {"label": "good"})
+        self.assertNotIn("tags", reloaded.meta_index["utterances-index"])
+        self.assertEqual(reloaded.meta_index["utterances-index"]["parse"], "bin")
+
+        # a second incremental dump builds on the first one; a full dump folds everything into the base files
+        reloaded.get_utterance("utt7").meta["score"] = -1
+        reloaded.dump("test-corpus", base_path=self.tmp_dir.name, incremental=True)
+        self.assertEqual(Corpus(filename=self.path).get_utterance("utt7").meta["score"], -1)
+        reloaded.dump("test-corpus", base_path=self.tmp_dir.name)
+        self.assertFalse(os.path.exists(os.path.join(self.path, "delta")))
+        self.assertEqual(Corpus(filename=self.path).get_utterance("utt7").meta["parse"], bytearray([7]))
+
+    def test_compressed_round_trip(self):
+        """
+        A corpus dumped with compression loads with the same utterances, including binary metadata and partial loads
+        """
+        for utt in self.corpus.iter_utterances():
+            utt.meta["binary"] = bytearray([int(utt.id[3:])])
+        self.corpus.dump("gzip-corpus", base_path=self.tmp_dir.name, compression="gzip")
+        path = os.path.join(self.tmp_dir.name, "gzip-corpus")
+        self.assertTrue(os.path.exists(os.path.join(path, "utterances.jsonl.gz")))
+        self.assertFalse(os.path.exists(os.path.join(path, "utterances.jsonl")))
+        for n_workers in [1, 2]:
+            loaded = Corpus(filename=path, n_workers=n_workers)
+            for utt in self.corpus.iter_utterances():
+                self.assertEqual(utt, loaded.get_utterance(utt.id))
+            partial = Corpus(filename=path, utterance_start_index=5, utterance_end_index=8, n_workers=n_workers)
+            self.assertEqual(partial.get_utterance_ids(), ["utt5", "utt6", "utt7", "utt8"])
+        self.assertEqual(loaded.get_user("user2").meta, {'idx': 2})
+
+    def test_compression_detected_from_content(self):
+        """
+        Compressed files are recognised by their first bytes, whatever their name
+        """
+        with open(os.path.join(self.path, "utterances.jsonl"), "rb") as f:
+            data = f.read()
+        for suffix, module in [(".gz", gzip), (".bz2", bz2), (".xz", lzma)]:
+            with open(os.path.join(self.tmp_dir.name, "utts.jsonl" + suffix), "wb") as f:
+                f.write(module.compress(data))
+            loaded = Corpus(filename=os.path.join(self.tmp_dir.name, "utts.jsonl" + suffix))
+            self.assertEqual(loaded.get_utterance_ids(), self.corpus.get_utterance_ids())
+        with open(os.path.join(self.path, "utterances.jsonl"), "wb") as f:
+            f.write(gzip.compress(data))
+        self.assertEqual(Corpus(filename=self.path).get_utterance_ids(), self.corpus.get_utterance_ids())
+
+    def test_sharded_round_trip(self):
+        utt = self.corpus.get_utterance("utt12")
+        utt.meta["binary"] = bytearray([12])
+        self.corpus.dump("sharded-corpus", base_path=self.tmp_dir.name, n_shards=3)
+        path = os.path.join(self.tmp_dir.name, "sharded-corpus")
+        loaded = Corpus(filename=path)
+        self.assertEqual(sorted(loaded.get_utterance_ids()), sorted(self.corpus.get_utterance_ids()))
+        for utt in self.corpus.iter_utterances():
+            self.assertEqual(utt, loaded.get_utterance(utt.id))
+
+    def test_sharded_partial_load(self):
+        """
+        Loading a sharded corpus by conversation ids or by shard only reads the shards needed
+        """
+        self.corpus.dump("sharded-corpus", base_path=self.tmp_dir.name, n_shards=4)
+        path = os.path.join(self.tmp_dir.name, "sharded-corpus")
+        shard = shard_of("utt20", 4)
+        # make every other shard unreadable, to check that it is not opened
+        for other in range(4):
+            if other != shard:
+                with open(os.path.join(shard_path(path, other), "utterances.jsonl"), "w") as f:
+                    f.write("not json\n")
+
+        loaded = Corpus(filename=path, conversation_ids=["utt20"])
+        self.assertEqual(loaded.get_conversation_ids(), ["utt20"])
+        self.assertEqual(loaded.get_utterance_ids(), ["utt{}".format(i) for i in range(20, 30)])
+        by_shard = Corpus(filename=path, shards=[shard])
+        self.assertEqual(set(by_shard.get_conversation_ids()),
+                         {c for c in self.corpus.get_conversation_ids() if shard_of(c, 4) == shard})
+        with self.assertRaises(ValueError):
+            partial = Corpus(filename=path, shards=[shard])
+            partial.dump("sharded-corpus", base_path=self.tmp_dir.name, incremental=True)
+
+    def test_sharded_int_ids(self):
+        """
+        Conversations with non-string ids are found through the manifest
+        """
+        user = User(name="user")
+        corpus = Corpus(utterances=[Utterance(id=i, text=str(i), user=user, root=i - i % 2,
+                                              reply_to=None if i % 2 == 0 else i - 1) for i in range(6)])
+        corpus.dump("sharded-corpus", base_path=self.tmp_dir.name, n_shards=3)
+        loaded = Corpus(filename=os.path.join(self.tmp_dir.name, "sharded-corpus"), conversation_ids=[2])
+        self.assertEqual(loaded.get_utterance_ids(), [2, 3])
+
+    def test_stream(self):
+        """
+        Streaming yields the same utterances as loading the corpus, whatever the format it was saved in
+        """
+        self.corpus.get_utterance("utt4").meta["binary"] = bytearray([4])
+        self.corpus.dump("test-corpus", base_path=self.tmp_dir.name)
+        for kwargs in [{}, {"compression": "gzip"}, {"columnar": True}, {"n_shards": 3}]:
+            self.corpus.dump("stream-corpus", base_path=self.tmp_dir.name, **kwargs)
+            streamed = list(Corpus.stream(os.path.join(self.tmp_dir.name, "stream-corpus")))
+            self.assertEqual(sorted(utt.id for utt in streamed), sorted(self.corpus.get_utterance_ids()))
+            for utt in streamed:
+                expected = self.corpus.get_utterance(utt.id)
+                self.assertEqual((utt.user.name, utt.root, utt.reply_to, utt.timestamp, utt.text, utt.meta),
+                                 (expected.user.name, expected.root, expected.reply_to, expected.timestamp,
+                                  expected.text, expected.meta))
+
+        utts = list(Corpus.stream(os.path.join(self.path, "utterances.jsonl"), fields=["text"]))
+        self.assertEqual(utts[3].text, "utterance number 3")
+        self.assertIsNone(utts[3].user)
+        self.assertEqual(utts[3].meta, {})
+
+    def test_stream_by_conversation(self):
+        convos = list(Corpus.stream(self.path, by_conversation=True))
+        self.assertEqual([convo[0].root for convo in convos], ["utt{}".format(i) for i in range(0, 50, 10)])
+        self.assertTrue(all(len(convo) == 10 for convo in convos))
+
+        with open(os.path.join(self.path, "utterances.jsonl"), "r") as f:
+            lines = f.readlines()
+        with open(os.path.join(self.path, "utterances.jsonl"), "w") as f:
+            f.writelines(lines[15:] + lines[:15])
+        with self.assertRaises(ValueError):
+            list(Corpus.stream(self.path, by_conversation=True))
+
+    def test_iter_json_array(self):
+        """
+        utterances.json is parsed incrementally, including elements split across chunk boundaries
+        """
+        utts = [{"id": "utt{}".format(i), "text": "x" * i, "meta": {"n": i, "f": i / 3, "l": [1, {"a": None}]}}
+                for i in range(40)]
+        filename = os.path.join(self.tmp_dir.name, "utterances.json")
+        with open(filename, "w") as f:
+            json.dump(utts, f, indent=1)
+        for chunk_size in [1, 7, 1 << 20]:
+            self.assertEqual(list(iter_json_array(filename, chunk_size=chunk_size)), utts)
+        with open(filename, "w") as f:
+            f.write(" [ 1, 23 ,\n456] ")
+        self.assertEqual(list(iter_json_array(filename, chunk_size=2)), [1, 23, 456])
+        with open(filename, "w") as f:
+            f.write("[1, 2")
+        with self.assertRaises(ValueError):
+            list(iter_json_array(filename))
+
+    def test_convert_to_jsonl(self):
+        with open(os.path.join(self.path, "utterances.jsonl"), "r") as f:
+            utts = [json.loads(line) for line in f]
+        for name in ["corpus-a", "corpus-b"]:
+            path = os.path.join(self.tmp_dir.name, "legacy", name)
+            os.makedirs(path)
+            for filename in ["users.json", "conversations.json", "corpus.json", "index.json"]:
+                shutil.copy(os.path.join(self.path, filename), path)
+            with open(os.path.join(path, "utterances.json"), "w") as f:
+                json.dump(utts, f)
+        legacy = Corpus(filename=os.path.join(self.tmp_dir.name, "legacy", "corpus-a"))
+        self.assertEqual(legacy.get_utterance_ids(), self.corpus.get_utterance_ids())
+
+        written = convert_corpora_to_jsonl(os.path.join(self.tmp_dir.name, "legacy"), n_workers=2, remove_json=True)
+        self.assertEqual(len(written), 2)
+        for filename in written:
+            converted = Corpus(filename=os.path.dirname(filename), utterance_start_index=40)
+            self.assertEqual(converted.get_utterance_ids(), ["utt{}".format(i) for i in range(40, 50)])
+            self.assertFalse(os.path.exists(os.path.join(os.path.dirname(filename), "utterances.json")))
+
+    def test_merge_many(self):
+        """
+        Merging corpora on disk gives the same corpus as loading them and merging them one after the other
+        """
+        parts = [make_corpus(30), make_corpus(50), make_corpus(40)]
+        parts[0].get_utterance("utt5").meta["binary"] = bytearray([5])
+        parts[1].get_utterance("utt5").meta["position"] = -5
+        parts[2].get_utterance("utt7").text = "changed"
+        parts[2].get_user("user1").meta["idx"] = 10
+        parts[1].get_conversation("utt10").meta["topic"] = "x"
+        parts[2].get_conversation("utt10").meta["topic"] = "y"
+        parts[1].meta["name"] = "b"
+        parts[1].get_utterance("utt45").meta["tags"] = ["a", bytearray([45])]
+        paths = []
+        for i, part in enumerate(parts):
+            part.dump("part{}".format(i), base_path=self.tmp_dir.name, sort_by_id=True)
+            paths.append(os.path.join(self.tmp_dir.name, "part{}".format(i)))
+        loaded = [Corpus(filename=path) for path in paths]
+        expected = loaded[0].merge(loaded[1], warnings=False).merge(loaded[2], warnings=False)
+
+        out_path = os.path.join(self.tmp_dir.name, "merged")
+        Corpus.merge_many(paths, out_path, warnings=False)
+        merged = Corpus(filename=out_path)
+        self.assertEqual(merged.get_utterance_ids(), sorted(expected.get_utterance_ids()))
+        for utt in merged.iter_utterances():
+            self.assertEqual(utt, expected.get_utterance(utt.id))
+        self.assertEqual(merged.get_utterance("utt5").meta, {"position": 5, "tags": ["a", "b"],
+                                                             "binary": bytearray([5])})
+        self.assertEqual(merged.get_utterance("utt7").text, "utterance number 7")
+        self.assertEqual(merged.get_user("user1").meta, expected.get_user("user1").meta)
+        self.assertEqual(merged.get_conversation("utt10").meta, {"topic": "y"})
+        self.assertEqual(merged.meta, {"name": "b"})
+
+        with self.assertRaises(ValueError):
+            Corpus.merge_many([self.path, out_path], os.path.join(self.tmp_dir.name, "unsorted"))
+
+        # ids that cannot be compared, within a corpus or across corpora
+        mixed = Corpus(utterances=[Utterance(id=utt_id, text="", user=User(name="user0"), root=utt_id)
+                                   for utt_id in [1, "utt1", 2]])
+        with self.assertRaisesRegex(ValueError, "cannot be ordered"):
+            mixed.dump("mixed", base_path=self.tmp_dir.name, sort_by_id=True)
+        mixed.dump("mixed", base_path=self.tmp_dir.name)
+        with self.assertRaisesRegex(ValueError, "cannot be ordered"):
+            Corpus.merge_many([os.path.join(self.tmp_dir.name, "mixed")], os.path.join(self.tmp_dir.name, "mixed-out"))
+        mixed.subset(lambda utt: type(utt.id) == int).dump("ints", base_path=self.tmp_dir.name, sort_by_id=True)
+        with self.assertRaisesRegex(ValueError, "cannot be ordered"):
+            Corpus.merge_many([os.path.join(self.tmp_dir.name, "ints"), out_path],
+                              os.path.join(self.tmp_dir.name, "mixed-out"))
+
+    def test_incremental_dump_requires_full_load(self):
+        partial = Corpus(filename=self.path, utterance_end_index=10)
+        with self.assertRaises(ValueError):
+            partial.dump("test-corpus", base_path=self.tmp_dir.name, incremental=True)
+
+    def test_incremental_dump_requires_all_meta(self):
+        for obj in [*self.corpus.iter_utterances(), *self.corpus.iter_users(), *self.corpus.iter_conversations()]:
+            obj.meta["vec"] = np.arange(3)
+        self.corpus.add_meta("vec", np.arange(3))
+        self.corpus.dump("test-corpus", base_path=self.tmp_dir.name)
+        for kind in ["utterance", "user", "conversation", "overall"]:
+            excluded = Corpus(filename=self.path, **{"exclude_{}_meta".format(kind): ["vec"]})
+            excluded.get_utterance("utt1").meta["position"] = -1
+            with self.assertRaises(ValueError):
+                excluded.dump("test-corpus", base_path=self.tmp_dir.name, incremental=True)
+        reloaded = Corpus(filename=self.path)
+        self.assertEqual(list(reloaded.get_utterance("utt1").meta["vec"]), [0, 1, 2])
+        self.assertEqual(reloaded.get_utterance("utt1").meta["position"], 1)
+
+    def test_fingerprint_saved(self):
+        # dumping does not compute the fingerprint
+        self.assertNotIn("fingerprint", Corpus(filename=self.path).meta_index)
+        self.assertIsNone(self.corpus._fingerprint.state())
+
+        fingerprint = self.corpus.fingerprint(["tags"])
+        self.corpus.dump("test-corpus", base_path=self.tmp_dir.name)
+        loaded = Corpus(filename=self.path)
+        self.assertEqual(loaded.meta_index["fingerprint"], self.corpus._fingerprint.state())
+        self.assertEqual(set(loaded._fingerprint._fields), {"tags"})
+        self.assertEqual(loaded.fingerprint(["tags"]), fingerprint)
+        self.assertEqual(loaded.fingerprint(["tags"], refresh=True), fingerprint)
+        excluded = Corpus(filename=self.path, exclude_utterance_meta=["tags"])
+        self.assertEqual(excluded.fingerprint(), self.corpus.fingerprint())
+        self.assertNotEqual(excluded.fingerprint(["tags"]), fingerprint)
+
+        # an incremental dump saves the sums of the fields written to, which are updated in place
+        loaded.fingerprint(["position"])
+        loaded.get_utterance("utt1").meta["tags"] = []
+        loaded.dump("test-corpus", base_path=self.tmp_dir.name, incremental=True)
+        reloaded = Corpus(filename=self.path)
+        self.assertEqual(set(reloaded._fingerprint._fields), {"position", "tags"})
+        self.assertEqual(reloaded.fingerprint(["tags"]), reloaded.fingerprint(["tags"], refresh=True))
+        self.assertNotEqual(reloaded.fingerprint(["tags"]), fingerprint)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,501 @@
+import unittest
+import gc
+import os
+import pickle
+import tempfile
+from collections import defaultdict
+from functools import partial
+from convokit.model import Utterance, User, Conversation, Corpus
+from convokit.model import user as user_module
+from convokit.model.convoKitMeta import EmptyMeta
+from convokit import HyperConvo, Transformer
+import corpus_fixtures
+
+
+# only some users and utterances have metadata, so that the others share the EmptyMeta of the Corpus
+make_corpus = partial(corpus_fixtures.make_corpus, user_meta=lambda i: {'idx': i} if i % 2 == 0 else None,
+                      utt_meta=lambda i: {'position': i} if i % 3 == 0 else None)
+
+
+class TextLength(Transformer):
+    # per-utterance kernel, also reading the user's metadata
+    def transform(self, corpus: Corpus) -> Corpus:
+        return self.parallel_transform(corpus)
+
+    def transform_utterance(self, utt: Utterance):
+        return {'length': len(utt.text), 'user_idx': utt.user.meta.get('idx')}
+
+
+class ConversationSize(Transformer):
+    # per-conversation kernel
+    def transform(self, corpus: Corpus) -> Corpus:
+        return self.parallel_transform(corpus)
+
+    def transform_conversation(self, convo: Conversation):
+        return {'size': len(convo.get_utterance_ids()), 'last': convo.get_chronological_utterance_ids()[-1]}
+
+
+class CorpusModel(unittest.TestCase):
+    def setUp(self):
+        self.corpus = make_corpus()
+
+    def test_slots(self):
+        """
+        Utterances, Users and Conversations have no per-instance __dict__
+        """
+        for obj in [self.corpus.get_utterance("utt1"), self.corpus.get_user("user1"),
+                    self.corpus.get_conversation("utt0")]:
+            self.assertFalse(hasattr(obj, "__dict__"))
+
+    def test_shared_empty_meta(self):
+        """
+        Objects without metadata share one empty metadata dict, which is swapped for their own on first write
+        """
+        utt1, utt2 = self.corpus.get_utterance("utt1"), self.corpus.get_utterance("utt2")
+        self.assertIs(utt1._meta, utt2._meta)
+        self.assertIsInstance(utt1._meta, EmptyMeta)
+        with self.assertRaises(TypeError):
+            utt1._meta["x"] = 1
+
+        utt1.meta["x"] = 1
+        self.assertEqual(utt1.meta, {"x": 1})
+        self.assertEqual(utt2.meta, {})
+        self.assertIsNot(utt1._meta, utt2._meta)
+        self.assertIn("x", self.corpus._meta_trackers["utterances"].dirty)
+        self.corpus.get_user("user1").add_meta("y", 2)
+        self.assertEqual(self.corpus.get_user("user1").meta, {"y": 2})
+        self.assertEqual(self.corpus.get_user("user3").meta, {})
+
+        # reads leave the metadata shared
+        utt4 = self.corpus.get_utterance("utt4")
+        self.assertIsNone(utt2.meta.get("x"))
+        self.assertNotIn("x", utt2.meta)
+        self.assertEqual(list(utt2.meta.items()), [])
+        self.assertIs(utt2._meta, utt4._meta)
+
+        # metadata held on to before the first write becomes the object's own
+        meta = utt2.meta
+        meta["a"] = 1
+        meta["b"] = 2
+        self.assertIs(utt2._meta, meta)
+        self.assertEqual(utt2.meta, {"a": 1, "b": 2})
+        self.assertIsInstance(utt4._meta, EmptyMeta)
+        self.assertEqual(pickle.loads(pickle.dumps(utt2)).meta, {"a": 1, "b": 2})
+
+    def test_equality_and_pickle(self):
+        """
+        Utterances compare and pickle by their attributes
+        """
+        utt = self.corpus.get_utterance("utt3")
+        copy = Utterance(id="utt3", text="utterance number 3", user=utt.user, root="utt0", reply_to="utt2",
+                         timestamp=3, meta={"position": 3})
+        self.assertEqual(utt, copy)
+        copy.text = "other"
+        self.assertNotEqual(utt, copy)
+        self.assertEqual(pickle.loads(pickle.dumps(utt)).text, utt.text)
+        self.assertIn("'text': 'utterance number 3'", repr(utt))
+
+    def test_user_identity(self):
+        """
+        Users are identified by name, or by name and attributes after identify_by_attribs, across pickling
+        """
+        alice, other_alice, bob = User(name="alice", meta={"case": 1}), User(name="alice", meta={"case": 2}), \
+            User(name="bob")
+        self.assertEqual(alice, other_alice)
+        self.assertEqual(len({alice, other_alice, bob}), 2)
+        alice.identify_by_attribs(["case"])
+        other_alice.identify_by_attribs(["case"])
+        self.assertNotEqual(alice, other_alice)
+        self.assertNotEqual(alice, User(name="alice"))
+        self.assertEqual(repr(alice), "User([('attribs', {'case': 1}), ('name', 'alice')])")
+        self.assertLess(bob, User(name="carol"))
+        self.assertEqual(pickle.loads(pickle.dumps(alice)), alice)
+        self.assertEqual(pickle.loads(pickle.dumps(bob))._uid, bob._uid)
+
+        # identities are only kept while a User has them
+        dave = User(name="dave")
+        self.assertIn("dave", user_module._identities)
+        del dave
+        gc.collect()
+        self.assertNotIn("dave", user_module._identities)
+
+    def test_loaded_ids_interned(self):
+        """
+        Ids and usernames read from disk are interned
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self.corpus.dump("test-corpus", base_path=tmp_dir)
+            loaded = Corpus(filename=os.path.join(tmp_dir, "test-corpus"))
+        utt0, utt1 = loaded.get_utterance("utt0"), loaded.get_utterance("utt1")
+        self.assertIs(utt0.id, utt1.root)
+        self.assertIs(utt0.id, utt1.reply_to)
+        self.assertIs(utt1.user, loaded.get_utterance("utt6").user)
+        self.assertIs(utt1.user.name, next(name for name in loaded.all_users if name == "user1"))
+
+    def test_arrays(self):
+        """
+        The corpus arrays index utterances, their parents, conversations, users and timestamps by position
+        """
+        arrays = self.corpus.get_arrays()
+        self.assertIs(arrays, self.corpus.get_arrays())
+        self.assertEqual(arrays.ids, self.corpus.get_utterance_ids())
+        for i, utt in enumerate(self.corpus.iter_utterances()):
+            self.assertEqual(arrays.index[utt.id], i)
+            parent = arrays.parent[i]
+            self.assertEqual(arrays.ids[parent] if parent >= 0 else None, utt.reply_to)
+            self.assertEqual(arrays.conversation_ids[arrays.conversation[i]], utt.root)
+            self.assertIs(arrays.users[arrays.user[i]], utt.user)
+            self.assertEqual(arrays.timestamp[i], utt.timestamp)
+
+        self.corpus.filter_utterances_by(regular_kv_pairs={"root": "utt10"})
+        self.assertEqual(len(self.corpus.get_arrays()), 10)
+        self.assertEqual(self.corpus.get_arrays().parent[0], -1)
+
+    def test_speaking_pairs(self):
+        """
+        Speaking pairs and pairwise exchanges computed over the corpus arrays match a scan over the utterances
+        """
+        expected = defaultdict(list)
+        for utt in self.corpus.iter_utterances():
+            if utt.reply_to is not None:
+                expected[utt.user, self.corpus.get_utterance(utt.reply_to).user].append(utt)
+        self.assertEqual(self.corpus.speaking_pairs(), set(expected))
+        self.assertEqual(dict(self.corpus.pairwise_exchanges()), dict(expected))
+        self.assertEqual(self.corpus.speaking_pairs(user_names_only=True),
+                         {(u2.name, u1.name) for u2, u1 in expected})
+        self.assertEqual(set(self.corpus.pairwise_exchanges(lambda u2, u1: u2.name == "user1")),
+                         {(u2, u1) for u2, u1 in expected if u2.name == "user1"})
+
+    def test_interaction_matrix(self):
+        """
+        The interaction matrix counts the replies between each pair of users, and is kept up to date as utterances
+        are added
+        """
+        utts = list(make_corpus(60).iter_utterances())
+        corpus = Corpus(utterances=utts[:40])
+        interactions = corpus.interaction_matrix()
+        self.assertIs(interactions, corpus.interaction_matrix())
+        corpus.add_utterances(utts[45:])
+        corpus.add_utterances(utts[40:45])
+
+        arrays = corpus.get_arrays()
+        expected = defaultdict(list)
+        for i, utt in enumerate(corpus.iter_utterances()):
+            if utt.reply_to is not None:
+                parent = arrays.index[utt.reply_to]
+                expected[arrays.user[i], arrays.user[parent]].append(i)
+        counts = interactions.counts.toarray()
+        self.assertEqual(counts.shape, (5, 5))
+        self.assertEqual(counts.sum(), 54)
+        for (speaker, target), replies in expected.items():
+            self.assertEqual(counts[speaker, target], len(replies))
+            self.assertEqual(interactions.get_replies(speaker, target).tolist(), replies)
+        self.assertEqual(len(interactions.get_replies(0, 0)), 0)
+
+        user1 = arrays.users.index(corpus.get_user("user1"))
+        mask = arrays.user_mask([corpus.get_user("user1")])
+        speakers, targets = interactions.pairs()
+        self.assertEqual(speakers[interactions.select(mask, ~mask)].tolist(), [user1])
+        self.assertEqual(corpus.speaking_pairs(user_names_only=True), {("user{}".format((i + 1) % 5),
+                                                                        "user{}".format(i)) for i in range(5)})
+
+    def test_reply_tree(self):
+        """
+        The reply tree gives the children, depth, subtree size and ancestors of each utterance
+        """
+        tree = full_tree = self.corpus.get_conversation("utt0").get_reply_tree()
+        self.assertIs(tree, self.corpus.get_reply_tree())
+        self.assertEqual(tree.get_children("utt0"), ["utt1"])
+        self.assertEqual(tree.get_children("utt9"), [])
+        self.assertEqual(tree.get_depth("utt0"), 0)
+        self.assertEqual(tree.get_depth("utt13"), 3)
+        self.assertEqual(tree.get_subtree_size("utt10"), 10)
+        self.assertEqual(tree.get_subtree_size("utt17"), 3)
+        self.assertEqual(tree.get_ancestors("utt13"), ["utt12", "utt11", "utt10"])
+        self.assertEqual(tree.get_ancestors("utt10"), [])
+
+        # branching replies, and replies to utterances that are not in the corpus
+        user = User(name="x")
+        corpus = Corpus(utterances=[Utterance(id="a", user=user, root="a"),
+                                    Utterance(id="b", user=user, root="a", reply_to="a"),
+                                    Utterance(id="c", user=user, root="a", reply_to="a"),
+                                    Utterance(id="d", user=user, root="a", reply_to="c"),
+                                    Utterance(id="e", user=user, root="a", reply_to="missing")])
+        tree = corpus.get_reply_tree()
+        self.assertEqual(tree.get_children("a"), ["b", "c"])
+        self.assertEqual([tree.get_depth(i) for i in "abcde"], [0, 1, 1, 2, 0])
+        self.assertEqual([tree.get_subtree_size(i) for i in "abcde"], [4, 1, 2, 1, 1])
+
+        self.corpus.filter_utterances_by(regular_kv_pairs={"root": "utt10"})
+        self.assertIsNot(self.corpus.get_reply_tree(), full_tree)
+        self.assertEqual(self.corpus.get_reply_tree().get_subtree_size("utt10"), 10)
+
+    def test_timelines(self):
+        """
+        Conversations and threads are sorted by timestamp, and sliced from cached timelines
+        """
+        # timestamps run backwards within each conversation, with a tie
+        for utt in self.corpus.iter_utterances():
+            utt.timestamp = -int(utt.id[3:]) if utt.id != "utt14" else -13
+        self.corpus._reset_indexes()
+        self.assertEqual(self.corpus.get_conversation("utt10").get_chronological_utterance_ids(),
+                         ["utt19", "utt18", "utt17", "utt16", "utt15", "utt13", "utt14", "utt12", "utt11", "utt10"])
+
+        threads = self.corpus.utterance_threads()
+        self.assertEqual(list(threads), ["utt0", "utt10", "utt20", "utt30", "utt40"])
+        self.assertEqual(list(threads["utt10"]), self.corpus.get_chronological_utterance_ids("utt10"))
+        self.assertEqual(list(self.corpus.utterance_threads(prefix_len=3)["utt20"]), ["utt29", "utt28", "utt27"])
+        self.assertEqual(list(self.corpus.utterance_threads(suffix_len=2)["utt20"]), ["utt21", "utt20"])
+
+        # comment threads are grouped by top-level reply, leaving out the root
+        threads = self.corpus.utterance_threads(include_root=False)
+        self.assertEqual(list(threads), ["utt1", "utt11", "utt21", "utt31", "utt41"])
+        self.assertEqual(list(threads["utt1"]), ["utt9", "utt8", "utt7", "utt6", "utt5", "utt4", "utt3", "utt2",
+                                                 "utt1"])
+
+        # top-level replies to a root that is not in the corpus still start threads
+        user = User(name="x")
+        corpus = Corpus(utterances=[Utterance(id="t1", user=user, root="r", reply_to="r", timestamp=1),
+                                    Utterance(id="t2", user=user, root="r", reply_to="t1", timestamp=2),
+                                    Utterance(id="t3", user=user, root="r", reply_to="gone", timestamp=3)])
+        threads = corpus.utterance_threads(include_root=False)
+        self.assertEqual({key: list(thread) for key, thread in threads.items()}, {"t1": ["t1", "t2"]})
+        self.assertEqual(list(self.corpus.subset(conversation_ids=["utt10"]).utterance_threads(include_root=False)),
+                         ["utt11"])
+
+    def test_meta_index(self):
+        """
+        Indexed metadata keys answer equality, membership and range queries, and are kept up to date
+        """
+        for utt in self.corpus.iter_utterances():
+            utt.meta["group"] = int(utt.id[3:]) % 4
+        self.corpus.get_utterance("utt5").meta["group"] = [1]
+        self.corpus.create_index("group")
+        index = self.corpus._meta_indexes["utterances"]["group"]
+        self.assertEqual(self.corpus.get_ids_with_meta("group", [3])[:3], ["utt3", "utt7", "utt11"])
+        self.assertEqual(self.corpus.get_ids_with_meta("group", [[1]]), ["utt5"])
+        self.assertEqual(len(self.corpus.get_ids_with_meta("group", [0, 2])), 25)
+        self.assertEqual(len(self.corpus.get_ids_with_meta("group", lower=1, upper=2)), 24)
+        self.assertEqual(self.corpus.get_ids_with_meta("position", lower=40), ["utt42", "utt45", "utt48"])
+        self.assertEqual(self.corpus.get_ids_with_meta("idx", [2], kind="users"), ["user2"])
+        self.assertFalse(index.stale)
+
+        # writing to the key marks the index stale, and it is rebuilt on next use
+        self.corpus.get_utterance("utt3").meta["group"] = 0
+        self.assertTrue(index.stale)
+        self.assertEqual(self.corpus.get_ids_with_meta("group", [3])[:2], ["utt7", "utt11"])
+
+        self.corpus.filter_utterances_by(meta_kv_pairs={"group": 3})
+        self.assertEqual(len(self.corpus.utterances), 11)
+        self.corpus.filter_utterances_by(regular_kv_pairs={"root": "utt10"}, meta_kv_pairs={"group": 3})
+        self.assertEqual(self.corpus.get_utterance_ids(), ["utt11", "utt15", "utt19"])
+        self.assertEqual(self.corpus.get_ids_with_meta("group"), ["utt11", "utt15", "utt19"])
+
+    def test_time_slicing(self):
+        """
+        Time slices and windows are views of the utterances in a time range
+        """
+        window = self.corpus.slice_by_time(12, 25)
+        self.assertEqual(window.get_utterance_ids(), ["utt{}".format(i) for i in range(12, 25)])
+        self.assertIs(window.get_utterance("utt12"), self.corpus.get_utterance("utt12"))
+        self.assertEqual(window.get_conversation_ids(), ["utt10", "utt20"])
+        self.assertEqual(window.get_conversation("utt10").get_utterance_ids(),
+                         ["utt{}".format(i) for i in range(12, 20)])
+        self.assertEqual(window.get_usernames(), {"user{}".format(i) for i in range(5)})
+        self.assertEqual(len(self.corpus.slice_by_time(end=10).utterances), 10)
+        self.assertEqual(len(self.corpus.slice_by_time(48.5).utterances), 1)
+        self.assertEqual(len(self.corpus.slice_by_time(100).utterances), 0)
+
+        windows = list(self.corpus.iter_time_windows(20, step=15))
+        self.assertEqual([t for t, _ in windows], [0, 15, 30, 45])
+        self.assertEqual([len(view.utterances) for _, view in windows], [20, 20, 20, 5])
+        for width, step in [(0, None), (10, 0), (10, -5), (-1, 1)]:
+            with self.assertRaises(ValueError):
+                next(self.corpus.iter_time_windows(width, step=step))
+
+        # metadata written through a view is seen by the full corpus
+        window.get_conversation("utt10").add_meta("label", 1)
+        window.get_utterance("utt13").meta["x"] = 2
+        self.assertEqual(self.corpus.get_conversation("utt10").meta["label"], 1)
+        self.assertEqual(self.corpus.get_utterance("utt13").meta["x"], 2)
+        self.assertEqual(len(self.corpus.get_user("user0").get_utterance_ids()), 10)
+
+        # string timestamps are compared as strings, even when they hold numbers
+        user = User(name="user")
+        corpus = Corpus(utterances=[Utterance(id=str(i), text="", user=user, root="0", timestamp=t)
+                                    for i, t in enumerate(["9", "10", "2", "100"])])
+        self.assertEqual(corpus.get_chronological_utterance_ids("0"), ["1", "3", "2", "0"])
+        self.assertEqual(corpus.slice_by_time("10", "2").get_utterance_ids(), ["1", "3"])
+
+        # missing timestamps sort last, and are left out of time slices
+        corpus = Corpus(utterances=[Utterance(id=str(i), text="", user=user, root="0", reply_to=None if i == 0 else "0",
+                                              timestamp=t) for i, t in enumerate(["b", None, "a", None, "c"])])
+        self.assertEqual(corpus.get_chronological_utterance_ids("0"), ["2", "0", "4", "1", "3"])
+        self.assertEqual(corpus.slice_by_time("a").get_utterance_ids(), ["2", "0", "4"])
+        self.assertEqual(list(corpus.utterance_threads()["0"]), ["2", "0", "4", "1", "3"])
+        corpus.add_utterances([Utterance(id="5", text="", user=user, root="0", reply_to="0", timestamp=None),
+                               Utterance(id="6", text="", user=user, root="0", reply_to="0", timestamp="ab")])
+        self.assertEqual(corpus.get_chronological_utterance_ids("0"), ["2", "6", "0", "4", "1", "3", "5"])
+
+    def test_subset(self):
+        """
+        Subsets are views that leave the corpus unchanged, and Transformers can run on them
+        """
+        view = self.corpus.subset(lambda utt: int(utt.id[3:]) % 2 == 0, conversation_ids=["utt20", "utt0"])
+        self.assertEqual(view.get_utterance_ids(), ["utt20", "utt22", "utt24", "utt26", "utt28",
+                                                    "utt0", "utt2", "utt4", "utt6", "utt8"])
+        self.assertEqual(view.get_usernames(), {"user0", "user1", "user2", "user3", "user4"})
+        self.assertEqual(len(self.corpus.utterances), 50)
+        self.assertEqual(self.corpus.subset(utterance_ids=["utt3", "missing", "utt1"]).get_utterance_ids(),
+                         ["utt3", "utt1"])
+        self.assertEqual(self.corpus.subset(utterance_ids=["utt3", "utt11"], conversation_ids=["utt10"])
+                         .get_utterance_ids(), ["utt11"])
+        nested = view.subset(conversation_ids=["utt0"])
+        self.assertIs(nested._view_of, self.corpus)
+        self.assertEqual(nested.get_conversation("utt0").get_utterance_ids(), ["utt0", "utt2", "utt4", "utt6", "utt8"])
+        self.assertEqual(nested.get_reply_tree().get_depth("utt2"), 0)
+
+        HyperConvo(prefix_len=5, min_thread_len=5).fit_transform(self.corpus.subset(conversation_ids=["utt10"]))
+        self.assertIn("hyperconvo", self.corpus.get_conversation("utt10").meta)
+        self.assertNotIn("hyperconvo", self.corpus.get_conversation("utt0").meta)
+
+    def test_lazy_user_data(self):
+        """
+        The utterance and conversation maps of Users are built on first access
+        """
+        user = self.corpus.get_user("user1")
+        self.assertIsNone(user._utterances)
+        self.assertEqual(user.get_utterance_ids(), ["utt{}".format(i) for i in range(1, 50, 5)])
+        self.assertEqual(user.get_conversation_ids(), ["utt{}".format(i) for i in range(0, 50, 10)])
+        self.assertIsNotNone(self.corpus.get_user("user2")._utterances)
+
+        # the maps are built from the utterances left after filtering
+        corpus = make_corpus()
+        corpus.filter_utterances_by(regular_kv_pairs={"root": "utt10"})
+        self.assertEqual(corpus.get_user("user1").get_utterance_ids(), ["utt11", "utt16"])
+        self.assertEqual(corpus.get_user("user1").get_conversation_ids(), ["utt10"])
+
+    def test_add_utterances(self):
+        """
+        Adding utterances in batches updates the corpus, its users and its indexes as rebuilding them would
+        """
+        utts = list(make_corpus(60).iter_utterances())
+        corpus = Corpus(utterances=utts[:30])
+        corpus.get_arrays()
+        corpus.create_index("position")
+        corpus.create_index("idx", kind="users")
+        later = utts[30:]
+        later[4], later[5] = later[5], later[4]   # utt35 is added before the utterance it replies to
+        for start in range(0, len(later), 7):
+            self.assertIs(corpus.add_utterances(later[start:start + 7]), corpus)
+        corpus.add_utterances([Utterance(id="utt61", text="x", user=User(name="user1", meta={"idx": 1}), root="utt60",
+                                         reply_to="utt59")])
+
+        expected = make_corpus(62)
+        self.assertEqual(set(corpus.get_utterance_ids()), set(expected.get_utterance_ids()) - {"utt60"})
+        arrays = corpus.get_arrays()
+        for i, utt in enumerate(corpus.iter_utterances()):
+            parent = arrays.parent[i]
+            self.assertEqual(arrays.ids[parent] if parent >= 0 else None,
+                             utt.reply_to if utt.reply_to in corpus.utterances else None)
+            self.assertEqual(arrays.conversation_ids[arrays.conversation[i]], utt.root)
+            self.assertIs(arrays.users[arrays.user[i]], utt.user)
+        self.assertEqual(corpus.get_reply_tree().get_ancestors("utt36"), ["utt35", "utt34", "utt33", "utt32",
+                                                                           "utt31", "utt30"])
+        self.assertEqual(corpus.get_chronological_utterance_ids("utt30"), ["utt{}".format(i) for i in range(30, 40)])
+        self.assertEqual(corpus.get_ids_with_meta("position", lower=50), ["utt51", "utt54", "utt57"])
+        self.assertEqual(corpus.get_ids_with_meta("idx", kind="users"), ["user0", "user1", "user2", "user4"])
+        self.assertEqual(corpus.get_utterance("utt61").user, corpus.get_user("user1"))
+
+        users_utts = defaultdict(set)
+        for utt in corpus.iter_utterances():
+            users_utts[utt.user.name].add(utt.id)
+        for user in corpus.iter_users():
+            self.assertEqual(set(user.get_utterance_ids()), users_utts[user.name])
+            self.assertEqual(set(user.get_conversation_ids()),
+                             {corpus.get_utterance(utt_id).root for utt_id in users_utts[user.name]})
+        self.assertEqual(corpus.get_conversation("utt50").get_utterance_ids(),
+                         ["utt{}".format(i) for i in range(50, 60)])
+
+        # conversation timelines already built are extended rather than rebuilt
+        corpus.add_utterances([Utterance(id="late", text="", user=User(name="user0"), root="utt30",
+                                         reply_to="utt33", timestamp=33.5)])
+        self.assertIn(True, corpus._timelines)
+        self.assertEqual(corpus.get_chronological_utterance_ids("utt30"),
+                         ["utt30", "utt31", "utt32", "utt33", "late"] + ["utt{}".format(i) for i in range(34, 40)])
+        self.assertEqual(corpus.get_reply_tree().get_ancestors("late"), ["utt33", "utt32", "utt31", "utt30"])
+
+    def test_parallel_transform(self):
+        serial, parallel = make_corpus(95), make_corpus(95)
+        TextLength().parallel_transform(serial)
+        TextLength().parallel_transform(parallel, n_workers=2, shard_size=7)
+        for utt in parallel.iter_utterances():
+            self.assertEqual(utt.meta['length'], len(utt.text))
+            self.assertEqual(utt.meta['user_idx'], utt.user.meta.get('idx'))
+            self.assertEqual(dict(utt.meta.items()), dict(serial.get_utterance(utt.id).meta.items()))
+
+        # users identified by attributes keep their own metadata in the shards, even when they share a name
+        users = [User(name="judge", meta={"case": i, "idx": i}) for i in range(2)]
+        for user in users:
+            user.identify_by_attribs(["case"])
+        corpus = Corpus(utterances=[Utterance(id="utt{}".format(i), text="", user=users[i], root="utt0")
+                                    for i in range(2)])
+        TextLength().parallel_transform(corpus, n_workers=2, shard_size=1)
+        self.assertEqual([utt.meta['user_idx'] for utt in corpus.iter_utterances()], [0, 1])
+
+        ConversationSize().parallel_transform(serial)
+        ConversationSize().parallel_transform(parallel, n_workers=2, shard_size=7)
+        for convo in parallel.iter_conversations():
+            self.assertEqual(convo.meta['size'], 5 if convo.id == "utt90" else 10)
+            self.assertEqual(dict(convo.meta.items()), dict(serial.get_conversation(convo.id).meta.items()))
+        self.assertEqual(parallel.get_conversation("utt20").meta['last'], "utt29")
+
+        with self.assertRaises(NotImplementedError):
+            HyperConvo().parallel_transform(serial)
+
+    def test_fingerprint(self):
+        fingerprint = self.corpus.fingerprint()
+        self.assertEqual(make_corpus().fingerprint(), fingerprint)
+        with_position = self.corpus.fingerprint(["position"])
+        self.assertNotEqual(with_position, fingerprint)
+
+        # the order of the utterances does not matter, and added utterances are hashed incrementally
+        utts = list(make_corpus(60).iter_utterances())
+        corpus = Corpus(utterances=utts[30:50])
+        corpus.fingerprint(["position"])
+        corpus.add_utterances(utts[:30] + utts[50:])
+        expected = make_corpus(60)
+        self.assertEqual(corpus.fingerprint(["position"]), expected.fingerprint(["position"]))
+        self.assertEqual(corpus.fingerprint(), expected.fingerprint())
+
+        # metadata writes only affect the fields they write to
+        utt = self.corpus.get_utterance("utt3")
+        utt.add_meta("position", -1)
+        utt.add_meta("other", 1)
+        self.assertEqual(self.corpus.fingerprint(), fingerprint)
+        self.assertNotEqual(self.corpus.fingerprint(["position"]), with_position)
+        utt.meta["position"] = 3
+        self.assertEqual(self.corpus.fingerprint(["position"]), with_position)
+
+        # writes update the hash of the field in place, including deletions, writes to utterances without metadata,
+        # replaced metadata and writes through a subset view
+        field_sum = self.corpus._fingerprint._fields["position"]
+        view = self.corpus.subset(utterance_ids=["utt9", "utt10"])
+        view.fingerprint(["position"])
+        utt.meta.pop("position")
+        self.corpus.get_utterance("utt4").add_meta("position", 4)
+        self.corpus.get_utterance("utt6").meta = {"position": 60, "other": 2}
+        view.get_utterance("utt9").meta["position"] = 90
+        self.assertIs(self.corpus._fingerprint._fields["position"], field_sum)
+        self.assertFalse(field_sum.stale)
+        self.assertFalse(view._fingerprint._fields["position"].stale)
+        self.assertEqual(self.corpus.fingerprint(["position"]), self.corpus.fingerprint(["position"], refresh=True))
+        self.assertEqual(view.fingerprint(["position"]), view.fingerprint(["position"], refresh=True))
+
+        utt.text = "changed"
+        self.assertEqual(self.corpus.fingerprint(), fingerprint)
+        self.assertNotEqual(self.corpus.fingerprint(refresh=True), fingerprint)
+
+
+if __name__ == '__main__':
+    unittest.main()
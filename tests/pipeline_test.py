@@ -0,0 +1,92 @@
+import unittest
+import os
+import tempfile
+from functools import partial
+from convokit.model import Corpus
+from convokit import Transformer, Pipeline
+import corpus_fixtures
+
+
+# a single reply chain, whose utterance texts have different lengths
+make_corpus = partial(corpus_fixtures.make_corpus, n_utts=10, n_users=3, text=lambda i: "x" * i)
+
+
+class TextLength(Transformer):
+    def __init__(self, scale: int = 1, verbose: bool = False):
+        self.scale = scale
+        self.verbose = verbose
+        self.runs = 0
+
+    def transform(self, corpus: Corpus) -> Corpus:
+        self.runs += 1
+        for utt in corpus.iter_utterances():
+            utt.meta["length"] = len(utt.text) * self.scale
+        corpus.meta["lengths-scale"] = self.scale
+        return corpus
+
+
+class UserTotals(Transformer):
+    def __init__(self):
+        self.runs = 0
+
+    def transform(self, corpus: Corpus) -> Corpus:
+        self.runs += 1
+        for user in corpus.iter_users():
+            user.meta["total"] = sum(utt.meta["length"] for utt in user.iter_utterances())
+        utt = corpus.get_utterance("utt0")
+        del utt.meta["length"]
+        return corpus
+
+
+class PipelineTest(unittest.TestCase):
+    def run_pipeline(self, cache_dir: str, scale: int = 1, verbose: bool = False):
+        corpus = make_corpus()
+        steps = [("length", TextLength(scale, verbose)), ("totals", UserTotals())]
+        Pipeline(steps, cache_dir=cache_dir).fit_transform(corpus)
+        return corpus, [step.runs for _, step in steps]
+
+    def test_memoization(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            expected, runs = self.run_pipeline(cache_dir)
+            self.assertEqual(runs, [1, 1])
+            self.assertEqual(expected.get_user("user1").meta["total"], 1 + 4 + 7)
+            self.assertNotIn("length", expected.get_utterance("utt0").meta)
+
+            corpus, runs = self.run_pipeline(cache_dir, verbose=True)
+            self.assertEqual(runs, [0, 0])
+            for utt in corpus.iter_utterances():
+                self.assertEqual(utt.meta, expected.get_utterance(utt.id).meta)
+            for user in corpus.iter_users():
+                self.assertEqual(user.meta, expected.get_user(user.name).meta)
+            self.assertEqual(corpus.meta, expected.meta)
+            # the metadata loaded from the cache is written through the metadata trackers, like computed metadata
+            self.assertEqual(corpus._meta_trackers["users"].dirty, {"total"})
+
+            corpus, runs = self.run_pipeline(cache_dir, scale=2)
+            self.assertEqual(runs, [1, 1])
+            self.assertEqual(corpus.get_user("user1").meta["total"], 2 * (1 + 4 + 7))
+
+            corpus = make_corpus()
+            corpus.get_utterance("utt3").text = "changed"
+            steps = [("length", TextLength()), ("totals", UserTotals())]
+            Pipeline(steps, cache_dir=cache_dir).fit_transform(corpus)
+            self.assertEqual([step.runs for _, step in steps], [1, 1])
+            self.assertEqual(len(os.listdir(cache_dir)), 6)
+
+    def test_fitted_state_ignored(self):
+        """
+        Only the constructor parameters of a step identify it, not the state it sets when run
+        """
+        with tempfile.TemporaryDirectory() as cache_dir:
+            steps = [("length", TextLength()), ("totals", UserTotals())]
+            pipeline = Pipeline(steps, cache_dir=cache_dir)
+            pipeline.fit_transform(make_corpus())
+            pipeline.fit_transform(make_corpus())
+            self.assertEqual([step.runs for _, step in steps], [1, 1])
+
+            nested = Pipeline([("inner", Pipeline([("length", TextLength(scale=3))]))], cache_dir=cache_dir)
+            self.assertEqual(nested.fit_transform(make_corpus()).get_utterance("utt2").meta["length"], 6)
+
+
+if __name__ == '__main__':
+    unittest.main()